@@ -26,11 +26,11 @@ class Command(BaseCommand):
             emp.save()
 
             # Update problem source breadcrumbs
-            for source in ProblemSource.objects.all():
-                source.save()
+            ProblemSource.objects.update_breadcrumbs()
 
             # Create Analytics
             Analytics.update_tickets_per_problem_source()
             Analytics.update_tickets_per_day()
+            Analytics.update_backlog()
 
 
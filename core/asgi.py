@@ -3,19 +3,21 @@ import os
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings.prod")
 
 from django.core.asgi import get_asgi_application
-from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
-from django.urls import path
-from ticket.consumers import NotificationConsumer
 
-# Django-ASGI nur als http-Teil
+# Django-ASGI nur als http-Teil; muss vor dem Import der Consumer (Models) initialisiert werden
 django_asgi_app = get_asgi_application()
 
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from channels.auth import AuthMiddlewareStack  # noqa: E402
+from django.urls import path  # noqa: E402
+from ticket.consumers import NotificationConsumer, TicketConsumer  # noqa: E402
+
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
     "websocket": AuthMiddlewareStack(
         URLRouter([
             path("ws/notifications/", NotificationConsumer.as_asgi()),
+            path("ws/tickets/<int:id>/", TicketConsumer.as_asgi()),
         ])
     ),
 })
@@ -50,6 +50,8 @@ MIDDLEWARE = [
     # Third Party
     # Tracking last edited and created by users in models
     'django_currentuser.middleware.ThreadLocalUserMiddleware',
+    # WebSocket-Benachrichtigungen gesammelt nach dem Request senden
+    'ticket.notification_buffer.NotificationBufferMiddleware',
 ]
 
 # CSRF Settings for MS Teams to work properly
@@ -138,8 +140,18 @@ STATICFILES_DIRS = (
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 MEDIA_URL = "/media/"
 
+# Nur Formularfelder ohne Dateien (Summernote-Notizen mit eingebetteten Bildern)
 DATA_UPLOAD_MAX_MEMORY_SIZE = 50 * 1024 * 1024  # 50 MB
-FILE_UPLOAD_MAX_MEMORY_SIZE = 50 * 1024 * 1024  # optional
+# Dateien werden in Blöcken direkt auf die Platte geschrieben und dabei gehasht (ticket/uploads.py)
+FILE_UPLOAD_HANDLERS = ["ticket.uploads.HashingUploadHandler"]
+# Maximale Größe eines Anhangs in Bytes
+ATTACHMENT_MAX_FILE_SIZE = int(os.getenv("ATTACHMENT_MAX_FILE_SIZE", 10 * 1024 * 1024))
+# Maximale Größe einer Anfrage mit Anhängen in Bytes (nginx: client_max_body_size)
+ATTACHMENT_MAX_REQUEST_SIZE = int(os.getenv("ATTACHMENT_MAX_REQUEST_SIZE", 10 * 1024 * 1024))
+# Interne nginx-Location für X-Accel-Redirect; leer = Django liefert Anhänge selbst aus
+ATTACHMENT_ACCEL_REDIRECT = os.getenv("ATTACHMENT_ACCEL_REDIRECT", "")
+# Cache-Dauer heruntergeladener Anhänge im Browser in Sekunden (Cache-Control: private)
+ATTACHMENT_CACHE_MAX_AGE = int(os.getenv("ATTACHMENT_CACHE_MAX_AGE", 3600))
 #############################################################
 # EMAIL SETTINGS
 EMAIL_HOST = "SMTP.office365.com"
@@ -156,6 +168,12 @@ AZURE_APP_ID = os.getenv("AZURE_APP_ID", "123456789")
 
 RANDOM_TIMES = False
 
+# BUSINESS HOURS (SLA metrics, German public holidays are always excluded)
+#############################################################
+BUSINESS_HOURS_START = int(os.getenv("BUSINESS_HOURS_START", "9"))
+BUSINESS_HOURS_END = int(os.getenv("BUSINESS_HOURS_END", "17"))
+BUSINESS_WEEKMASK = os.getenv("BUSINESS_WEEKMASK", "Mon Tue Wed Thu Fri")
+
 
 MAIL_POLL_ENABLED = os.getenv("MAIL_POLL_ENABLED", "False").lower() in ("1", "true", "yes")
 
@@ -166,3 +184,23 @@ LOGO_URL     = os.environ.get("LOGO_URL", "/static/assets/img/logo.png")
 
 
 CONN_MAX_AGE = int(os.getenv("DJANGO_DB_CONN_MAX_AGE", "60"))
+
+# Staff dashboard counters are shared between all staff members for this many seconds
+KPI_SNAPSHOT_TTL = int(os.getenv("KPI_SNAPSHOT_TTL", "60"))
+
+# Ticket lists show a cached total instead of counting on every page
+TICKET_LIST_COUNT_TTL = int(os.getenv("TICKET_LIST_COUNT_TTL", "300"))
+
+# Team memberships used for access checks are cached per user (invalidated on changes)
+TEAM_MEMBERSHIP_TTL = int(os.getenv("TEAM_MEMBERSHIP_TTL", "300"))
+
+# "Häufig verwendete Problemquellen" are cached per user (invalidated by the user's new tickets)
+COMMON_PROBLEM_SOURCES_TTL = int(os.getenv("COMMON_PROBLEM_SOURCES_TTL", "3600"))
+
+# WebSocket notifications stay replayable for reconnecting sockets for this many seconds (at most LIMIT per connect)
+NOTIFICATION_REPLAY_WINDOW = int(os.getenv("NOTIFICATION_REPLAY_WINDOW", "3600"))
+NOTIFICATION_REPLAY_LIMIT = int(os.getenv("NOTIFICATION_REPLAY_LIMIT", "200"))
+
+# First reconnect of a dropped socket after DELAY plus a random share of JITTER milliseconds (spreads deploy reconnects)
+NOTIFICATION_RECONNECT_DELAY = int(os.getenv("NOTIFICATION_RECONNECT_DELAY", "1000"))
+NOTIFICATION_RECONNECT_JITTER = int(os.getenv("NOTIFICATION_RECONNECT_JITTER", "15000"))
@@ -33,9 +33,19 @@ ALLOWED_HOSTS = ['localhost', '127.0.0.1', _server]
 
 ASGI_APPLICATION = "core.asgi.application"
 
+# Anhänge überträgt nginx aus der internen Location (nginx.conf: /protected-media/)
+ATTACHMENT_ACCEL_REDIRECT = os.getenv("ATTACHMENT_ACCEL_REDIRECT", "/protected-media/")
+
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels_redis.core.RedisChannelLayer",
-        "CONFIG": {"hosts": [("redis", 6379)]},  # Hostname wie im compose
+        # Hostname wie im compose; für Lasttests gegen ein lokales Redis überschreibbar
+        "CONFIG": {"hosts": [os.getenv("REDIS_CHANNEL_URL", "redis://redis:6379/0")]},
     }
-}
\ No newline at end of file
+}
+CACHES = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": os.getenv("REDIS_CACHE_URL", "redis://redis:6379/1"),
+    }
+}
@@ -0,0 +1,114 @@
+from django.db import transaction
+
+from ticket.models import Ticket, TicketAccess
+
+Role = TicketAccess.Role
+
+# Ticket field -> role for the single-user links of a ticket
+SINGLE_ROLE_FIELDS = {
+    'created_by_id': Role.CREATOR,
+    'assigned_to_id': Role.ASSIGNEE,
+}
+ACCESS_FIELDS = [*SINGLE_ROLE_FIELDS, 'assigned_team_id']
+
+
+def grant(role, pairs):
+    """
+    Adds ``(user_id, ticket_id)`` pairs for ``role``, existing rows are kept.
+    """
+    TicketAccess.objects.bulk_create(
+        [TicketAccess(user_id=user_id, ticket_id=ticket_id, role=role) for user_id, ticket_id in pairs],
+        ignore_conflicts=True,
+        batch_size=1000,
+    )
+
+
+def revoke(role, **filters):
+    TicketAccess.objects.filter(role=role, **filters).delete()
+
+
+def sync_single_role(ticket, field):
+    role = SINGLE_ROLE_FIELDS[field]
+    user_id = getattr(ticket, field)
+    TicketAccess.objects.filter(ticket_id=ticket.id, role=role).exclude(user_id=user_id).delete()
+    if user_id:
+        grant(role, [(user_id, ticket.id)])
+
+
+def sync_team(ticket):
+    revoke(Role.TEAM, ticket_id=ticket.id)
+    if ticket.assigned_team_id:
+        members = ticket.assigned_team.members.values_list('id', flat=True)
+        grant(Role.TEAM, [(user_id, ticket.id) for user_id in members])
+
+
+def sync_ticket(ticket, changed=None):
+    """
+    Re-syncs the creator, assignee and team rows of a ticket.  ``changed``
+    limits the work to the given fields (``None`` = everything).
+    """
+    for field in SINGLE_ROLE_FIELDS:
+        if changed is None or field in changed:
+            sync_single_role(ticket, field)
+    if changed is None or 'assigned_team_id' in changed:
+        sync_team(ticket)
+
+
+def sync_m2m(role, instance, action, reverse, pk_set):
+    """
+    Mirrors ``m2m_changed`` of ``Ticket.co_assignees`` / ``Ticket.followers``
+    from either side of the relation.
+    """
+    if action == 'post_add' and pk_set:
+        if reverse:
+            grant(role, [(instance.pk, ticket_id) for ticket_id in pk_set])
+        else:
+            grant(role, [(user_id, instance.pk) for user_id in pk_set])
+    elif action == 'post_remove' and pk_set:
+        if reverse:
+            revoke(role, user_id=instance.pk, ticket_id__in=pk_set)
+        else:
+            revoke(role, ticket_id=instance.pk, user_id__in=pk_set)
+    elif action == 'pre_clear':
+        revoke(role, **{'user_id' if reverse else 'ticket_id': instance.pk})
+
+
+def sync_team_members(instance, action, reverse, pk_set):
+    """
+    Mirrors ``m2m_changed`` of ``Team.members``: members get (or lose) the
+    team role on every ticket assigned to the team.
+    """
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        # user.teams.add(...) / remove(...) / clear()
+        teams = {'assigned_team_id__in': pk_set} if action != 'pre_clear' else {'assigned_team__isnull': False}
+        tickets = Ticket.objects.filter(**teams).values_list('id', flat=True)
+        users = [instance.pk]
+    else:
+        tickets = Ticket.objects.filter(assigned_team_id=instance.pk).values_list('id', flat=True)
+        users = pk_set if action != 'pre_clear' else instance.members.values_list('id', flat=True)
+
+    if action == 'post_add' and pk_set:
+        grant(Role.TEAM, [(user_id, ticket_id) for ticket_id in tickets for user_id in users])
+    elif users:
+        revoke(Role.TEAM, user_id__in=list(users), ticket_id__in=tickets)
+
+
+def rebuild():
+    """
+    Recreates the whole table from the tickets and their relations.
+    """
+    with transaction.atomic():
+        _rebuild()
+
+
+def _rebuild():
+    TicketAccess.objects.all().delete()
+    tickets = list(Ticket.objects.values_list('id', 'created_by_id', 'assigned_to_id'))
+    grant(Role.CREATOR, [(user_id, ticket_id) for ticket_id, user_id, _ in tickets if user_id])
+    grant(Role.ASSIGNEE, [(user_id, ticket_id) for ticket_id, _, user_id in tickets if user_id])
+    grant(Role.TEAM, Ticket.objects.filter(assigned_team__members__isnull=False)
+          .values_list('assigned_team__members', 'id'))
+    grant(Role.CO_ASSIGNEE, Ticket.co_assignees.through.objects.values_list('user_id', 'ticket_id'))
+    grant(Role.FOLLOWER, Ticket.followers.through.objects.values_list('user_id', 'ticket_id'))
@@ -4,7 +4,7 @@ from django.utils.html import format_html
 from django.utils.http import urlencode
 from mptt.admin import MPTTModelAdmin
 
-from .models import Attachment, Comment, Ticket, ProblemSource, TicketEvent, Analytics
+from .models import Attachment, Comment, Ticket, ProblemSource, TicketEvent, Analytics, TicketAccess
 
 
 class TicketCommentInline(admin.TabularInline):
@@ -31,6 +31,12 @@ class TicketEventAdmin(admin.ModelAdmin):
     # ordering = ("timestamp",)
 
 
+class TicketAccessAdmin(admin.ModelAdmin):
+    list_display = ("id", "ticket", "user", "role")
+    list_filter = ("role",)
+    raw_id_fields = ("ticket", "user")
+
+
 class SubProblemInline(admin.TabularInline):
     model = ProblemSource
 
@@ -77,5 +83,6 @@ admin.site.register(Ticket, TicketAdmin)
 admin.site.register(Attachment)
 admin.site.register(TicketEvent, TicketEventAdmin)
 admin.site.register(Analytics)
+admin.site.register(TicketAccess, TicketAccessAdmin)
 
 admin.site.site_header = 'Ticket Verwaltung'
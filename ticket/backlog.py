@@ -0,0 +1,112 @@
+from collections import namedtuple
+
+import numpy as np
+
+TicketArrays = namedtuple('TicketArrays', ['created', 'completed', 'problem_source', 'priority'])
+
+PRIORITIES = (0, 1, 2)
+AGING_EDGES = (0, 1, 3, 7, 14, 30)
+AGING_LABELS = ['< 1 Tag', '1-3 Tage', '3-7 Tage', '7-14 Tage', '14-30 Tage', '> 30 Tage']
+COHORT_HORIZONS = (1, 2, 4)
+
+
+def load_ticket_arrays(queryset, chunk_size=5000):
+    """
+    Streams ``(created_date, completed_date, problem_source, priority)`` of all
+    tickets in a single ``values_list`` pass into day-resolution arrays.
+    Open tickets have ``NaT`` as completion day, tickets without problem
+    source ``-1``.
+    """
+    rows = queryset.order_by().values_list('created_date', 'completed_date', 'problem_source', 'priority')
+    created, completed, problem_source, priority = [], [], [], []
+    for created_date, completed_date, problem_source_id, ticket_priority in rows.iterator(chunk_size=chunk_size):
+        created.append(created_date)
+        completed.append(completed_date)
+        problem_source.append(-1 if problem_source_id is None else problem_source_id)
+        priority.append(ticket_priority)
+
+    return TicketArrays(
+        created=np.array(created, dtype='datetime64[s]').astype('datetime64[D]'),
+        completed=np.array(completed, dtype='datetime64[s]').astype('datetime64[D]'),
+        problem_source=np.array(problem_source, dtype=np.int64),
+        priority=np.array(priority, dtype=np.int64),
+    )
+
+
+def select(arrays, mask):
+    return TicketArrays(*(column[mask] for column in arrays))
+
+
+def day_range(first_day, last_day):
+    return np.arange(np.datetime64(first_day, 'D'), np.datetime64(last_day, 'D') + 1)
+
+
+def counts_per_day(days, index_days, groups=None, group_count=1):
+    """
+    Number of events per (group, day) in the window ``index_days``.  Events
+    before the window are counted on its first day so that cumulative sums
+    start from the correct level; events after it are dropped.
+    """
+    n = len(index_days)
+    valid = ~np.isnat(days)
+    index = np.clip((days[valid] - index_days[0]).astype(np.int64), 0, None)
+    in_window = index < n
+    groups = np.zeros(len(days), dtype=np.int64) if groups is None else groups
+    flat = groups[valid][in_window] * n + index[in_window]
+    return np.bincount(flat, minlength=group_count * n).reshape(group_count, n)
+
+
+def open_backlog_per_day(arrays, first_day, last_day):
+    """
+    Open tickets at the end of every day of the window, per priority
+    (rows follow ``PRIORITIES``).
+    """
+    days = day_range(first_day, last_day)
+    priority = np.clip(arrays.priority, 0, len(PRIORITIES) - 1)
+    created = counts_per_day(arrays.created, days, priority, len(PRIORITIES))
+    closed = counts_per_day(arrays.completed, days, priority, len(PRIORITIES))
+    return days, np.cumsum(created, axis=1) - np.cumsum(closed, axis=1)
+
+
+def aging_buckets(arrays, today):
+    """
+    Age of currently open tickets bucketed by ``AGING_EDGES`` (in days), per
+    priority.
+    """
+    is_open = np.isnat(arrays.completed)
+    age = (np.datetime64(today, 'D') - arrays.created[is_open]).astype(np.int64)
+    bucket = np.digitize(age, AGING_EDGES[1:])
+    priority = np.clip(arrays.priority[is_open], 0, len(PRIORITIES) - 1)
+    flat = priority * len(AGING_EDGES) + bucket
+    return np.bincount(flat, minlength=len(PRIORITIES) * len(AGING_EDGES)).reshape(len(PRIORITIES), -1)
+
+
+def week_start(days):
+    # 1970-01-01 was a Thursday, shift so that weeks start on Monday
+    day_numbers = days.astype(np.int64)
+    return (day_numbers - (day_numbers + 3) % 7).astype('datetime64[D]')
+
+
+def weekly_cohort_closure_rates(arrays, weeks=12, today=None, horizons=COHORT_HORIZONS):
+    """
+    For the tickets created in each of the last ``weeks`` calendar weeks, the
+    share closed within 1, 2, 4 ... weeks after creation.
+    """
+    today = np.datetime64(today or 'today', 'D')
+    last_week = week_start(np.array([today]))[0]
+    first_week = last_week - 7 * (weeks - 1)
+    cohort = (week_start(arrays.created) - first_week).astype(np.int64) // 7
+    in_range = (cohort >= 0) & (cohort < weeks)
+
+    horizon = max(horizons)
+    days_to_close = (arrays.completed - arrays.created).astype('timedelta64[D]')
+    weeks_to_close = np.where(
+        np.isnat(days_to_close), horizon, np.clip(days_to_close.astype(np.int64) // 7, 0, horizon)
+    )
+    flat = cohort[in_range] * (horizon + 1) + weeks_to_close[in_range]
+    closed = np.bincount(flat, minlength=weeks * (horizon + 1)).reshape(weeks, horizon + 1)
+    size = closed.sum(axis=1)
+    closed_within = np.cumsum(closed, axis=1)[:, [h - 1 for h in horizons]]
+    rates = closed_within / np.maximum(size, 1)[:, None]
+    labels = first_week + 7 * np.arange(weeks)
+    return labels, size, rates
@@ -0,0 +1,176 @@
+import datetime
+
+import numpy as np
+from django.conf import settings
+
+# Business day counts are measured relative to this (arbitrary) Monday.
+ORIGIN = np.datetime64('2000-01-03')
+
+
+def easter_sunday(year):
+    # Anonymous Gregorian algorithm (Meeus/Jones/Butcher)
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return datetime.date(year, month, day + 1)
+
+
+def german_public_holidays(year):
+    """
+    Nationwide public holidays in Germany for the given year.
+    """
+    easter = easter_sunday(year)
+    return [
+        datetime.date(year, 1, 1),                  # Neujahr
+        easter - datetime.timedelta(days=2),        # Karfreitag
+        easter + datetime.timedelta(days=1),        # Ostermontag
+        datetime.date(year, 5, 1),                  # Tag der Arbeit
+        easter + datetime.timedelta(days=39),       # Christi Himmelfahrt
+        easter + datetime.timedelta(days=50),       # Pfingstmontag
+        datetime.date(year, 10, 3),                 # Tag der Deutschen Einheit
+        datetime.date(year, 12, 25),                # 1. Weihnachtstag
+        datetime.date(year, 12, 26),                # 2. Weihnachtstag
+    ]
+
+
+class BusinessCalendar:
+    """
+    Working-time arithmetic on whole arrays of timestamps.
+
+    Every timestamp is mapped to the number of business seconds elapsed since
+    ``ORIGIN`` (full business days via ``np.busday_count`` plus the clipped part
+    of the current day).  Business durations are then plain differences of
+    those offsets, so no per-ticket Python loop is needed.
+    """
+
+    def __init__(self, start_hour=9, end_hour=17, weekmask='Mon Tue Wed Thu Fri'):
+        self.start = start_hour * 3600
+        self.end = end_hour * 3600
+        self.day_seconds = self.end - self.start
+        self.weekmask = weekmask
+        # (first_year, last_year) -> np.busdaycalendar, kept per instance
+        self._busdaycalendars = {}
+
+    @property
+    def hours(self):
+        return self.start // 3600, self.end // 3600
+
+    @property
+    def iso_weekdays(self):
+        mask = np.busdaycalendar(weekmask=self.weekmask).weekmask
+        return [day + 1 for day, is_workday in enumerate(mask) if is_workday]
+
+    @staticmethod
+    def holidays_between(first_year, last_year):
+        return [h for year in range(first_year, last_year + 1) for h in german_public_holidays(year)]
+
+    def busdaycalendar(self, first_year, last_year):
+        key = (first_year, last_year)
+        if key not in self._busdaycalendars:
+            self._busdaycalendars[key] = np.busdaycalendar(
+                weekmask=self.weekmask, holidays=self.holidays_between(first_year, last_year)
+            )
+        return self._busdaycalendars[key]
+
+    def calendar_for(self, *arrays):
+        """
+        Calendar with the holidays of every year spanned by the given arrays.
+        """
+        valid = np.concatenate([a[~np.isnat(a)] for a in arrays])
+        if not valid.size:
+            return self.busdaycalendar(2000, 2000)
+        years = valid.astype('datetime64[Y]').astype(int) + 1970
+        return self.busdaycalendar(int(years.min()), int(years.max()))
+
+    def offsets(self, timestamps, busdaycal):
+        """
+        Business seconds between ``ORIGIN`` and every timestamp.  NaT values
+        are returned as 0 and have to be masked by the caller.
+        """
+        timestamps = np.where(np.isnat(timestamps), ORIGIN.astype('datetime64[s]'), timestamps)
+        days = timestamps.astype('datetime64[D]')
+        seconds_into_day = (timestamps - days.astype('datetime64[s]')).astype(np.int64)
+        full_days = np.busday_count(ORIGIN, days, busdaycal=busdaycal).astype(np.int64)
+        partial = np.clip(seconds_into_day - self.start, 0, self.day_seconds)
+        partial = np.where(np.is_busday(days, busdaycal=busdaycal), partial, 0)
+        return full_days * self.day_seconds + partial
+
+    def durations(self, starts, ends, pause_ends=None):
+        """
+        Business time in seconds between ``starts`` and ``ends``.
+
+        Only the end of a pause is stored on a ticket (``paused_until``), so a
+        pause is taken to run from the start up to ``pause_ends`` – the clock
+        starts ticking once the last pause is over.  Rows with a missing start
+        or end are returned as NaN.
+        """
+        starts = np.asarray(starts, dtype='datetime64[s]')
+        ends = np.asarray(ends, dtype='datetime64[s]')
+        if pause_ends is not None:
+            pause_ends = np.asarray(pause_ends, dtype='datetime64[s]')
+            paused = ~np.isnat(pause_ends) & (pause_ends > starts)
+            starts = np.where(paused, np.minimum(pause_ends, ends), starts)
+
+        busdaycal = self.calendar_for(starts, ends)
+        result = (self.offsets(ends, busdaycal) - self.offsets(starts, busdaycal)).astype(float)
+        result[np.isnat(starts) | np.isnat(ends)] = np.nan
+        return np.clip(result, 0, None)
+
+    def is_business_time(self, timestamps):
+        """
+        Boolean mask of the timestamps falling into working hours.
+        """
+        timestamps = np.asarray(timestamps, dtype='datetime64[s]')
+        valid = ~np.isnat(timestamps)
+        busdaycal = self.calendar_for(timestamps)
+        safe = np.where(valid, timestamps, ORIGIN.astype('datetime64[s]'))
+        days = safe.astype('datetime64[D]')
+        seconds_into_day = (safe - days.astype('datetime64[s]')).astype(np.int64)
+        in_hours = (seconds_into_day >= self.start) & (seconds_into_day < self.end)
+        return valid & in_hours & np.is_busday(days, busdaycal=busdaycal)
+
+
+def columns(rows, count):
+    """
+    Splits ``values_list`` rows into ``count`` column arrays.
+    """
+    rows = list(rows)
+    if not rows:
+        return [np.array([]) for _ in range(count)]
+    return [np.array(column) for column in zip(*rows)]
+
+
+def average_per_group(groups, durations):
+    """
+    Mean of ``durations`` per value of ``groups`` (NaN durations are ignored).
+    Returns the sorted unique groups and their averages.
+    """
+    groups = np.asarray(groups)
+    valid = ~np.isnan(durations)
+    keys, index = np.unique(groups[valid], return_inverse=True)
+    totals = np.bincount(index, weights=durations[valid], minlength=len(keys))
+    counts = np.bincount(index, minlength=len(keys))
+    return keys, totals / np.maximum(counts, 1)
+
+
+def as_timedelta(seconds):
+    return None if seconds is None or np.isnan(seconds) else datetime.timedelta(seconds=int(seconds))
+
+
+def mean_timedelta(durations):
+    valid = durations[~np.isnan(durations)]
+    return as_timedelta(valid.mean()) if valid.size else None
+
+
+business_calendar = BusinessCalendar(
+    start_hour=settings.BUSINESS_HOURS_START,
+    end_hour=settings.BUSINESS_HOURS_END,
+    weekmask=settings.BUSINESS_WEEKMASK,
+)
@@ -1,6 +1,51 @@
 # ticket/consumers.py
 import json
+import random
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+
+from ticket.models import Ticket
+from ticket.notification_buffer import latest_notification_id, missed_notifications
+from ticket.permissions import PermissionResolver, team_ids_for
+
+BROADCAST_GROUP = "broadcast"
+STAFF_GROUP = "staff"
+
+
+def user_group(user_id):
+    return f"user_{user_id}"
+
+
+def team_group(team_id):
+    return f"team_{team_id}"
+
+
+def ticket_group(ticket_id):
+    return f"ticket_{ticket_id}"
+
+
+def reconnect_delay():
+    """
+    Verzögerung (ms) für den ersten Reconnect nach einem Abbruch – pro
+    Verbindung zufällig gestreut, damit nach einem Deploy nicht alle Tabs
+    im selben Moment wiederkommen.
+    """
+    return settings.NOTIFICATION_RECONNECT_DELAY + random.randint(0, settings.NOTIFICATION_RECONNECT_JITTER)
+
+
+def groups_for(user):
+    """
+    Gruppen, denen ein Socket neben ``user_<id>`` und ``broadcast`` beitritt:
+    je Team ``team_<id>``, für Mitarbeiter zusätzlich ``staff``.
+    """
+    groups = [team_group(team_id) for team_id in team_ids_for(user)]
+    if user.is_staff:
+        groups.append(STAFF_GROUP)
+    return groups
+
 
 class NotificationConsumer(AsyncWebsocketConsumer):
     async def connect(self):
@@ -9,19 +54,88 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
 
-        self.group_name = f"user_{user.id}"
-        await self.channel_layer.group_add(self.group_name, self.channel_name)
-
-        # NEU: alle eingeloggten Tabs hören auch auf Broadcast
-        await self.channel_layer.group_add("broadcast", self.channel_name)
+        # Persönlich, Broadcast für alle eingeloggten Tabs, Teams und Staff
+        self.joined_groups = set()
+        await self.join([user_group(user.id), BROADCAST_GROUP, *await database_sync_to_async(groups_for)(user)])
 
         await self.accept()
+        await self.resume()
+
+    def last_event_id(self):
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        try:
+            return int(query["last_event_id"][0])
+        except (KeyError, ValueError):
+            return None
+
+    async def resume(self):
+        """
+        Liefert die seit ``?last_event_id=`` verpassten Benachrichtigungen nach
+        (eine Abfrage) und teilt dem Client Resume-Punkt und Reconnect-Verzögerung
+        mit.  Ohne id (neuer Tab) wird nichts nachgeliefert.
+        """
+        last_event_id = self.last_event_id()
+        if last_event_id is None:
+            missed = []
+            last_event_id = await database_sync_to_async(latest_notification_id)()
+        else:
+            missed = await database_sync_to_async(missed_notifications)(list(self.joined_groups), last_event_id)
+
+        await self.send(text_data=json.dumps({"reconnect": reconnect_delay(), "last_event_id": last_event_id}))
+        for notification in missed:
+            await self.send(text_data=json.dumps(notification))
 
     async def disconnect(self, close_code):
-        if hasattr(self, "group_name"):
-            await self.channel_layer.group_discard(self.group_name, self.channel_name)
-        # NEU:
-        await self.channel_layer.group_discard("broadcast", self.channel_name)
+        await self.leave(list(getattr(self, "joined_groups", ())))
+
+    async def join(self, groups):
+        for group in groups:
+            await self.channel_layer.group_add(group, self.channel_name)
+            self.joined_groups.add(group)
+
+    async def leave(self, groups):
+        for group in groups:
+            await self.channel_layer.group_discard(group, self.channel_name)
+            self.joined_groups.discard(group)
+
+    async def groups_update(self, event):
+        """
+        Team- oder Staff-Mitgliedschaft hat sich geändert (über ``user_<id>``
+        an alle offenen Tabs des Benutzers): Gruppen live wechseln.
+        """
+        await self.join(event["content"].get("add", []))
+        await self.leave(event["content"].get("discard", []))
 
     async def send_notification(self, event):
         await self.send(text_data=json.dumps(event["content"]))
+
+
+class TicketConsumer(AsyncWebsocketConsumer):
+    """
+    Live-Updates einer Ticket-Detailseite über ``ticket_<id>``: Feldänderungen
+    als JSON-Diff, neue Ereignisse als Hinweis – die Fragmente holt sich jeder
+    Betrachter selbst (TicketLiveView), weil sie pro Benutzer gerendert werden.
+    """
+
+    async def connect(self):
+        user = self.scope["user"]
+        ticket_id = self.scope["url_route"]["kwargs"]["id"]
+        if not user.is_authenticated or not await database_sync_to_async(self.has_access)(user, ticket_id):
+            await self.close()
+            return
+
+        self.group = ticket_group(ticket_id)
+        await self.channel_layer.group_add(self.group, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        if hasattr(self, "group"):
+            await self.channel_layer.group_discard(self.group, self.channel_name)
+
+    @staticmethod
+    def has_access(user, ticket_id):
+        ticket = Ticket.objects.prefetch_related("co_assignees").filter(id=ticket_id).first()
+        return ticket is not None and PermissionResolver(user).has_full_access(ticket)
+
+    async def ticket_update(self, event):
+        await self.send(text_data=json.dumps(event["content"]))
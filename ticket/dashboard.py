@@ -0,0 +1,51 @@
+import ast
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+
+from ticket.models import Analytics, Ticket
+
+KPI_SNAPSHOT_KEY = 'kpi_snapshot'
+
+
+def build_kpi_snapshot(day):
+    """
+    Counters and chart data shared by every staff dashboard: one conditional
+    aggregate over the tickets plus one query for all analytics rows.
+    """
+    analytics = {a.name: a for a in Analytics.objects.all()}
+    pie_chart = analytics.get('Tickets pro Problemquelle')
+    bar_chart = analytics.get('Tickets pro Tag')
+
+    try:
+        bar_data = ast.literal_eval(bar_chart.data) if bar_chart and bar_chart.data else [[], []]
+    except Exception:
+        bar_data = [[], []]
+
+    return {
+        'counts': Ticket.objects.kpi_counts(day, day + timedelta(days=1)),
+        'pie_labels': pie_chart.labels if pie_chart and pie_chart.labels else [],
+        'pie_data': pie_chart.data if pie_chart and pie_chart.data else [],
+        'bar_labels': bar_chart.labels if bar_chart and bar_chart.labels else [],
+        'bar_open_data': bar_data[0] if len(bar_data) > 0 else [],
+        'bar_closed_data': bar_data[1] if len(bar_data) > 1 else [],
+        'backlog': Analytics.get_backlog(analytics.values()),
+    }
+
+
+def get_kpi_snapshot(day):
+    """
+    Cached KPI snapshot for the given day.  All days live under a single key,
+    so a dashboard load is one cache read and invalidation one delete.
+    """
+    snapshots = cache.get(KPI_SNAPSHOT_KEY) or {}
+    key = day.isoformat()
+    if key not in snapshots:
+        snapshots[key] = build_kpi_snapshot(day)
+        cache.set(KPI_SNAPSHOT_KEY, snapshots, settings.KPI_SNAPSHOT_TTL)
+    return snapshots[key]
+
+
+def invalidate_kpi_snapshot():
+    cache.delete(KPI_SNAPSHOT_KEY)
@@ -0,0 +1,36 @@
+from django.db import NotSupportedError, migrations
+
+
+class ConcurrentIndexMixin:
+    """
+    Builds / drops indexes with ``CONCURRENTLY`` on PostgreSQL so the table
+    stays writable while the index is created.  Other backends (sqlite in
+    development) run the plain statement.  Migrations using these operations
+    have to set ``atomic = False``.
+    """
+
+    def _concurrently(self, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return {}
+        if schema_editor.connection.in_atomic_block:
+            raise NotSupportedError(
+                f'{self.__class__.__name__} cannot run inside a transaction, set Migration.atomic = False.'
+            )
+        return {'concurrently': True}
+
+
+class AddIndexConcurrently(ConcurrentIndexMixin, migrations.AddIndex):
+
+    def describe(self):
+        return f'Concurrently create index {self.index.name} on model {self.model_name}'
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, **self._concurrently(schema_editor))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, **self._concurrently(schema_editor))
+
@@ -63,6 +63,31 @@ class PauseTicketForm(forms.Form):
     )
 
 
+class NullableIntegerField(forms.IntegerField):
+    """
+    IntegerField that also reads 'null' / 'None' as "no value".
+    """
+    empty_values = [*forms.IntegerField.empty_values, 'null', 'None']
+
+
+class TicketActionsForm(forms.Form):
+    """
+    Typed values of the manager actions on the detail page (ticket_actions
+    form and modals).  Invalid values drop out of ``cleaned_data`` and are
+    ignored instead of failing the whole POST.
+    """
+    # Werte aus Ticket.get_priorities (Niedrig 0 … Hoch 2)
+    priority = forms.IntegerField(required=False, min_value=0, max_value=2)
+    # <input type="datetime-local"> sendet ISO 8601 (2024-03-04T10:00)
+    pause_until = forms.DateTimeField(required=False)
+    problem_source = forms.IntegerField(required=False, min_value=1)
+    assign_to = forms.IntegerField(required=False, min_value=1)
+    # Leer ("-- kein Team --") entfernt das Team
+    assign_team = NullableIntegerField(required=False, min_value=1)
+    add_co_assignee = forms.IntegerField(required=False, min_value=1)
+    remove_co_assignee = forms.IntegerField(required=False, min_value=1)
+
+
 class SearchUsersForm(forms.Form):
     name = forms.CharField(
         label='',
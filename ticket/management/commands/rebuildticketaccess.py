@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from ticket import access
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized ticket access table"
+
+    def handle(self, *args, **options):
+        access.rebuild()
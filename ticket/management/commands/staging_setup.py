@@ -19,9 +19,8 @@ class Command(BaseCommand):
             first_name="ITticket Admin"
         )
         admin.save()
-        # Load Problem sources & save to generate breadcrumbs
+        # Load Problem sources & generate breadcrumbs (loaddata skips save())
         os.system('python manage.py loaddata data_fixtures')
-        for problem in ProblemSource.objects.all():
-            problem.save()
+        ProblemSource.objects.update_breadcrumbs()
         # Create Factory Boy dummy data
         os.system('python manage.py makedummydata')
@@ -8,4 +8,5 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         Analytics.update_tickets_per_day()
-        Analytics.update_tickets_per_problem_source()
\ No newline at end of file
+        Analytics.update_tickets_per_problem_source()
+        Analytics.update_backlog()
\ No newline at end of file
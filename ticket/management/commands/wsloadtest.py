@@ -0,0 +1,318 @@
+import asyncio
+import base64
+import json
+import math
+import os
+import random
+import resource
+import time
+from importlib import import_module
+from urllib.parse import urlparse
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from ticket.consumers import BROADCAST_GROUP, user_group
+
+USERNAME_PREFIX = "loadtest-"
+
+
+def percentile(values, p):
+    # Nearest rank
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def rss_kib(pids):
+    """
+    Summed resident memory of the server processes (Linux /proc), ``None``
+    when it can't be read.
+    """
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status") as status:
+                total += next(int(line.split()[1]) for line in status if line.startswith("VmRSS:"))
+        except (OSError, StopIteration):
+            return None
+    return total
+
+
+class LoadClient:
+    """
+    One browser tab: an authenticated ``ws/notifications/`` socket that
+    records the delivery latency of the harness' messages.  A minimal
+    RFC 6455 client on asyncio streams (text frames, ping/pong, close) –
+    the autobahn client can't be used next to Django, which runs txaio on
+    twisted.
+    """
+
+    def __init__(self, run, url, user_id, session_key):
+        self.run = run
+        self.url = url
+        self.user_id = user_id
+        self.session_key = session_key
+        self.writer = None
+        self.reader_task = None
+
+    async def connect(self):
+        url = self.url
+        reader, writer = await asyncio.open_connection(
+            url.hostname, url.port or (443 if url.scheme == "wss" else 80), ssl=url.scheme == "wss"
+        )
+        path = f"{url.path or '/'}?{url.query}" if url.query else (url.path or "/")
+        writer.write((
+            f"GET {path} HTTP/1.1\r\n"
+            f"Host: {url.netloc}\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {base64.b64encode(os.urandom(16)).decode()}\r\n"
+            "Sec-WebSocket-Version: 13\r\n"
+            f"Cookie: {settings.SESSION_COOKIE_NAME}={self.session_key}\r\n"
+            "\r\n"
+        ).encode())
+        response = await reader.readuntil(b"\r\n\r\n")
+        status = response.split(b"\r\n", 1)[0].decode()
+        if " 101 " not in f"{status} ":
+            writer.close()
+            raise ConnectionError(status)
+        self.writer = writer
+        self.reader_task = asyncio.ensure_future(self.read_frames(reader))
+
+    async def read_frames(self, reader):
+        try:
+            while True:
+                head = await reader.readexactly(2)
+                opcode, length = head[0] & 0x0F, head[1] & 0x7F
+                if length == 126:
+                    length = int.from_bytes(await reader.readexactly(2), "big")
+                elif length == 127:
+                    length = int.from_bytes(await reader.readexactly(8), "big")
+                payload = await reader.readexactly(length)
+                if opcode == 0x1:
+                    self.received(payload)
+                elif opcode == 0x9:
+                    self.send_frame(0xA, payload)
+                elif opcode == 0x8:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        if self.run.measuring:
+            self.run.dropped += 1
+
+    def send_frame(self, opcode, payload=b""):
+        # Client-Frames müssen maskiert sein; nur Kontroll-Frames (< 126 Bytes)
+        mask = os.urandom(4)
+        masked = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+        self.writer.write(bytes([0x80 | opcode, 0x80 | len(payload)]) + mask + masked)
+
+    def received(self, payload):
+        received = time.perf_counter()
+        data = json.loads(payload)
+        # Begrüßung/Replay und fremde Meldungen ignorieren
+        if data.get("loadtest") != self.run.token:
+            return
+        self.run.delivered(data["burst"], (received - data["sent"]) * 1000)
+
+    def close(self):
+        if self.writer is None:
+            return
+        self.send_frame(0x8, (1000).to_bytes(2, "big"))
+        self.writer.close()
+
+
+class LoadRun:
+
+    def __init__(self, token, timeout):
+        self.token = token
+        self.timeout = timeout
+        self.measuring = False
+        self.dropped = 0
+        self.latencies = []
+        self.expected = {}
+        self.received = {}
+        self.complete = {}
+
+    def expect(self, burst, count):
+        self.expected[burst] = count
+        self.received[burst] = 0
+        self.complete[burst] = asyncio.Event()
+
+    def delivered(self, burst, latency):
+        self.latencies.append(latency)
+        self.received[burst] += 1
+        if self.received[burst] >= self.expected[burst]:
+            self.complete[burst].set()
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test of the WebSocket tier: opens many authenticated ws/notifications/ connections against a running "
+        "daphne (or nginx in front of several), drives group_send bursts through the configured channel layer and "
+        "reports connect rate, memory per connection and delivery latency. Needs the same CHANNEL_LAYERS (Redis) as "
+        "the server, e.g. DJANGO_SETTINGS_MODULE=core.settings.prod."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url", action="append", default=[],
+            help="ws://host:port/ws/notifications/ (default on 127.0.0.1:8001); repeat to spread the connections "
+                 "round robin over several daphne processes without a balancer in front"
+        )
+        parser.add_argument("--connections", type=int, default=1000)
+        parser.add_argument("--users", type=int, default=100, help="Connections are spread over this many users")
+        parser.add_argument("--concurrency", type=int, default=100, help="Handshakes in flight at the same time")
+        parser.add_argument("--bursts", type=int, default=10)
+        parser.add_argument("--burst-size", type=int, default=20, help="group_send calls per burst")
+        parser.add_argument("--pause", type=float, default=1.0, help="Seconds between bursts")
+        parser.add_argument(
+            "--target", choices=["broadcast", "users"], default="broadcast",
+            help="broadcast: every message reaches every connection; users: each message one user's tabs"
+        )
+        parser.add_argument("--timeout", type=float, default=30.0, help="Seconds to wait for a burst to arrive")
+        parser.add_argument(
+            "--server-pid", type=int, action="append", default=[],
+            help="PID of a daphne process for the memory figures, repeat for several processes"
+        )
+        parser.add_argument("--cleanup", action="store_true", help="Delete the load test users afterwards")
+
+    def handle(self, *args, **options):
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            raise CommandError("Kein CHANNEL_LAYERS konfiguriert – mit den Einstellungen des Servers starten.")
+        urls = [urlparse(url) for url in options["url"] or ["ws://127.0.0.1:8001/ws/notifications/"]]
+        if any(url.scheme not in ("ws", "wss") for url in urls):
+            raise CommandError("--url muss mit ws:// oder wss:// beginnen.")
+
+        self.raise_file_limit(options["connections"])
+        users = self.load_test_users(options["users"])
+        sessions = {user.id: self.create_session(user) for user in users}
+        try:
+            asyncio.run(self.run(channel_layer, urls, users, sessions, options))
+        finally:
+            session_store = import_module(settings.SESSION_ENGINE).SessionStore
+            for session_key in sessions.values():
+                session_store(session_key).delete()
+            if options["cleanup"]:
+                User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+    def raise_file_limit(self, connections):
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        wanted = connections + 100
+        if soft < wanted:
+            limit = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+            resource.setrlimit(resource.RLIMIT_NOFILE, (limit, hard))
+            if limit < wanted:
+                self.stderr.write(f"Nur {limit} Dateideskriptoren erlaubt (ulimit -n), Verbindungen schlagen fehl.")
+
+    def load_test_users(self, count):
+        names = [f"{USERNAME_PREFIX}{i}" for i in range(count)]
+        existing = set(User.objects.filter(username__in=names).values_list("username", flat=True))
+        password = make_password(None)
+        User.objects.bulk_create([
+            User(username=name, first_name=name, password=password) for name in names if name not in existing
+        ])
+        return list(User.objects.filter(username__in=names).order_by("id"))
+
+    def create_session(self, user):
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        return session.session_key
+
+    async def run(self, channel_layer, urls, users, sessions, options):
+        run = LoadRun(token=random.getrandbits(32), timeout=options["timeout"])
+        clients = [
+            LoadClient(run, urls[i % len(urls)], users[i % len(users)].id, sessions[users[i % len(users)].id])
+            for i in range(options["connections"])
+        ]
+        pids = options["server_pid"]
+
+        # --- Verbindungsaufbau ---
+        memory_before = rss_kib(pids)
+        handshakes = []
+        failures = []
+        slots = asyncio.Semaphore(options["concurrency"])
+
+        async def connect(client):
+            async with slots:
+                started = time.perf_counter()
+                try:
+                    await asyncio.wait_for(client.connect(), run.timeout)
+                except Exception as exc:
+                    failures.append(exc)
+                else:
+                    handshakes.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(connect(client) for client in clients))
+        elapsed = time.perf_counter() - started
+        connected = [client for client in clients if client.writer is not None]
+        # Begrüßungen abwarten, damit sie nicht in die erste Messung fallen
+        await asyncio.sleep(1)
+        memory_after = rss_kib(pids)
+
+        self.stdout.write(f"Verbindungen: {len(connected)}/{len(clients)} in {elapsed:.1f}s "
+                          f"({len(connected) / elapsed:.0f}/s), {len(failures)} fehlgeschlagen")
+        if failures:
+            self.stdout.write(f"  erster Fehler: {failures[0]!r}")
+        self.write_stats("Handshake", handshakes)
+        if memory_before is not None and memory_after is not None and connected:
+            self.stdout.write(
+                f"Speicher Server: {memory_before / 1024:.1f} MiB -> {memory_after / 1024:.1f} MiB "
+                f"({(memory_after - memory_before) / len(connected):.1f} KiB pro Verbindung)"
+            )
+
+        # --- group_send-Bursts ---
+        tabs_per_user = {}
+        for client in connected:
+            tabs_per_user[client.user_id] = tabs_per_user.get(client.user_id, 0) + 1
+        user_ids = list(tabs_per_user)
+        run.measuring = True
+        missing = 0
+        for burst in range(options["bursts"]):
+            if options["target"] == "broadcast":
+                targets = [(BROADCAST_GROUP, len(connected))] * options["burst_size"]
+            else:
+                targets = [(user_group(user_id), tabs_per_user[user_id])
+                           for user_id in random.choices(user_ids, k=options["burst_size"])] if user_ids else []
+            run.expect(burst, sum(count for _, count in targets))
+
+            await asyncio.gather(*(
+                channel_layer.group_send(group, {"type": "send_notification", "content": {
+                    "loadtest": run.token, "burst": burst, "sent": time.perf_counter(),
+                }}) for group, _ in targets
+            ))
+            try:
+                if run.expected[burst]:
+                    await asyncio.wait_for(run.complete[burst].wait(), run.timeout)
+            except asyncio.TimeoutError:
+                pass
+            missing += run.expected[burst] - run.received[burst]
+            await asyncio.sleep(options["pause"])
+        run.measuring = False
+
+        expected = sum(run.expected.values())
+        self.stdout.write(f"Zustellung: {expected - missing}/{expected} Meldungen in {options['bursts']} Bursts "
+                          f"({options['target']}), {run.dropped} Verbindungen verloren")
+        self.write_stats("Latenz", run.latencies)
+
+        for client in connected:
+            client.close()
+        await asyncio.sleep(0.5)
+
+    def write_stats(self, label, values):
+        if not values:
+            return
+        self.stdout.write(
+            f"{label}: p50 {percentile(values, 50):.1f} ms, p99 {percentile(values, 99):.1f} ms, "
+            f"max {max(values):.1f} ms"
+        )
@@ -0,0 +1,32 @@
+from mptt.managers import TreeManager
+from mptt.querysets import TreeQuerySet
+
+
+class CommentQueryset(TreeQuerySet):
+
+    def threads(self, tree_ids):
+        """
+        Every comment of the given threads in tree order.  Each top-level
+        comment is the root of its own tree, so a thread is exactly the
+        ``(tree_id, lft)`` range of one tree_id.
+        """
+        return self.filter(tree_id__in=tree_ids).select_related('author').order_by('tree_id', 'lft')
+
+    def forest(self, tree_ids):
+        """
+        The given threads as nested nodes: the roots in tree order, every node
+        carrying its replies in ``get_replies()``.
+        """
+        return self.threads(tree_ids).get_cached_trees()
+
+
+class CommentManager(TreeManager):
+
+    def get_queryset(self, *args, **kwargs):
+        return CommentQueryset(self.model, using=self._db).order_by(self.tree_id_attr, self.left_attr)
+
+    def threads(self, tree_ids):
+        return self.get_queryset().threads(tree_ids)
+
+    def forest(self, tree_ids):
+        return self.get_queryset().forest(tree_ids)
@@ -1,7 +1,14 @@
-from itertools import chain, zip_longest
-
 from django.db import models
-from django.db.models import F, Avg, Subquery, Count
+from django.db.models import F, Q, Avg, Count, Min
+from django.utils import timezone
+
+from ticket.business_hours import business_calendar, columns, mean_timedelta
+
+# Public holidays of this many past years are excluded from business hour filters
+HOLIDAY_YEARS = 10
+
+# Newest first, id as tie breaker for keyset pagination
+TIMELINE_ORDERING = ('-timestamp', '-id')
 
 
 class TicketEventQueryset(models.QuerySet):
@@ -15,6 +22,21 @@ class TicketEventQueryset(models.QuerySet):
     def default_set(self):
         return self.filter(user_to_notify=None)
 
+    def mark_seen(self, user, ticket_ids):
+        """
+        Marks the unread notifications of ``user`` for all given tickets as
+        seen with a single UPDATE.
+        """
+        return self.filter(user_to_notify=user, seen=False, ticket_id__in=ticket_ids).update(seen=True)
+
+    def timeline_for(self, user):
+        """
+        Dashboard timeline: ticket level events for staff, the own
+        notifications for everybody else.
+        """
+        events = self.default_set() if user.is_staff else self.filter(user_to_notify=user)
+        return events.select_related("author", "ticket__problem_source", "target_user", "comment")
+
     def event_type(self, type):
         return self.default_set().filter(type=type)
 
@@ -39,45 +61,58 @@ class TicketEventQueryset(models.QuerySet):
         return self.time_to_auto_assign().aggregate(Avg('time_to_auto_assign'))
 
     def created_during_business_hours(self):
+        start_hour, end_hour = business_calendar.hours
+        this_year = timezone.now().year
         return self.created().filter(
-            timestamp__hour__gt=9,
-            timestamp__hour__lt=16,
-            timestamp__week_day__lt=5,
-            timestamp__week_day__gte=0
+            timestamp__hour__gte=start_hour,
+            timestamp__hour__lt=end_hour,
+            timestamp__iso_week_day__in=business_calendar.iso_weekdays
+        ).exclude(
+            timestamp__date__in=business_calendar.holidays_between(this_year - HOLIDAY_YEARS, this_year)
         )
 
     def average_time_to_auto_assign_during_business_hours(self):
         ids = self.created_during_business_hours().values('ticket__id')
         return self.time_to_auto_assign().filter(ticket__in=ids).aggregate(Avg('time_to_auto_assign'))
 
-    def ticket(self, type):
-        return self.event_type(type).values('ticket')
-
-    def creation_time(self):
-        return self.ticket('new').annotate(creation_time=F('timestamp'))
-
-    def auto_assign_time(self):
-        return self.ticket('assigned').annotate(auto_assign_time=F('timestamp'))
-
-    def num_comments(self):
-        return self.ticket('comment').annotate(num_comments=Count('ticket'))
-
-    def num_followers_added(self):
-        return self.ticket('access_allowed').annotate(num_followers_added=Count('ticket'))
-
-    def all_ticket_stats(self):
-        queries = [
-            self.creation_time(),
-            self.auto_assign_time(),
-            self.num_comments(),
-            self.num_followers_added()
-        ]
-        result = [{**q1, **q2} for q1, q2 in zip_longest(queries[0], queries[1], fillvalue={})]
-        for i in range(2,len(queries)):
-            print(queries[i])
-            result = [{**q1, **q2} for q1, q2 in zip_longest(result, queries[i], fillvalue={})]
-
-        return result
+    def business_time_to_auto_assign(self):
+        """
+        Working time between ticket creation and automatic assignment, as an
+        array of seconds computed for all tickets at once.
+        """
+        rows = self.auto_assigned().values_list('ticket__created_date', 'timestamp')
+        created, assigned = columns(rows.iterator(), 2)
+        return business_calendar.durations(created, assigned)
+
+    def average_business_time_to_auto_assign(self):
+        return mean_timedelta(self.business_time_to_auto_assign())
+
+    def ticket_stats(self):
+        """
+        Interaction statistics per ticket, computed in a single grouped query
+        over the ticket level events.  Every statistic is a conditional
+        aggregate, so tickets lacking a certain event type simply get
+        NULL / 0 instead of shifting the rows of the other statistics.
+        """
+        response = Q(type__in=['comment', 'reply']) & ~Q(author=F('ticket__created_by'))
+        return self.default_set() \
+            .values('ticket') \
+            .annotate(
+                creation_time=Min('timestamp', filter=Q(type='new')),
+                first_assign_time=Min('timestamp', filter=Q(type='assigned')),
+                num_comments=Count('id', filter=Q(type='comment')),
+                num_followers_added=Count('id', filter=Q(type='access_allowed')),
+                first_response_time=Min('timestamp', filter=response),
+            ) \
+            .annotate(time_to_first_response=F('first_response_time') - F('creation_time')) \
+            .order_by('ticket')
+
+    def ticket_stats_page(self, after=0, limit=500):
+        """
+        Keyset page of ``ticket_stats``: the ticket id filter is applied before
+        grouping, so every page costs the same no matter how deep it is.
+        """
+        return self.ticket_stats().filter(ticket__gt=after)[:limit]
 
 
 class TicketEventManager(models.Manager):
@@ -85,6 +120,12 @@ class TicketEventManager(models.Manager):
     def get_queryset(self):
         return TicketEventQueryset(self.model, using=self._db)
 
+    def timeline_for(self, user):
+        return self.get_queryset().timeline_for(user)
+
+    def mark_seen(self, user, ticket_ids):
+        return self.get_queryset().mark_seen(user, ticket_ids)
+
     def assigned(self):
         return self.get_queryset().assigned()
 
@@ -109,11 +150,11 @@ class TicketEventManager(models.Manager):
     def average_time_to_auto_assign_during_business_hours(self):
         return self.get_queryset().average_time_to_auto_assign_during_business_hours()
 
-    def creation_time(self):
-        return self.get_queryset().creation_time()
+    def average_business_time_to_auto_assign(self):
+        return self.get_queryset().average_business_time_to_auto_assign()
 
-    def num_comments(self):
-        return self.get_queryset().num_comments()
+    def ticket_stats(self):
+        return self.get_queryset().ticket_stats()
 
-    def all_ticket_stats(self):
-        return self.get_queryset().all_ticket_stats()
+    def ticket_stats_page(self, after=0, limit=500):
+        return self.get_queryset().ticket_stats_page(after=after, limit=limit)
@@ -0,0 +1,61 @@
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from mptt.managers import TreeManager
+
+
+BREADCRUMB_SEPARATOR = " > "
+
+
+class ProblemSourceManager(TreeManager):
+
+    def subtree_tickets(self, tickets):
+        """
+        ``tickets`` restricted to the subtree of the problem source in
+        ``OuterRef``: nested set range of the same tree, the node included.
+        """
+        return tickets.filter(
+            problem_source__tree_id=OuterRef('tree_id'),
+            problem_source__lft__gte=OuterRef('lft'),
+            problem_source__lft__lte=OuterRef('rght'),
+        )
+
+    def with_user_ticket_counts(self, user):
+        """
+        Every problem source annotated with ``user_ticket_count``, the number
+        of tickets the user created anywhere in its subtree – one query for
+        the whole tree instead of a recursive COUNT per node.
+        """
+        tickets = self.model.ticket_set.rel.related_model.objects.filter(created_by=user)
+        counts = self.subtree_tickets(tickets) \
+            .order_by() \
+            .values('problem_source__tree_id') \
+            .annotate(total=Count('id')) \
+            .values('total')
+        return self.get_queryset().annotate(
+            user_ticket_count=Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+        )
+
+    def update_breadcrumbs(self, root=None):
+        """
+        Recomputes the stored breadcrumbs of ``root``'s subtree (every tree
+        without ``root``) in one tree-ordered pass: the ancestors' names are
+        kept on a stack by level.  Changed rows are written with a single bulk
+        UPDATE; returns their number.
+        """
+        nodes = root.get_family() if root is not None else self.get_queryset()
+        path = []
+        changed = []
+        for node in nodes.only('name', 'breadcrumb', 'tree_id', 'lft', 'rght', 'level'):
+            del path[node.level:]
+            path.append(node.name)
+            breadcrumb = BREADCRUMB_SEPARATOR.join(path)
+            # get_family liefert auch die Vorfahren – die bleiben unverändert
+            if root is not None and node.lft < root.lft:
+                continue
+            if node.breadcrumb != breadcrumb:
+                node.breadcrumb = breadcrumb
+                changed.append(node)
+            if root is not None and node.pk == root.pk:
+                root.breadcrumb = breadcrumb
+        self.bulk_update(changed, ['breadcrumb'], batch_size=500)
+        return len(changed)
@@ -2,8 +2,10 @@ from datetime import timedelta
 
 from django.db import models
 from django.db.models import Count, Q, F, Avg, Max, Min
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
+from ticket.business_hours import business_calendar, columns, average_per_group, as_timedelta, mean_timedelta
 
 
 
@@ -48,20 +50,8 @@ class TicketQueryset(models.QuerySet):
         return self.filter(query_title | query_ticket_author | query_problem_source | query_ticket_id) \
                | self.search_notes(query)
 
-    def all_user_tickets_containing(self, query, user):
-        created_by_user = Q(created_by=user)
-        followed_by_user = Q(followers__in=[user])
-        users_tickets = (created_by_user | followed_by_user)
-
-        return self.all_tickets_containing(query) & self.filter(users_tickets)
-
-    def search_tickets(self, query, created_or_followed_by=None):
-        if created_or_followed_by:
-            queryset = self.all_user_tickets_containing(query, created_or_followed_by)
-        else:
-            queryset = self.all_tickets_containing(query)
-
-        return queryset
+    def search_tickets(self, query):
+        return self.all_tickets_containing(query)
 
     def search_notes(self, query):
         ticket_ids_containing_query = self.raw(
@@ -98,6 +88,24 @@ class TicketQueryset(models.QuerySet):
                 results[date]["total_closed"] = i["total_closed"]
         return results
 
+    def kpi_counts(self, start, end):
+        """
+        Dashboard counters as one conditional aggregate over the tickets.
+        """
+        return self.aggregate(
+            opened_today=Count('id', filter=Q(created_date__gt=start, created_date__lt=end)),
+            closed_today=Count('id', filter=Q(completed=True, completed_date__gt=start, completed_date__lt=end)),
+            all_open=Count('id', filter=Q(completed=False)),
+            all_closed=Count('id', filter=Q(completed=True)),
+            all_open_high_priority=Count('id', filter=Q(completed=False, priority=2)),
+        )
+
+    def open_closed_counts(self):
+        return self.aggregate(
+            open=Count('id', filter=Q(completed=False)),
+            closed=Count('id', filter=Q(completed=True)),
+        )
+
     def group_by_problem_source(self):
         return self.all() \
             .values('problem_source__tree_id') \
@@ -134,20 +142,47 @@ class TicketQueryset(models.QuerySet):
             .annotate(average_processing_time=Avg(F('last_modified') - F('created_date'))) \
             .order_by('-average_processing_time')
 
+    def business_processing_time(self):
+        """
+        Working time (business hours, no weekends / public holidays, pauses
+        skipped) between creation and completion of every closed ticket.
+        Returns the user who closed the ticket alongside the durations.
+        """
+        rows = self.filter(completed=True).values_list(
+            'modified_by', 'created_date', Coalesce('completed_date', 'last_modified'), 'paused_until'
+        )
+        users, created, completed, paused_until = columns(rows.iterator(), 4)
+        return users, business_calendar.durations(created, completed, pause_ends=paused_until)
+
+    def average_business_processing_time(self):
+        _, durations = self.business_processing_time()
+        return mean_timedelta(durations)
+
+    def average_business_processing_time_per_user(self):
+        users, durations = self.business_processing_time()
+        users = [-1 if user is None else user for user in users]
+        user_ids, averages = average_per_group(users, durations)
+        return {int(user_id): as_timedelta(average) for user_id, average in zip(user_ids, averages)}
+
     def statistics_per_user(self):
         return self.filter(completed=True) \
-            .values('modified_by__first_name') \
+            .values('modified_by', 'modified_by__first_name') \
             .annotate(total_tickets_closed=Count('modified_by__first_name')) \
             .annotate(average_processing_time=Avg(F('last_modified') - F('created_date'))) \
             .annotate(max_processing_time=Max(F('last_modified') - F('created_date'))) \
             .annotate(min_processing_time=Min(F('last_modified') - F('created_date'))) \
             .order_by('-total_tickets_closed')
     
+    def accessible_by(self, user, roles):
+        """
+        Tickets the user is linked to in one of ``roles``, resolved through the
+        denormalized access table (an index range scan, no joins or DISTINCT).
+        """
+        access = self.model.access.rel.related_model.objects.filter(user=user, role__in=roles)
+        return self.filter(id__in=access.values('ticket_id'))
+
     def visible_to(self, user):
-        return self.filter(
-            Q(assigned_to=user) | Q(assigned_team__in=user.teams.all())
-        ).distinct()
-    
+        return self.accessible_by(user, ['assignee', 'team'])
 
 
 class TicketManager(models.Manager):
@@ -192,8 +227,8 @@ class TicketManager(models.Manager):
         return self.get_queryset().all_closed() \
             .order_by(*self.order_by).select_related(*self.related)
 
-    def search_tickets(self, query, created_or_followed_by=None):
-        return self.get_queryset().search_tickets(query, created_or_followed_by) \
+    def search_tickets(self, query):
+        return self.get_queryset().search_tickets(query) \
             .select_related(*self.related) \
             .distinct() \
             .order_by('-created_date')
@@ -211,6 +246,12 @@ class TicketManager(models.Manager):
     def open_closed_per_day(self):
         return self.get_queryset().open_closed_per_day()
 
+    def kpi_counts(self, start, end):
+        return self.get_queryset().kpi_counts(start, end)
+
+    def accessible_by(self, user, roles):
+        return self.get_queryset().accessible_by(user, roles)
+
     def group_by_problem_source(self):
         return self.get_queryset().group_by_problem_source()
 
@@ -235,5 +276,14 @@ class TicketManager(models.Manager):
     def average_processing_time_per_user(self):
         return self.get_queryset().average_processing_time_per_user()
 
+    def business_processing_time(self):
+        return self.get_queryset().business_processing_time()
+
+    def average_business_processing_time(self):
+        return self.get_queryset().average_business_processing_time()
+
+    def average_business_processing_time_per_user(self):
+        return self.get_queryset().average_business_processing_time_per_user()
+
     def statistics_per_user(self):
         return self.get_queryset().statistics_per_user()
@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill(apps, schema_editor):
+    Ticket = apps.get_model('ticket', 'Ticket')
+    TicketAccess = apps.get_model('ticket', 'TicketAccess')
+
+    def grant(role, pairs):
+        TicketAccess.objects.bulk_create(
+            [TicketAccess(user_id=user_id, ticket_id=ticket_id, role=role) for user_id, ticket_id in pairs if user_id],
+            ignore_conflicts=True,
+            batch_size=1000,
+        )
+
+    grant('creator', ((u, t) for t, u in Ticket.objects.values_list('id', 'created_by_id')))
+    grant('assignee', ((u, t) for t, u in Ticket.objects.values_list('id', 'assigned_to_id')))
+    grant('team', Ticket.objects.filter(assigned_team__members__isnull=False)
+          .values_list('assigned_team__members', 'id'))
+    grant('co_assignee', Ticket.co_assignees.through.objects.values_list('user_id', 'ticket_id'))
+    grant('follower', Ticket.followers.through.objects.values_list('user_id', 'ticket_id'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0010_team'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('ticket', '0002_auto_20251007_0821'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketAccess',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('creator', 'Creator'), ('assignee', 'Assignee'), ('co_assignee', 'Co Assignee'), ('team', 'Team'), ('follower', 'Follower')], max_length=20, verbose_name='Rolle')),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='access', to='ticket.ticket', verbose_name='Ticket')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='ticket_access', to=settings.AUTH_USER_MODEL, verbose_name='Benutzer')),
+            ],
+            options={
+                'verbose_name': 'Ticketzugriff',
+                'verbose_name_plural': 'Ticketzugriffe',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='ticketaccess',
+            index=models.Index(fields=['user', 'role', 'ticket'], name='ticket_access_user_role_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='ticketaccess',
+            constraint=models.UniqueConstraint(fields=('user', 'ticket', 'role'), name='ticket_access_unique'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations, models
+import django.db.models.functions.datetime
+
+from ticket.db_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY läuft nicht innerhalb einer Transaktion
+    atomic = False
+
+    dependencies = [
+        ('ticket', '0003_ticketaccess'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='ticket',
+            index=models.Index(fields=['completed', '-priority', '-created_date'], name='ticket_list_order_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='ticket',
+            index=models.Index(fields=['created_by', 'completed', '-priority', '-created_date'], name='ticket_creator_list_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='ticket',
+            index=models.Index(fields=['assigned_to', 'completed', '-priority', '-created_date'], name='ticket_assignee_list_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('completed', False)), fields=['last_modified', 'paused_until'], name='ticket_open_inactive_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='ticket',
+            index=models.Index(django.db.models.functions.datetime.TruncDate('created_date'), name='ticket_created_day_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='ticket',
+            index=models.Index(django.db.models.functions.datetime.TruncDate('completed_date'), name='ticket_completed_day_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+from ticket.db_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY läuft nicht innerhalb einer Transaktion
+    atomic = False
+
+    dependencies = [
+        ('ticket', '0004_ticket_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='ticketevent',
+            index=models.Index(condition=models.Q(('seen', False)), fields=['user_to_notify', '-timestamp'], name='event_unread_user_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='ticketevent',
+            index=models.Index(condition=models.Q(('user_to_notify__isnull', True)), fields=['ticket', '-timestamp', '-id'], name='event_ticket_timeline_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='ticketevent',
+            index=models.Index(condition=models.Q(('user_to_notify__isnull', True)), fields=['-timestamp', '-id'], name='event_staff_timeline_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='ticketevent',
+            index=models.Index(fields=['ticket', 'user_to_notify'], name='event_ticket_user_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='ticketevent',
+            index=models.Index(fields=['timestamp'], name='event_timestamp_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+from ticket.db_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY läuft nicht innerhalb einer Transaktion
+    atomic = False
+
+    dependencies = [
+        ('ticket', '0005_ticketevent_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='comment',
+            index=models.Index(fields=['tree_id', 'lft'], name='comment_thread_range_idx'),
+        ),
+    ]
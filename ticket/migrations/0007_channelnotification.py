@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ticket', '0006_comment_thread_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChannelNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('group', models.CharField(max_length=100, verbose_name='Gruppe')),
+                ('payload', models.JSONField(verbose_name='Inhalt')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Gesendet am')),
+            ],
+            options={
+                'verbose_name': 'WebSocket-Benachrichtigung',
+                'verbose_name_plural': 'WebSocket-Benachrichtigungen',
+                'indexes': [
+                    models.Index(fields=['group', 'id'], name='notification_replay_idx'),
+                    models.Index(fields=['created'], name='notification_age_idx'),
+                ],
+            },
+        ),
+    ]
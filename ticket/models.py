@@ -1,16 +1,21 @@
+import ast
 import datetime
 import random
 
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import TruncDate
 from django.utils import timezone
 from django_currentuser.db.models import CurrentUserField
 from mptt.fields import TreeForeignKey
 from mptt.models import MPTTModel
 
 from core.settings.common import AZURE_APP_ID, BASE_URL
+from ticket import backlog
+from ticket.managers.comment import CommentManager
 from ticket.managers.event import TicketEventManager
+from ticket.managers.problem_source import ProblemSourceManager
 from ticket.managers.ticket import TicketManager
 
 
@@ -20,7 +25,57 @@ def random_recent_date_time(time_in_days=180):
     return now - datetime.timedelta(seconds=random.randint(0, (time_in_days * 86400)))
 
 
-class ProblemSource(MPTTModel):
+class TrackedFieldsMixin:
+    """
+    Remembers the column values an instance was loaded (or last saved) with,
+    so changes are detected in memory instead of re-reading the row before a
+    save.  ``changed_fields`` is ``None`` for unsaved instances.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.snapshot()
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.snapshot()
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self.snapshot(fields)
+
+    def snapshot(self, fields=None):
+        """
+        Marks the current values as persisted (all loaded columns or only
+        ``fields``).
+        """
+        loaded = getattr(self, '_loaded_values', None) or {}
+        for field in self._meta.concrete_fields:
+            if fields is not None and field.name not in fields and field.attname not in fields:
+                continue
+            if field.attname in self.__dict__:
+                loaded[field.attname] = self.__dict__[field.attname]
+        self._loaded_values = loaded
+
+    @property
+    def changed_fields(self):
+        loaded = getattr(self, '_loaded_values', None)
+        if self._state.adding or loaded is None:
+            return None
+        return {
+            field.attname for field in self._meta.concrete_fields
+            if field.attname in self.__dict__ and (
+                field.attname not in loaded or loaded[field.attname] != self.__dict__[field.attname]
+            )
+        }
+
+    def previous_value(self, field):
+        return (getattr(self, '_loaded_values', None) or {}).get(field)
+
+
+class ProblemSource(TrackedFieldsMixin, MPTTModel):
     name = models.CharField(max_length=60, verbose_name="Name der Quelle")
     slug = models.SlugField(default="")
     breadcrumb = models.CharField(
@@ -33,6 +88,7 @@ class ProblemSource(MPTTModel):
         related_name='problem_source',
         on_delete=models.CASCADE,
         verbose_name="Oberquelle")
+    objects = ProblemSourceManager()
 
     class MPTTMeta:
         order_insertion_by = ['name']
@@ -45,23 +101,19 @@ class ProblemSource(MPTTModel):
         verbose_name_plural = "Problemquellen"
 
     def save(self, **kwargs):
-        self.breadcrumb = self.create_category_breadcrumb()
-        super(ProblemSource, self).save()
+        changed = self.changed_fields
+        with transaction.atomic():
+            super(ProblemSource, self).save()
+            # Neu, umbenannt oder verschoben: Breadcrumbs des ganzen Teilbaums neu schreiben
+            if changed is None or changed.intersection({'name', 'parent_id'}):
+                ProblemSource.objects.update_breadcrumbs(self)
+                self.snapshot(['breadcrumb'])
 
     def count_tickets(self, user):
         return Ticket.objects.filter(problem_source=self, created_by=user).count()
 
-    def count_user_tickets(self, user):
-        # Recursive count of tickets for single user
-        if self.has_children():
-            children = self.get_children()
-            count = sum([c.count_user_tickets(user) for c in children])
-        else:
-            count = Ticket.objects.filter(problem_source=self, created_by=user).count()
-        return count
-
     def has_children(self):
-        return True if self.get_children().count() > 0 else False
+        return not self.is_leaf_node()
 
     def create_category_breadcrumb(self):
         title = self.name
@@ -72,7 +124,7 @@ class ProblemSource(MPTTModel):
         return title
 
 
-class Ticket(models.Model):
+class Ticket(TrackedFieldsMixin, models.Model):
     title = models.CharField(max_length=100, blank=True, null=True, verbose_name='Titel')
     problem_source = models.ForeignKey(ProblemSource, on_delete=models.RESTRICT, null=True,
                                        verbose_name="Problemquelle")
@@ -130,7 +182,7 @@ class Ticket(models.Model):
         return f"{self.id} - {self.category}"
 
     # Auto-set the Task creation / completed date
-    def save(self, **kwargs):
+    def save(self, update_fields=None, **kwargs):
         # If Task is being marked complete, set the completed_date
         if not self.created_date and not settings.RANDOM_TIMES:
             self.created_date = timezone.now()
@@ -143,12 +195,15 @@ class Ticket(models.Model):
         if not self.completed and self.completed_date:
             self.completed_date = None
 
-        super(Ticket, self).save()
+        # Bestehende Tickets: nur geänderte Spalten schreiben
+        if update_fields is None and not kwargs.get('force_insert'):
+            update_fields = self.changed_fields
+
+        if update_fields is not None:
+            # Automatisch gepflegte Felder bei Teil-Updates mitschreiben
+            update_fields = {*update_fields, 'completed_date', 'last_modified', 'modified_by'}
 
-    def get_comments(self):
-        return Comment.objects.filter(ticket=self, level=0) \
-            .select_related('parent', 'author') \
-            .order_by('-created_date')
+        super(Ticket, self).save(update_fields=update_fields, **kwargs)
 
     def detail_page(self):
         return f"{settings.BASE_URL}/ticket/{self.id}/detail/"
@@ -198,12 +253,65 @@ class Ticket(models.Model):
 
     class Meta:
         ordering = ["priority", "created_date"]
+        indexes = [
+            # Listen (TicketManager.order_by), gesamt sowie je Ersteller / Bearbeiter
+            models.Index(fields=['completed', '-priority', '-created_date'], name='ticket_list_order_idx'),
+            models.Index(fields=['created_by', 'completed', '-priority', '-created_date'], name='ticket_creator_list_idx'),
+            models.Index(fields=['assigned_to', 'completed', '-priority', '-created_date'], name='ticket_assignee_list_idx'),
+            # Nur offene Tickets: open_and_inactive (last_modified) und not_paused (paused_until)
+            models.Index(
+                fields=['last_modified', 'paused_until'], condition=models.Q(completed=False), name='ticket_open_inactive_idx'
+            ),
+            # Analytics: Gruppierung nach created_date__date / completed_date__date
+            models.Index(TruncDate('created_date'), name='ticket_created_day_idx'),
+            models.Index(TruncDate('completed_date'), name='ticket_completed_day_idx'),
+        ]
+
+
+class TicketAccess(models.Model):
+    """
+    Denormalized ``(user, ticket, role)`` rows mirroring who is linked to a
+    ticket (creator, assignee, co-assignees, members of the assigned team and
+    followers).  Kept in sync by the receivers in ``ticket/signals.py`` so
+    "my tickets" lists and access checks are single index range scans.
+    """
+    class Role(models.TextChoices):
+        CREATOR = "creator"
+        ASSIGNEE = "assignee"
+        CO_ASSIGNEE = "co_assignee"
+        TEAM = "team"
+        FOLLOWER = "follower"
+
+    # Rollen, die Vollzugriff auf die Ticketdetails geben bzw. am Ticket arbeiten
+    FULL_ACCESS_ROLES = [Role.CREATOR, Role.ASSIGNEE, Role.CO_ASSIGNEE, Role.TEAM]
+    WORKING_ROLES = [Role.ASSIGNEE, Role.CO_ASSIGNEE, Role.TEAM]
+    SEARCH_ROLES = [Role.CREATOR, Role.FOLLOWER]
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="ticket_access", db_index=False, verbose_name="Benutzer"
+    )
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name="access", verbose_name="Ticket")
+    role = models.CharField(max_length=20, choices=Role.choices, verbose_name="Rolle")
+
+    class Meta:
+        verbose_name = 'Ticketzugriff'
+        verbose_name_plural = 'Ticketzugriffe'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'ticket', 'role'], name='ticket_access_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'role', 'ticket'], name='ticket_access_user_role_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.ticket_id} - {self.role}"
 
 
 class Attachment(models.Model):
     name = models.CharField(max_length=100, verbose_name="Dateiname")
     file = models.FileField(upload_to='ticket/attachments/', verbose_name="Datei")
     ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, verbose_name="Ticket")
+    sha256 = models.CharField(max_length=64, blank=True, default="", verbose_name="SHA-256")
 
     class Meta:
         verbose_name = 'Anhang'
@@ -217,7 +325,7 @@ class Attachment(models.Model):
         return extension
 
 
-class Comment(MPTTModel):
+class Comment(TrackedFieldsMixin, MPTTModel):
     author = CurrentUserField(related_name="creator", verbose_name="Autor")
     ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, verbose_name="Ticket")
     created_date = models.DateTimeField(auto_now_add=True, verbose_name="Erstellt am")
@@ -230,16 +338,24 @@ class Comment(MPTTModel):
         on_delete=models.CASCADE,
         verbose_name="Oberkommentar",
     )
+    objects = CommentManager()
 
     class Meta:
         verbose_name = 'Kommentar'
         verbose_name_plural = 'Kommentare'
+        indexes = [
+            # Ganze Threads als (tree_id, lft)-Bereich laden (CommentQueryset.threads)
+            models.Index(fields=['tree_id', 'lft'], name='comment_thread_range_idx'),
+        ]
 
     def has_replies(self):
-        return True if self.get_children().count() > 0 else False
+        return not self.is_leaf_node()
 
     def get_replies(self):
-        if self.rght > 2:
+        # Aus CommentManager.forest geladen: Antworten liegen schon im Speicher
+        if hasattr(self, '_cached_children'):
+            return self._cached_children
+        if self.has_replies():
             return Comment.objects.filter(parent=self) \
                 .select_related('author') \
                 .order_by('created_date')
@@ -247,7 +363,7 @@ class Comment(MPTTModel):
             return None
 
     def __str__(self):
-        return f"{self.id} - {self.ticket.title} - {self.parent_id}"
+        return f"{self.id} - {self.ticket_id} - {self.parent_id}"
 
 
 class TicketEvent(models.Model):
@@ -305,13 +421,32 @@ class TicketEvent(models.Model):
     class Meta:
         verbose_name = 'Benachrichtigung'
         verbose_name_plural = 'Benachrichtigungen'
+        indexes = [
+            # Ungelesene Benachrichtigungen je Benutzer (Context-Processor)
+            models.Index(
+                fields=['user_to_notify', '-timestamp'], condition=models.Q(seen=False), name='event_unread_user_idx'
+            ),
+            # Ticket-Timeline (get_unique_events) und Staff-Timeline (timeline_for), jeweils TIMELINE_ORDERING
+            models.Index(
+                fields=['ticket', '-timestamp', '-id'], condition=models.Q(user_to_notify__isnull=True),
+                name='event_ticket_timeline_idx'
+            ),
+            models.Index(
+                fields=['-timestamp', '-id'], condition=models.Q(user_to_notify__isnull=True),
+                name='event_staff_timeline_idx'
+            ),
+            # mark_events_as_seen
+            models.Index(fields=['ticket', 'user_to_notify'], name='event_ticket_user_idx'),
+            models.Index(fields=['timestamp'], name='event_timestamp_idx'),
+        ]
+
+    @staticmethod
+    def default_timestamp():
+        return random_recent_date_time() if settings.RANDOM_TIMES else timezone.now()
 
     def save(self, **kwargs):
         if not self.timestamp:
-            if settings.RANDOM_TIMES:
-                self.timestamp = random_recent_date_time()
-            else:
-                self.timestamp = timezone.now()
+            self.timestamp = self.default_timestamp()
         super(TicketEvent, self).save()
 
     def is_new(self):
@@ -433,6 +568,30 @@ class TicketEvent(models.Model):
             return "warning"
 
 
+class ChannelNotification(models.Model):
+    """
+    WebSocket notifications as sent to their channel group.  The id travels
+    with the message, so a reconnecting socket can replay what it missed
+    (``NotificationConsumer``); rows older than
+    ``NOTIFICATION_REPLAY_WINDOW`` are pruned periodically.
+    """
+    group = models.CharField(max_length=100, verbose_name="Gruppe")
+    payload = models.JSONField(verbose_name="Inhalt")
+    created = models.DateTimeField(auto_now_add=True, verbose_name="Gesendet am")
+
+    class Meta:
+        verbose_name = 'WebSocket-Benachrichtigung'
+        verbose_name_plural = 'WebSocket-Benachrichtigungen'
+        indexes = [
+            # Replay: id > last_event_id je Gruppe
+            models.Index(fields=['group', 'id'], name='notification_replay_idx'),
+            models.Index(fields=['created'], name='notification_age_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.id} - {self.group}"
+
+
 class Analytics(models.Model):
     name = models.CharField(max_length=64, verbose_name="Name")
     labels = models.TextField(verbose_name="Etiketten")
@@ -488,6 +647,55 @@ class Analytics(models.Model):
             }
         )
 
+    @classmethod
+    def update_backlog(cls, days=90, weeks=12):
+        today = timezone.now().date()
+        arrays = backlog.load_ticket_arrays(Ticket.objects.all())
+
+        backlog_days, open_per_priority = backlog.open_backlog_per_day(
+            arrays, today - datetime.timedelta(days=days - 1), today
+        )
+        Analytics.objects.update_or_create(
+            name='Offene Tickets pro Tag',
+            defaults={
+                'labels': [day.strftime('%d.%m.%Y') for day in backlog_days.tolist()],
+                'data': open_per_priority.tolist()
+            }
+        )
+
+        Analytics.objects.update_or_create(
+            name='Alter offener Tickets',
+            defaults={
+                'labels': backlog.AGING_LABELS,
+                'data': backlog.aging_buckets(arrays, today).tolist()
+            }
+        )
+
+        cohort_weeks, cohort_sizes, closure_rates = backlog.weekly_cohort_closure_rates(arrays, weeks, today)
+        Analytics.objects.update_or_create(
+            name='Abschlussquote pro Woche',
+            defaults={
+                'labels': [week.strftime('%d.%m.%Y') for week in cohort_weeks.tolist()],
+                'data': [cohort_sizes.tolist(), (closure_rates.T * 100).round(1).tolist()]
+            }
+        )
+
+    @staticmethod
+    def get_backlog(analytics=None):
+        """
+        Parsed labels and data of the backlog charts, keyed by analytics name.
+        Already loaded analytics rows can be passed in to skip the query.
+        """
+        names = ['Offene Tickets pro Tag', 'Alter offener Tickets', 'Abschlussquote pro Woche']
+        if analytics is None:
+            analytics = Analytics.objects.filter(name__in=names)
+        return {
+            a.name: {
+                'labels': ast.literal_eval(a.labels) if a.labels else [],
+                'data': ast.literal_eval(a.data) if a.data else [],
+            } for a in analytics if a.name in names
+        }
+
     @staticmethod
     def get_tickets_per_day():
         return Analytics.objects.get(name='Tickets pro Tag')
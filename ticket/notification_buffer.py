@@ -0,0 +1,165 @@
+import asyncio
+import itertools
+import logging
+from contextlib import contextmanager
+
+from datetime import timedelta
+
+from asgiref.local import Local
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from ticket.models import ChannelNotification
+
+log = logging.getLogger(__name__)
+
+# Nur Benachrichtigungen werden nachgeliefert; Gruppenwechsel und Live-Diffs nicht
+REPLAYABLE_TYPES = {"send_notification"}
+
+_local = Local()
+_unique_keys = itertools.count()
+
+
+class NotificationBuffer:
+    """
+    Channel-layer messages of one request.  Messages with the same
+    ``(group, ticket, kind)`` key replace each other, the last one wins.
+    """
+
+    def __init__(self):
+        self.messages = {}
+
+    def add(self, key, group, message):
+        self.messages.pop(key, None)
+        self.messages[key] = (group, message)
+
+    def flush(self):
+        messages, self.messages = list(self.messages.values()), {}
+        send_batch(messages)
+
+
+def send_batch(messages):
+    """
+    Publishes ``(group, message)`` pairs with a single hop into the event
+    loop; the group sends run concurrently, so the Redis round trips of the
+    batch overlap instead of blocking the thread one after another.
+    """
+    if not messages:
+        return
+    channel_layer = get_channel_layer()
+    if not channel_layer:
+        log.warning("Channel layer not available; skipped %s notification(s)", len(messages))
+        return
+    messages = store(messages)
+
+    async def send_all():
+        results = await asyncio.gather(
+            *(channel_layer.group_send(group, message) for group, message in messages), return_exceptions=True
+        )
+        for (group, _), result in zip(messages, results):
+            if isinstance(result, Exception):
+                log.warning("Notify to group=%s failed: %s", group, result)
+
+    async_to_sync(send_all)()
+
+
+def store(messages):
+    """
+    Writes the replayable messages of a batch to ``ChannelNotification``
+    (one INSERT) and returns the batch with each row id as ``id`` in the
+    message content – the client's resume point.
+    """
+    rows = [
+        ChannelNotification(group=group, payload=message["content"])
+        for group, message in messages if message["type"] in REPLAYABLE_TYPES
+    ]
+    if not rows:
+        return messages
+    if connection.features.can_return_rows_from_bulk_insert:
+        ChannelNotification.objects.bulk_create(rows)
+    else:
+        # SQLite (Entwicklung) liefert bei bulk_create keine ids zurück
+        for row in rows:
+            row.save()
+
+    ids = iter(row.id for row in rows)
+    return [
+        (group, {**message, "content": {**message["content"], "id": next(ids)}})
+        if message["type"] in REPLAYABLE_TYPES else (group, message)
+        for group, message in messages
+    ]
+
+
+def missed_notifications(groups, last_event_id):
+    """
+    Notifications for ``groups`` after ``last_event_id`` within the replay
+    window, oldest first – one query.
+    """
+    since = timezone.now() - timedelta(seconds=settings.NOTIFICATION_REPLAY_WINDOW)
+    rows = ChannelNotification.objects \
+        .filter(group__in=groups, id__gt=last_event_id, created__gte=since) \
+        .order_by('id')[:settings.NOTIFICATION_REPLAY_LIMIT]
+    return [{**row.payload, "id": row.id} for row in rows]
+
+
+def latest_notification_id():
+    return ChannelNotification.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def prune_notifications():
+    since = timezone.now() - timedelta(seconds=settings.NOTIFICATION_REPLAY_WINDOW)
+    return ChannelNotification.objects.filter(created__lt=since).delete()[0]
+
+
+def publish(group, payload, kind=None, ticket_id=None, type="send_notification"):
+    """
+    Queues a message for ``group`` once the current transaction commits (a
+    rollback drops it).  Within a request the committed messages are
+    collected and sent in one batch at the end, deduplicated by
+    ``(group, ticket_id, kind)``; messages without ``kind`` are never merged.
+    """
+    key = (group, ticket_id, kind) if kind else next(_unique_keys)
+    message = {"type": type, "content": payload}
+    transaction.on_commit(lambda: _committed(key, group, message))
+
+
+def _committed(key, group, message):
+    buffer = getattr(_local, "buffer", None)
+    if buffer is None:
+        # Außerhalb eines Requests (Tasks, Shell): sofort senden
+        send_batch([(group, message)])
+    else:
+        buffer.add(key, group, message)
+
+
+@contextmanager
+def buffered_notifications():
+    """
+    Collects the notifications published inside the block and sends them
+    as one batch when it ends.  Nested blocks share the outer buffer.
+    """
+    if getattr(_local, "buffer", None) is not None:
+        yield _local.buffer
+        return
+    buffer = _local.buffer = NotificationBuffer()
+    try:
+        yield buffer
+    finally:
+        _local.buffer = None
+        buffer.flush()
+
+
+class NotificationBufferMiddleware:
+    """
+    One notification batch per request, sent after the view returned.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with buffered_notifications():
+            return self.get_response(request)
@@ -0,0 +1,144 @@
+import base64
+import datetime
+import json
+from collections import namedtuple
+
+from django.core.exceptions import FieldDoesNotExist, FieldError, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+KeysetPage = namedtuple('KeysetPage', ['items', 'next_cursor', 'previous_cursor'], defaults=[None])
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """
+    Keeps the microseconds DjangoJSONEncoder drops: a cursor cut to
+    milliseconds would not exclude its own row.
+    """
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values):
+    payload = json.dumps(list(values), cls=CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Cursor values or ``None`` for a missing / malformed cursor (= first page).
+    """
+    if not cursor:
+        return None
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (ValueError, TypeError):
+        return None
+
+
+def ordering_field(queryset, name):
+    """
+    Model field (or annotation output field) behind the ordering column
+    ``name`` of ``queryset``; ``None`` if it cannot be resolved.
+    """
+    if name in queryset.query.annotations:
+        try:
+            return queryset.query.annotations[name].output_field
+        except FieldError:
+            return None
+    model, field = queryset.model, None
+    for attribute in name.split('__'):
+        if model is None:
+            return None
+        try:
+            field = model._meta.pk if attribute == 'pk' else model._meta.get_field(attribute)
+        except FieldDoesNotExist:
+            return None
+        model = field.related_model
+    return field
+
+
+def clean_cursor_values(queryset, ordering, values):
+    """
+    Cursor ``values`` converted with ``to_python`` of the ordering columns,
+    or ``None`` (= first page) if they do not fit them.  A cursor is user
+    input: a tampered one must not turn into a failing query.
+    """
+    if not isinstance(values, list) or len(values) != len(ordering):
+        return None
+    cleaned = []
+    for field, value in zip(ordering, values):
+        if value is None:
+            return None
+        model_field = ordering_field(queryset, field.lstrip('-'))
+        if model_field is not None:
+            try:
+                value = model_field.to_python(value)
+            except (ValidationError, TypeError, ValueError):
+                return None
+        elif not isinstance(value, (str, int, float)):
+            return None
+        cleaned.append(value)
+    return cleaned
+
+
+def keyset_filter(ordering, values):
+    """
+    Rows strictly after ``values`` in ``ordering``, e.g. for ('-timestamp', '-id'):
+    timestamp < t OR (timestamp = t AND id < i).
+    """
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+def cursor_values(item, ordering):
+    values = []
+    for field in ordering:
+        value = item
+        for attribute in field.lstrip('-').split('__'):
+            value = getattr(value, attribute, None) if not isinstance(value, dict) else value.get(attribute)
+        values.append(value)
+    return values
+
+
+def reverse_ordering(ordering):
+    return tuple(field[1:] if field.startswith('-') else f'-{field}' for field in ordering)
+
+
+def paginate_keyset(queryset, ordering, cursor=None, per_page=50, backwards=False):
+    """
+    One page of ``queryset`` in ``ordering`` (which has to end with a unique
+    column) following ``cursor`` – or, with ``backwards``, the page preceding
+    it.  Only ``per_page + 1`` rows are fetched, no OFFSET and no COUNT are
+    needed, so every page costs the same.  Ordering columns must not be NULL
+    (coalesce nullable ones in an annotation).
+    """
+    values = clean_cursor_values(queryset, ordering, decode_cursor(cursor))
+    scan_ordering = reverse_ordering(ordering) if backwards and values is not None else tuple(ordering)
+
+    queryset = queryset.order_by(*scan_ordering)
+    if values is not None:
+        queryset = queryset.filter(keyset_filter(scan_ordering, values))
+
+    items = list(queryset[:per_page + 1])
+    has_more = len(items) > per_page
+    items = items[:per_page]
+
+    if scan_ordering != tuple(ordering):
+        items.reverse()
+        has_next, has_previous = bool(items), has_more
+    else:
+        has_next, has_previous = has_more, values is not None and bool(items)
+
+    next_cursor = encode_cursor(cursor_values(items[-1], ordering)) if has_next else None
+    previous_cursor = encode_cursor(cursor_values(items[0], ordering)) if has_previous else None
+    return KeysetPage(items=items, next_cursor=next_cursor, previous_cursor=previous_cursor)
@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import cached_property
+
+from ticket.models import TicketAccess
+
+TEAM_IDS_KEY = 'team_ids:{}'
+
+
+def team_ids_for(user):
+    """
+    Ids of the user's teams, cached per user for ``TEAM_MEMBERSHIP_TTL``
+    seconds and dropped whenever ``Team.members`` changes.
+    """
+    key = TEAM_IDS_KEY.format(user.id)
+    team_ids = cache.get(key)
+    if team_ids is None:
+        team_ids = frozenset(user.teams.values_list('id', flat=True))
+        cache.set(key, team_ids, settings.TEAM_MEMBERSHIP_TTL)
+    return team_ids
+
+
+def invalidate_team_ids(user_ids):
+    cache.delete_many([TEAM_IDS_KEY.format(user_id) for user_id in user_ids])
+
+
+class PermissionResolver:
+    """
+    Ticket permissions of one user, resolved once per request: single tickets
+    are decided in memory from the ticket's ids (and prefetched
+    co-assignees), lists get an SQL predicate on the access table.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.user_id = user.id
+        self.is_authenticated = user.is_authenticated
+        self.is_staff = self.is_authenticated and user.is_staff
+
+    @cached_property
+    def team_ids(self):
+        return team_ids_for(self.user) if self.is_authenticated else frozenset()
+
+    def has_full_access(self, ticket):
+        """Darf Details sehen (aber nicht zwingend verwalten)."""
+        if not self.is_authenticated:
+            return False
+        if self.is_staff:
+            return True
+        if self.user_id in (ticket.created_by_id, ticket.assigned_to_id):
+            return True
+        if ticket.assigned_team_id and ticket.assigned_team_id in self.team_ids:
+            return True
+        # Mit prefetch_related('co_assignees') ohne weitere Abfrage
+        return any(user.id == self.user_id for user in ticket.co_assignees.all())
+
+    def can_claim(self, ticket):
+        """Darf ein unzugewiesenes Ticket übernehmen (Auto-Zuweisung beim Öffnen)."""
+        return self.is_staff or self.has_full_access(ticket)
+
+    def can_manage(self, ticket):
+        """Darf mutierende Aktionen ausführen (nur Hauptbearbeiter)."""
+        return self.is_authenticated and ticket.assigned_to_id == self.user_id
+
+    def filter_tickets(self, tickets, roles=TicketAccess.FULL_ACCESS_ROLES):
+        """
+        ``tickets`` restricted to what the user may see: everything for staff,
+        otherwise ``TicketQueryset.accessible_by`` in one of ``roles``.
+        """
+        if self.is_staff:
+            return tickets
+        if not self.is_authenticated:
+            return tickets.none()
+        return tickets.accessible_by(self.user, roles)
+
+
+def permissions_for(request):
+    """
+    The request's ``PermissionResolver``, created on first use.
+    """
+    resolver = getattr(request, '_ticket_permissions', None)
+    if resolver is None or resolver.user is not request.user:
+        resolver = request._ticket_permissions = PermissionResolver(request.user)
+    return resolver
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from ticket.models import Ticket
+
+COMMON_PROBLEM_SOURCES_KEY = 'common_problem_sources:{}'
+
+
+def common_problem_sources_for(user, limit=4):
+    """
+    The problem sources the user picks most often, cached per user for
+    ``COMMON_PROBLEM_SOURCES_TTL`` seconds and dropped when the user creates
+    a ticket or one of the user's tickets changes its problem source.
+    """
+    key = COMMON_PROBLEM_SOURCES_KEY.format(user.id)
+    sources = cache.get(key)
+    if sources is None:
+        sources = list(Ticket.objects.get_common_problem_sources_for(user)[:limit])
+        cache.set(key, sources, settings.COMMON_PROBLEM_SOURCES_TTL)
+    return sources
+
+
+def invalidate_common_problem_sources(user_id):
+    cache.delete(COMMON_PROBLEM_SOURCES_KEY.format(user_id))
@@ -0,0 +1,119 @@
+import copy
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.functional import cached_property
+from mptt.utils import get_cached_trees
+
+from authentication.models import Team
+from ticket.models import ProblemSource
+
+REFERENCE_DATA_VERSION_KEY = 'reference_data_version'
+
+_snapshot = None
+
+
+class ReferenceData:
+    """
+    Problem source tree, staff directory and teams of this process.  These
+    change a few times a month, so every process keeps them in memory and
+    only reloads a part when it is first used after the shared version key
+    changed.  The model instances are shared between requests – read only.
+    """
+
+    def __init__(self, version):
+        self.version = version
+
+    @cached_property
+    def problem_sources(self):
+        """
+        All nodes in tree order; parents and children are cached on the nodes,
+        so breadcrumbs and children are built without queries.
+        """
+        nodes = list(ProblemSource.objects.all())
+        get_cached_trees(nodes)
+        return nodes
+
+    @cached_property
+    def problem_source_roots(self):
+        return [source for source in self.problem_sources if source.parent_id is None]
+
+    @cached_property
+    def problem_sources_by_slug(self):
+        return {source.slug: source for source in self.problem_sources}
+
+    @cached_property
+    def problem_sources_by_id(self):
+        return {source.id: source for source in self.problem_sources}
+
+    @cached_property
+    def problem_sources_by_breadcrumb(self):
+        return {source.create_category_breadcrumb(): source for source in self.problem_sources}
+
+    @cached_property
+    def staff(self):
+        return list(User.objects.filter(is_staff=True).order_by('id'))
+
+    @cached_property
+    def staff_ids(self):
+        return frozenset(user.id for user in self.staff)
+
+    @cached_property
+    def teams(self):
+        return list(Team.objects.order_by('name'))
+
+    @cached_property
+    def teams_by_id(self):
+        return {team.id: team for team in self.teams}
+
+    def problem_source(self, slug):
+        """
+        Like ``ProblemSource.objects.get(slug=slug)``, from memory.
+        """
+        try:
+            return self.problem_sources_by_slug[slug]
+        except KeyError:
+            raise ProblemSource.DoesNotExist(f"ProblemSource with slug {slug!r} does not exist.")
+
+    def problem_source_children(self, parent=None):
+        return list(parent.get_children()) if parent else self.problem_source_roots
+
+    def problem_source_tree(self):
+        """
+        Copies of the nodes for ``{% recursetree %}``, which rewrites the
+        cached children – the shared nodes must not change while another
+        thread renders them.
+        """
+        return [copy.copy(source) for source in self.problem_sources]
+
+
+def reference_data():
+    """
+    The reference data of this process, reloaded (lazily, part by part) as
+    soon as another process bumped the version.
+    """
+    global _snapshot
+    version = cache.get(REFERENCE_DATA_VERSION_KEY)
+    if version is None:
+        version = _new_version()
+    if _snapshot is None or _snapshot.version != version:
+        _snapshot = ReferenceData(version)
+    return _snapshot
+
+
+def _new_version():
+    version = uuid.uuid4().hex
+    cache.set(REFERENCE_DATA_VERSION_KEY, version, None)
+    return version
+
+
+def bump_reference_data_version():
+    """
+    Invalidates the reference data of every process.  Bumped right away (the
+    own transaction sees its changes) and again after the commit, so no
+    process keeps data it loaded before the changes were visible.
+    """
+    _new_version()
+    transaction.on_commit(_new_version)
@@ -1,18 +1,25 @@
-import itertools
-import operator
 import urllib
 
 from background_task import background
 from django.conf import settings
 from django.core.mail import send_mail
+from django.db import transaction
+from django.utils import timezone
 
 from authentication.graph_api.base import GraphAPI
 from authentication.models import MicrosoftProfile
 from core.settings.common import EMAIL_HOST_USER, BASE_URL, AZURE_APP_ID
-from ticket.models import TicketEvent, Comment
+from ticket.managers.event import TIMELINE_ORDERING
+from ticket import access
+from ticket.consumers import ticket_group
+from ticket.models import Ticket, TicketEvent, Comment
+from ticket.notification_buffer import publish
+from ticket.pagination import cursor_values, encode_cursor, paginate_keyset
 
 graph_api = GraphAPI()
 
+TIMELINE_PAGE_SIZE = 30
+
 
 @background(schedule=1)
 def send_background_notification(ms_id, payload):
@@ -53,7 +60,7 @@ class TicketEventService:
             self.followers = ticket.followers.all()
 
     def mark_events_as_seen(self):
-        TicketEvent.objects.filter(ticket=self.ticket, user_to_notify=self.current_user).update(seen=True)
+        TicketEvent.objects.mark_seen(self.current_user, [self.ticket.id])
 
     def create_ticket_events(self,
                              type,
@@ -64,62 +71,93 @@ class TicketEventService:
                              is_automatic=False,
                              reopen=True):
 
-        # Create event just for the ticket, independent of user, to be shown on detail.
-        TicketEvent.objects.create(
+        # Event just for the ticket, independent of user, to be shown on detail, plus the
+        # internal notifications/timeline events for all followers.
+        events = [dict(
             type=type,
-            ticket=self.ticket,
             target_user=target_user,
             comment=comment,
             is_internal=is_internal,
-            is_automatic=is_automatic
-        )
+            is_automatic=is_automatic,
+            skip_teams=skip_teams,
+        )]
 
         # Automatically reopen the ticket if closed and event isnt reopen or close
         if self.ticket.completed and type not in [self.event_types.REOPEN, self.event_types.CLOSE] and reopen:
-            TicketEvent.objects.create(
-                type=self.event_types.REOPEN,
-                ticket=self.ticket,
-                is_automatic=True
-            )
+            events.append(dict(type=self.event_types.REOPEN, is_automatic=True, notify_followers=False))
             self.ticket.completed = False
-            self.ticket.save()
-
-        # Create internal notifications/timeline events for all followers.
-        for user in self.followers:
-            seen = False if user != self.current_user else True
-            notification = TicketEvent.objects.create(
-                type=type,
-                ticket=self.ticket,
-                target_user=target_user,
-                user_to_notify=user,
-                seen=seen,
-                comment=comment,
-                is_internal=is_internal
-            )
+            self.save_reopened_ticket()
 
-            # FIXME: Review for generalization
+        self.emit(events)
 
-            try:
-                ms_profile = MicrosoftProfile.objects.get(user=user)
-                if not seen and ms_profile.should_receive_this_notification(type=type) and not skip_teams:
-                    send_background_notification(
-                        ms_id=ms_profile.ms_id,
-                        payload=self.create_notification_payload(notification=notification)
-                    )
-                    print(f"SENDING {type.upper()} NOTIFICATION TO: {user.first_name}")
-                elif not seen \
-                        and ms_profile.should_receive_this_notification(type=type) \
-                        and not skip_teams:
-                    print(f"NOT IN DOMAIN, SENDING EMAIL NOTIFICATION TO: {user.first_name}")
-                    self.create_and_send_email_notification(notification=notification)
-                else:
-                    print(f"SKIPPING SENDING {type.upper()} NOTIFICATION TO: {user.first_name}")
-                    pass
-            except:
+    def save_reopened_ticket(self):
+        self.ticket.save()
+
+    def emit(self, events):
+        """
+        Writes the ticket level events and the follower notifications for
+        ``events`` with one bulk INSERT, then sends the Teams / e-mail
+        notifications.  Followers and their Microsoft profiles are loaded once
+        for the whole batch.
+        """
+        followers = list(self.followers)
+        profiles = {p.user_id: p for p in MicrosoftProfile.objects.filter(user__in=followers)}
+
+        rows = []
+        to_notify = []
+        for event in events:
+            event = dict(event)
+            notify_followers = event.pop('notify_followers', True)
+            skip_teams = event.pop('skip_teams', False)
+            timestamp = TicketEvent.default_timestamp()
+            rows.append(TicketEvent(ticket=self.ticket, timestamp=timestamp, **event))
+            if not notify_followers:
+                continue
+
+            for user in followers:
+                seen = False if user != self.current_user else True
+                notification = TicketEvent(
+                    type=event['type'],
+                    timestamp=timestamp,
+                    ticket=self.ticket,
+                    target_user=event.get('target_user'),
+                    user_to_notify=user,
+                    seen=seen,
+                    comment=event.get('comment'),
+                    is_internal=event.get('is_internal', False)
+                )
+                rows.append(notification)
                 if not seen and not skip_teams:
-                    print(f"MSID UNAVAILABLE, SENDING EMAIL NOTIFICATION TO: {user.first_name}")
-                    self.create_and_send_email_notification(notification=notification)
-                pass
+                    to_notify.append(notification)
+
+        TicketEvent.objects.bulk_create(rows)
+        # Offene Detailseiten holen sich die neuen Ereignisse (TicketLiveView)
+        publish(ticket_group(self.ticket.id), {"timeline": True}, kind="timeline", ticket_id=self.ticket.id,
+                type="ticket.update")
+
+        for notification in to_notify:
+            self.send_notification(notification, profiles.get(notification.user_to_notify_id))
+
+    def send_notification(self, notification, ms_profile):
+        user = notification.user_to_notify
+        type = notification.type
+
+        # FIXME: Review for generalization
+        if ms_profile is None:
+            print(f"MSID UNAVAILABLE, SENDING EMAIL NOTIFICATION TO: {user.first_name}")
+            self.create_and_send_email_notification(notification=notification)
+        elif ms_profile.should_receive_this_notification(type=type):
+            try:
+                send_background_notification(
+                    ms_id=ms_profile.ms_id,
+                    payload=self.create_notification_payload(notification=notification)
+                )
+                print(f"SENDING {type.upper()} NOTIFICATION TO: {user.first_name}")
+            except Exception:
+                print(f"TEAMS NOTIFICATION FAILED, SENDING EMAIL NOTIFICATION TO: {user.first_name}")
+                self.create_and_send_email_notification(notification=notification)
+        else:
+            print(f"SKIPPING SENDING {type.upper()} NOTIFICATION TO: {user.first_name}")
 
     def create_and_send_email_notification(self, notification):
         if not settings.DEBUG:
@@ -319,28 +357,72 @@ class TicketEventService:
             skip_teams=skip_teams
         )
 
-    def get_unique_events(self):
-        unfiltered_timeline_events = TicketEvent.objects\
+    def get_timeline_events(self):
+        return TicketEvent.objects\
             .filter(ticket=self.ticket, user_to_notify__isnull=True)\
-            .select_related("author", "ticket", "target_user", "comment", "comment__parent")
+            .select_related("author", "ticket", "target_user")
 
-        for event in unfiltered_timeline_events:
-            event.event_text = self.get_event_text(
-                event=event, author=event.author, target_user=event.target_user
-            )
-        return self.group_timeline_events_by_date(unfiltered_timeline_events)
+    def get_unique_events(self, before=None, per_page=TIMELINE_PAGE_SIZE):
+        """
+        One keyset page of the ticket timeline, newest first.  Returns the
+        events grouped by day and the cursor of the next (older) page.
+        """
+        page = paginate_keyset(self.get_timeline_events(), TIMELINE_ORDERING, before, per_page)
+        self.attach_comment_forest(page.items)
+        return self.group_timeline_events_by_date(page.items, add_text=True), page.next_cursor
+
+    def get_new_events(self, after, per_page=TIMELINE_PAGE_SIZE):
+        """
+        Events newer than the ``after`` cursor (the newest event a viewer
+        already has), newest first, with their comment threads attached.
+        Returns the events, the forest roots of the threads and whether even
+        newer events are left for another call.
+        """
+        page = paginate_keyset(self.get_timeline_events(), TIMELINE_ORDERING, after, per_page, backwards=True)
+        roots = self.attach_comment_forest(page.items)
+        return page.items, roots, page.previous_cursor is not None
+
+    @staticmethod
+    def timeline_cursor(event):
+        return encode_cursor(cursor_values(event, TIMELINE_ORDERING))
+
+    def attach_comment_forest(self, events):
+        """
+        Points the events at nodes of their comment threads, loaded as whole
+        ``(tree_id, lft)`` ranges in one query, so the comments and their
+        replies cost one query for the page.  Returns the roots of the threads.
+        """
+        comment_ids = [event.comment_id for event in events if event.comment_id]
+        if not comment_ids:
+            return []
+        tree_ids = Comment.objects.filter(id__in=comment_ids).values('tree_id')
+        nodes = {}
+        roots = list(Comment.objects.forest(tree_ids))
+        pending = list(roots)
+        while pending:
+            node = pending.pop()
+            nodes[node.id] = node
+            pending.extend(node.get_replies())
+        for event in events:
+            if event.comment_id in nodes:
+                event.comment = nodes[event.comment_id]
+        return roots
 
     def group_timeline_events_by_date(self, timeline_events, add_text=False):
-        if add_text:
-            for event in timeline_events:
+        """
+        Groups events already ordered newest first by day while iterating,
+        without sorting them again in Python.
+        """
+        grouped_list = []
+        for event in timeline_events:
+            if add_text:
                 event.event_text = self.get_event_text(
                     event=event, author=event.author, target_user=event.target_user
                 )
-        group_attribute = operator.attrgetter('date')
-        grouped_list = [list(g) for k, g in
-                        itertools.groupby(sorted(timeline_events, key=group_attribute, reverse=True), group_attribute)]
-        for group in grouped_list:
-            group.sort(key=lambda x: x.time, reverse=True)
+            if grouped_list and grouped_list[-1][0].date == event.date:
+                grouped_list[-1].append(event)
+            else:
+                grouped_list.append([event])
         return grouped_list
 
     def get_event_text(self, event, author, target_user):
@@ -405,3 +487,71 @@ class TicketEventService:
                 return f"{author_name} hat die zusätzliche Zuweisung von {target_user_name} entfernt"
         else:
             return "neues Ereignis"
+
+
+class TicketChangeSet(TicketEventService):
+    """
+    Unit of work for one request changing a ticket.  Field changes are
+    collected with ``set`` and written by ``commit`` in a single UPDATE
+    restricted to the changed columns; the timeline events and notifications
+    requested through the usual ``create_*_events`` helpers are created in one
+    batch once the surrounding transaction has been committed.
+    """
+
+    def __init__(self, ticket, current_user=None):
+        super().__init__(ticket=ticket, current_user=current_user)
+        self.changed_fields = set()
+        self.touched = False
+        self.pending_events = []
+
+    def set(self, field, value):
+        """
+        Sets ``field`` and records it for the UPDATE.  Returns whether the
+        value actually changed.
+        """
+        if getattr(self.ticket, field) == value:
+            return False
+        setattr(self.ticket, field, value)
+        self.changed_fields.add(field)
+        return True
+
+    def touch(self):
+        # Änderung ohne eigene Spalte (z. B. M2M): last_modified / modified_by trotzdem setzen
+        self.touched = True
+
+    def save_reopened_ticket(self):
+        self.changed_fields.add('completed')
+
+    def emit(self, events):
+        self.pending_events.extend(events)
+
+    def commit(self):
+        if self.changed_fields or self.touched:
+            self.ticket.save(update_fields=self.changed_fields)
+
+        events, self.pending_events = self.pending_events, []
+        if events:
+            transaction.on_commit(lambda: TicketEventService.emit(self, events))
+
+
+def claim_ticket(ticket, user):
+    """
+    Assigns an unassigned ticket to ``user`` with a compare-and-set UPDATE:
+    when several agents open a new ticket at the same time only the first
+    one gets it.  Returns whether ``user`` won.
+    """
+    with transaction.atomic():
+        claimed = Ticket.objects.filter(id=ticket.id, assigned_to__isnull=True) \
+            .update(assigned_to=user, modified_by=user, last_modified=timezone.now())
+        if not claimed:
+            return False
+
+        # update() umgeht die Signale: Zugriffstabelle direkt nachziehen
+        ticket.assigned_to = user
+        ticket.snapshot(['assigned_to'])
+        access.sync_ticket(ticket, ['assigned_to_id'])
+
+        changes = TicketChangeSet(ticket=ticket, current_user=user)
+        changes.create_assign_events(is_automatic=True)
+        changes.commit()
+    return True
@@ -1,6 +1,7 @@
 # ticket/signals.py
 import logging
 from email.utils import parseaddr
+import hashlib
 import html as ihtml
 import re
 
@@ -12,12 +13,18 @@ from django.urls import reverse
 from django_mailbox.signals import message_received
 from django_mailbox.models import Message as MailMessage
 
-from django.db.models.signals import post_save, m2m_changed, pre_save
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
+from django.db.models.signals import post_save, m2m_changed, post_delete, pre_delete, pre_save
 from django.contrib.auth import get_user_model
 
-from ticket.models import Ticket, ProblemSource, Attachment
+from authentication.models import Team
+from ticket import access
+from ticket.consumers import STAFF_GROUP, team_group, ticket_group, user_group
+from ticket.dashboard import invalidate_kpi_snapshot
+from ticket.models import Ticket, TicketAccess, ProblemSource, Attachment, Analytics
+from ticket.notification_buffer import publish
+from ticket.permissions import invalidate_team_ids
+from ticket.problem_sources import invalidate_common_problem_sources
+from ticket.reference_data import bump_reference_data_version, reference_data
 
 log = logging.getLogger(__name__)
 User = get_user_model()
@@ -47,56 +54,50 @@ def _ticket_url(ticket: Ticket) -> str:
     return reverse("ticket_detail", args=[ticket.pk])
 
 
-def _notify_channel(group: str, payload: dict):
+def _notify_channel(group: str, payload: dict, type: str = "send_notification", kind=None, ticket=None):
     """
-    Sendet payload an eine Channels-Group.
+    Stellt payload für eine Channels-Group ein: gesendet wird erst nach dem
+    Commit, gebündelt am Ende des Requests (siehe notification_buffer).
+    Gleiche (Gruppe, Ticket, kind) innerhalb eines Requests gehen nur einmal raus.
     """
     if not group:
         return
-    channel_layer = get_channel_layer()
-    if not channel_layer:
-        log.warning("Channel layer not available; skipped notify to group=%s", group)
-        return
-    async_to_sync(channel_layer.group_send)(group, {"type": "send_notification", "content": payload})
+    publish(group, payload, kind=kind, ticket_id=getattr(ticket, "pk", None), type=type)
 
 
-def _notify_user(user, payload: dict):
+def _notify_user(user, payload: dict, kind=None, ticket=None):
     """
     Personalisierte Notification an genau einen User.
     """
     if not user:
         return
-    group = f"user_{getattr(user, 'id', None)}"
+    group = user_group(getattr(user, 'id', None))
     log.info("WS notify -> user_id=%s title=%s", getattr(user, "id", None), payload.get("title"))
-    _notify_channel(group, payload)
+    _notify_channel(group, payload, kind=kind, ticket=ticket)
 
 
-def _notify_broadcast(payload: dict):
+def _notify_staff(payload: dict, kind=None, ticket=None):
     """
-    Broadcast an alle eingeloggten Tabs (unsere Broadcast-Gruppe).
+    Ein group_send an alle verbundenen Mitarbeiter.
     """
-    def _notify_broadcast(payload):
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            "broadcast",
-            {"type": "send_notification", "content": payload}
-        )
+    _notify_channel(STAFF_GROUP, payload, kind=kind, ticket=ticket)
 
 
-def _team_members(team):
+def _notify_team(team_id, payload: dict, kind=None, ticket=None):
     """
-    Liefert Team-Mitglieder als Liste von Usern zurück.
-    → Bei 'Team.members' (ManyToMany zu User) funktioniert das out-of-the-box.
-      Andernfalls bitte an euer Team-Modell anpassen.
+    Ein group_send an alle verbundenen Mitglieder des Teams.
     """
-    if not team:
-        return []
-    if hasattr(team, "members"):
-        try:
-            return list(team.members.all())
-        except Exception:
-            return []
-    return []
+    if team_id:
+        _notify_channel(team_group(team_id), payload, kind=kind, ticket=ticket)
+
+
+def _push_group_changes(user_ids, add=(), discard=()):
+    """
+    Teilt den offenen Sockets der Benutzer neue/entfallene Gruppen mit
+    (NotificationConsumer.groups_update).
+    """
+    for user_id in user_ids:
+        _notify_channel(user_group(user_id), {"add": list(add), "discard": list(discard)}, type="groups.update")
 
 
 # ---------------------------------------------------------------------
@@ -143,7 +144,9 @@ def handle_incoming_message(sender, message: MailMessage, **kwargs):
             except Exception:
                 fname = "attachment"
             content = att.document.read()
-            Attachment.objects.create(ticket=t, file=ContentFile(content, name=fname))
+            Attachment.objects.create(
+                ticket=t, file=ContentFile(content, name=fname), sha256=hashlib.sha256(content).hexdigest()
+            )
 
         log.info("Ticket aus Mail %s (#%s) erzeugt", getattr(message, "id", "?"), t.id)
 
@@ -159,25 +162,25 @@ def ticket_created_or_updated(sender, instance: Ticket, created, update_fields=N
     """
     Benachrichtigungen bei Erstellung/Änderung:
       - Neu erstellt:
-          * Broadcast an alle eingeloggten Tabs
+          * Gruppe ``staff`` (alle verbundenen Mitarbeiter)
           * assigned_to (falls gesetzt)
-          * optional: Team-Mitglieder
+          * optional: Gruppe ``team_<id>``
       - Update:
-          * assigned_to in update_fields → neuer assigned_to
-          * assigned_team in update_fields → Team-Mitglieder
+          * assigned_to → neuer assigned_to (über _detect_assigned_to_change)
+          * assigned_team in update_fields → Gruppe ``team_<id>``
 
-    Hinweis: Für Zuweisungs-Änderungen verwenden wir zusätzlich einen pre_save-Hook (s.u.),
-    weil update_fields oft leer ist (je nach Save-Pfad / Form).
+    Hinweis: Zuweisungs-Änderungen erkennt _detect_assigned_to_change (s.u.) über
+    changed_fields, weil update_fields oft leer ist (je nach Save-Pfad / Form).
     """
     if created:
-    # 0) Broadcast an alle – der Ersteller blendet clientseitig aus (siehe JS)
-        _notify_broadcast({
+        # 0) An alle Mitarbeiter – der Ersteller blendet clientseitig aus (siehe JS)
+        _notify_staff({
             "title": "Neues Ticket",
             "message": f"#{instance.id}: {instance.title}",
             "url": _ticket_url(instance),
             "level": "info",
             "creator_id": getattr(instance, "created_by_id", None),  # <— NEU
-        })
+        }, kind="new_ticket", ticket=instance)
 
         # 1) Persönlich an assigned_to, aber NICHT wenn assigned_to == created_by beim Erstellen
         assigned_id = getattr(instance, "assigned_to_id", None)
@@ -191,63 +194,54 @@ def ticket_created_or_updated(sender, instance: Ticket, created, update_fields=N
                     "url": _ticket_url(instance),
                     "level": "info",
                 },
+                kind="assigned",
+                ticket=instance,
             )
 
         # 2) Optional Team – (hier NICHT filtern, Team != einzelner Ersteller)
-        if getattr(instance, "assigned_team", None):
-            for u in _team_members(instance.assigned_team):
-                _notify_user(
-                    u,
-                    {
-                        "title": "Neues Team-Ticket",
-                        "message": f"#{instance.id}: {instance.title} (Team: {instance.assigned_team})",
-                        "url": _ticket_url(instance),
-                        "level": "info",
-                    },
-                )
+        if instance.assigned_team_id:
+            _notify_team(
+                instance.assigned_team_id,
+                {
+                    "title": "Neues Team-Ticket",
+                    "message": f"#{instance.id}: {instance.title} (Team: {instance.assigned_team})",
+                    "url": _ticket_url(instance),
+                    "level": "info",
+                },
+                kind="team",
+                ticket=instance,
+            )
         return
 
 
-    # Selektive Updates (falls update_fields gesetzt ist)
+    # Selektive Updates (falls update_fields gesetzt ist). assigned_to meldet
+    # _detect_assigned_to_change, sonst käme die Zuweisung doppelt an.
     if update_fields:
-        if "assigned_to" in update_fields and getattr(instance, "assigned_to", None):
-            _notify_user(
-                instance.assigned_to,
+        if {"assigned_team", "assigned_team_id"}.intersection(update_fields) and instance.assigned_team_id:
+            _notify_team(
+                instance.assigned_team_id,
                 {
-                    "title": "Ticket zugewiesen",
-                    "message": f"#{instance.id}: {instance.title}",
+                    "title": "Team-Zuweisung aktualisiert",
+                    "message": f"#{instance.id}: {instance.title} (Team: {instance.assigned_team})",
                     "url": _ticket_url(instance),
                     "level": "info",
                 },
+                kind="team",
+                ticket=instance,
             )
 
-        if "assigned_team" in update_fields and getattr(instance, "assigned_team", None):
-            for u in _team_members(instance.assigned_team):
-                _notify_user(
-                    u,
-                    {
-                        "title": "Team-Zuweisung aktualisiert",
-                        "message": f"#{instance.id}: {instance.title} (Team: {instance.assigned_team})",
-                        "url": _ticket_url(instance),
-                        "level": "info",
-                    },
-                )
-
 
 # Robust gegen „update_fields ist leer“: Alt/Neu von assigned_to erkennen
-@receiver(pre_save, sender=Ticket)
-def _detect_assigned_to_change(sender, instance: Ticket, **kwargs):
-    if not instance.pk:
-        return
-    try:
-        prev = sender.objects.get(pk=instance.pk)
-    except sender.DoesNotExist:
+# (Vergleich mit den geladenen Werten, ohne die Zeile erneut zu lesen). Erst
+# nach dem Speichern, damit ein fehlgeschlagenes save() nichts meldet.
+@receiver(post_save, sender=Ticket)
+def _detect_assigned_to_change(sender, instance: Ticket, created, **kwargs):
+    # changed_fields beschreibt im post_save noch den Stand vor dem Speichern
+    changed = instance.changed_fields
+    if created or not changed or "assigned_to_id" not in changed:
         return
 
-    prev_id = getattr(prev, "assigned_to_id", None)
-    new_id = getattr(instance, "assigned_to_id", None)
-
-    if prev_id != new_id and new_id:
+    if instance.assigned_to_id:
         _notify_user(
             instance.assigned_to,
             {
@@ -256,9 +250,165 @@ def _detect_assigned_to_change(sender, instance: Ticket, **kwargs):
                 "url": _ticket_url(instance),
                 "level": "info",
             },
+            kind="assigned",
+            ticket=instance,
         )
 
 
+# ---------------------------------------------------------------------
+# Live-Updates offener Detailseiten (TicketConsumer, Gruppe ``ticket_<id>``)
+# ---------------------------------------------------------------------
+LIVE_FIELDS = {
+    "title", "problem_source_id", "completed", "priority", "paused_until", "assigned_to_id", "assigned_team_id",
+}
+
+
+def _live_fields(ticket: Ticket) -> dict:
+    """
+    Angezeigte Werte der Detailseite. Immer vollständig, damit bei mehreren
+    Speichervorgängen in einem Request die letzte Meldung genügt.
+    """
+    data = reference_data()
+    problem_source = data.problem_sources_by_id.get(ticket.problem_source_id)
+    team = data.teams_by_id.get(ticket.assigned_team_id)
+    assigned_to = ticket.assigned_to if ticket.assigned_to_id else None
+    return {
+        "title": ticket.title or "",
+        "category": problem_source.breadcrumb if problem_source else "",
+        "completed": ticket.completed,
+        "status": "Geschlossen" if ticket.completed else "Offen",
+        "priority": ticket.priority,
+        "priority_text": ticket.priority_text(),
+        # Aus dem Formular kommt ein String, aus der Datenbank ein datetime
+        "paused_until": str(ticket.paused_until) if ticket.paused_until else None,
+        "assigned_to_id": ticket.assigned_to_id,
+        "assigned_to": (assigned_to.first_name or assigned_to.username) if assigned_to else "",
+        "assigned_team": team.name if team else "",
+    }
+
+
+@receiver(post_save, sender=Ticket)
+def _push_live_fields(sender, instance: Ticket, created, **kwargs):
+    # changed_fields beschreibt im post_save noch den Stand vor dem Speichern
+    changed = instance.changed_fields
+    if created or not changed or not changed.intersection(LIVE_FIELDS):
+        return
+    _notify_channel(ticket_group(instance.id), {"fields": _live_fields(instance)}, type="ticket.update",
+                    kind="fields", ticket=instance)
+
+
+# ---------------------------------------------------------------------
+# Dashboard: KPI-Snapshot verwerfen, sobald sich Tickets/Analytics ändern
+# ---------------------------------------------------------------------
+@receiver(post_save, sender=Ticket)
+@receiver(post_delete, sender=Ticket)
+@receiver(post_save, sender=Analytics)
+def _invalidate_dashboard(sender, **kwargs):
+    invalidate_kpi_snapshot()
+
+
+@receiver(post_save, sender=Ticket)
+def _invalidate_common_problem_sources(sender, instance: Ticket, created, **kwargs):
+    changed = instance.changed_fields
+    if created or changed is None or 'problem_source_id' in changed:
+        invalidate_common_problem_sources(instance.created_by_id)
+
+
+# ---------------------------------------------------------------------
+# Stammdaten im Prozess-Cache (Problemquellen, Mitarbeiter, Teams)
+# ---------------------------------------------------------------------
+@receiver(post_save, sender=ProblemSource)
+@receiver(post_delete, sender=ProblemSource)
+@receiver(post_save, sender=Team)
+@receiver(post_delete, sender=Team)
+def _invalidate_reference_data(sender, **kwargs):
+    bump_reference_data_version()
+
+
+def _staff_directory_unchanged(update_fields):
+    # Login schreibt nur last_login – das ändert das Verzeichnis nicht
+    return bool(update_fields) and set(update_fields) <= {"last_login"}
+
+
+@receiver(pre_save, sender=User)
+def _remember_staff_flag(sender, instance, update_fields=None, **kwargs):
+    # Vorheriger Stand aus der DB, nicht aus reference_data(): die lädt der Prozess
+    # evtl. erst im post_save, also schon mit dem neuen Stand
+    if _staff_directory_unchanged(update_fields):
+        return
+    instance._was_staff = instance.pk is not None and User.objects.filter(pk=instance.pk, is_staff=True).exists()
+
+
+@receiver(post_save, sender=User)
+def _invalidate_staff_directory(sender, instance, update_fields=None, **kwargs):
+    if _staff_directory_unchanged(update_fields):
+        return
+    was_staff = instance.__dict__.pop("_was_staff", False)
+    if instance.is_staff != was_staff:
+        # Offene Sockets treten der Staff-Gruppe live bei bzw. aus
+        _push_group_changes([instance.pk], **{"add" if instance.is_staff else "discard": [STAFF_GROUP]})
+    if instance.is_staff or was_staff:
+        bump_reference_data_version()
+
+
+@receiver(post_delete, sender=User)
+def _drop_from_staff_directory(sender, instance, **kwargs):
+    if instance.is_staff:
+        bump_reference_data_version()
+
+
+# ---------------------------------------------------------------------
+# Zugriffstabelle (TicketAccess) synchron halten
+# ---------------------------------------------------------------------
+@receiver(post_save, sender=Ticket)
+def _sync_ticket_access(sender, instance: Ticket, created, **kwargs):
+    # changed_fields beschreibt im post_save noch den Stand vor dem Speichern
+    changed = instance.changed_fields
+    if created or changed is None:
+        access.sync_ticket(instance)
+    elif changed.intersection(access.ACCESS_FIELDS):
+        access.sync_ticket(instance, changed)
+
+
+@receiver(m2m_changed, sender=Ticket.co_assignees.through)
+def _sync_co_assignee_access(sender, instance, action, reverse, pk_set, **kwargs):
+    access.sync_m2m(TicketAccess.Role.CO_ASSIGNEE, instance, action, reverse, pk_set)
+
+
+@receiver(m2m_changed, sender=Ticket.followers.through)
+def _sync_follower_access(sender, instance, action, reverse, pk_set, **kwargs):
+    access.sync_m2m(TicketAccess.Role.FOLLOWER, instance, action, reverse, pk_set)
+
+
+@receiver(m2m_changed, sender=Team.members.through)
+def _sync_team_member_access(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear":
+        # Vor dem Leeren stehen die betroffenen Benutzer/Teams noch fest
+        if reverse:
+            users, teams = [instance.pk], list(instance.teams.values_list("id", flat=True))
+        else:
+            users, teams = list(instance.members.values_list("id", flat=True)), [instance.pk]
+    elif action in ("post_add", "post_remove"):
+        users, teams = ([instance.pk], pk_set or []) if reverse else (pk_set or [], [instance.pk])
+    else:
+        users, teams = [], []
+
+    if users and teams:
+        invalidate_team_ids(users)
+        groups = [team_group(team_id) for team_id in teams]
+        _push_group_changes(users, **{"add" if action == "post_add" else "discard": groups})
+    access.sync_team_members(instance, action, reverse, pk_set)
+
+
+@receiver(pre_delete, sender=Team)
+def _drop_team_access(sender, instance: Team, **kwargs):
+    members = list(instance.members.values_list("id", flat=True))
+    invalidate_team_ids(members)
+    _push_group_changes(members, discard=[team_group(instance.pk)])
+    # assigned_team ist SET_NULL → die Tickets verlieren die Team-Rolle
+    access.revoke(TicketAccess.Role.TEAM, ticket__assigned_team=instance)
+
+
 # ---------------------------------------------------------------------
 # M2M: Co-Assignees hinzugefügt → persönliche Pings
 # ---------------------------------------------------------------------
@@ -266,13 +416,17 @@ def _detect_assigned_to_change(sender, instance: Ticket, **kwargs):
 def co_assignees_changed(sender, instance: Ticket, action, pk_set, **kwargs):
     if action != "post_add" or not pk_set:
         return
-    for user in User.objects.filter(pk__in=pk_set):
-        _notify_user(
-            user,
+    # Gleiche Art wie die Zuweisung: wer zugewiesen und dabei Mitbearbeiter wird,
+    # bekommt nur „Ticket zugewiesen“
+    for user_id in pk_set:
+        _notify_channel(
+            user_group(user_id),
             {
                 "title": "Als Mitbearbeiter hinzugefügt",
                 "message": f"#{instance.id}: {instance.title}",
                 "url": _ticket_url(instance),
                 "level": "info",
             },
+            kind="assigned",
+            ticket=instance,
         )
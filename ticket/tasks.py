@@ -22,6 +22,7 @@ except Exception:  # pragma: no cover
 from authentication.graph_api.base import GraphAPI
 from authentication.models import MicrosoftProfile
 from ticket.models import Analytics
+from ticket.notification_buffer import prune_notifications
 
 # Mail-Import Logik (OAuth2/IMAP) – kommt aus unserer neuen Hilfsdatei
 from .mail_ingest import fetch_and_store
@@ -60,11 +61,18 @@ def weekly_completed_task_cleanup():
     CompletedTask.objects.all().delete()
 
 
+# Nachlieferbare WebSocket-Benachrichtigungen nur für NOTIFICATION_REPLAY_WINDOW aufheben
+@db_periodic_task(crontab(minute='*/15'))
+def prune_channel_notifications():
+    prune_notifications()
+
+
 # Update analytics every 10 minutes between 5-19 Uhr Monday-Saturday
 @db_periodic_task(crontab(minute="*/10", hour='5-19', day_of_week='1,2,3,4,5,6'))
 def update_analytics():
     Analytics.update_tickets_per_day()
     Analytics.update_tickets_per_problem_source()
+    Analytics.update_backlog()
 
 
 def update_users():
@@ -0,0 +1,48 @@
+from datetime import date
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from ticket import backlog
+
+
+def arrays(created, completed, priority):
+    return backlog.TicketArrays(
+        created=np.array(created, dtype='datetime64[D]'),
+        completed=np.array(completed, dtype='datetime64[D]'),
+        problem_source=np.zeros(len(created), dtype=np.int64),
+        priority=np.array(priority, dtype=np.int64),
+    )
+
+
+class TestBacklog(SimpleTestCase):
+
+    def setUp(self):
+        self.tickets = arrays(
+            created=[date(2024, 2, 20), date(2024, 3, 4), date(2024, 3, 5), date(2024, 3, 6)],
+            completed=[date(2024, 3, 5), date(2024, 3, 6), None, None],
+            priority=[0, 2, 2, 1],
+        )
+
+    def test_open_backlog_per_day_counts_tickets_before_window(self):
+        days, open_per_priority = backlog.open_backlog_per_day(self.tickets, date(2024, 3, 4), date(2024, 3, 7))
+
+        self.assertEqual(len(days), 4)
+        self.assertEqual(open_per_priority.sum(axis=0).tolist(), [2, 2, 2, 2])
+        self.assertEqual(open_per_priority[0].tolist(), [1, 0, 0, 0])
+        self.assertEqual(open_per_priority[2].tolist(), [1, 2, 1, 1])
+
+    def test_aging_buckets(self):
+        buckets = backlog.aging_buckets(self.tickets, date(2024, 3, 15))
+
+        self.assertEqual(buckets.sum(), 2)
+        self.assertEqual(buckets[2].tolist(), [0, 0, 0, 1, 0, 0])
+        self.assertEqual(buckets[1].tolist(), [0, 0, 0, 1, 0, 0])
+
+    def test_weekly_cohort_closure_rates(self):
+        weeks, sizes, rates = backlog.weekly_cohort_closure_rates(self.tickets, weeks=3, today=date(2024, 3, 7))
+
+        self.assertEqual([str(week) for week in weeks], ['2024-02-19', '2024-02-26', '2024-03-04'])
+        self.assertEqual(sizes.tolist(), [1, 0, 3])
+        self.assertEqual(rates[0].tolist(), [0.0, 0.0, 1.0])
+        self.assertAlmostEqual(rates[2][0], 1 / 3)
@@ -0,0 +1,72 @@
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from ticket.business_hours import BusinessCalendar, easter_sunday, german_public_holidays, average_per_group
+
+
+class TestBusinessCalendar(SimpleTestCase):
+
+    def setUp(self):
+        self.calendar = BusinessCalendar(start_hour=9, end_hour=17)
+
+    def test_easter_sunday(self):
+        self.assertEqual(easter_sunday(2024), date(2024, 3, 31))
+        self.assertEqual(easter_sunday(2025), date(2025, 4, 20))
+
+    def test_german_public_holidays(self):
+        holidays = german_public_holidays(2024)
+        self.assertIn(date(2024, 3, 29), holidays)  # Karfreitag
+        self.assertIn(date(2024, 5, 20), holidays)  # Pfingstmontag
+        self.assertIn(date(2024, 10, 3), holidays)
+
+    def test_durations_skip_nights_weekends_and_holidays(self):
+        starts = [
+            datetime(2024, 3, 4, 10, 0),   # Monday
+            datetime(2024, 3, 8, 16, 0),   # Friday afternoon
+            datetime(2024, 3, 28, 16, 0),  # Thursday before Easter
+            datetime(2024, 3, 4, 7, 0),    # before opening
+            None,
+        ]
+        ends = [
+            datetime(2024, 3, 4, 12, 30),
+            datetime(2024, 3, 11, 10, 0),  # Monday morning
+            datetime(2024, 4, 2, 10, 0),   # Tuesday after Easter Monday
+            datetime(2024, 3, 4, 20, 0),   # after closing
+            datetime(2024, 3, 4, 12, 0),
+        ]
+
+        durations = self.calendar.durations(starts, ends)
+
+        self.assertEqual(durations[0], 2.5 * 3600)
+        self.assertEqual(durations[1], 2 * 3600)
+        self.assertEqual(durations[2], 2 * 3600)
+        self.assertEqual(durations[3], 8 * 3600)
+        self.assertTrue(np.isnan(durations[4]))
+
+    def test_durations_start_after_pause(self):
+        start = datetime(2024, 3, 4, 10, 0)
+        durations = self.calendar.durations(
+            [start, start],
+            [start + timedelta(days=1), start + timedelta(days=1)],
+            pause_ends=[start + timedelta(hours=5), None],
+        )
+        self.assertEqual(list(durations), [3 * 3600, 8 * 3600])
+
+    def test_is_business_time(self):
+        mask = self.calendar.is_business_time([
+            datetime(2024, 3, 4, 9, 0),
+            datetime(2024, 3, 4, 17, 0),
+            datetime(2024, 3, 9, 11, 0),   # Saturday
+            datetime(2024, 12, 25, 11, 0),
+        ])
+        self.assertEqual(list(mask), [True, False, False, False])
+
+    def test_average_per_group(self):
+        keys, averages = average_per_group([1, 2, 1, 2], np.array([10.0, 4.0, 20.0, np.nan]))
+        self.assertEqual(list(keys), [1, 2])
+        self.assertEqual(list(averages), [15.0, 4.0])
+
+    def test_empty_input(self):
+        self.assertEqual(self.calendar.durations([], []).size, 0)
@@ -0,0 +1,198 @@
+import json
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+from django.urls import path
+from django_currentuser.middleware import _set_current_user
+
+from authentication.models import Team
+from ticket import notification_buffer
+from ticket.consumers import NotificationConsumer, TicketConsumer
+from ticket.models import ChannelNotification, ProblemSource, Ticket
+from ticket.notification_buffer import buffered_notifications, send_batch
+
+IN_MEMORY_LAYER = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER)
+class TestNotificationGroups(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.team = Team.objects.create(name="Support")
+        self.member = User.objects.create(username="member", is_staff=True)
+        self.team.members.add(self.member)
+        self.problem_source = ProblemSource.objects.create(name="Drucker", slug="drucker")
+
+    def tearDown(self):
+        _set_current_user(None)
+
+    def connect(self, user, path="/ws/notifications/"):
+        communicator = WebsocketCommunicator(NotificationConsumer.as_asgi(), path)
+        communicator.scope["user"] = user
+        return communicator
+
+    def test_team_and_staff_groups(self):
+        async_to_sync(self._test_team_and_staff_groups)()
+
+    async def _test_team_and_staff_groups(self):
+        communicator = self.connect(self.member)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertIn("reconnect", json.loads(await communicator.receive_from()))
+        layer = get_channel_layer()
+
+        await layer.group_send(f"team_{self.team.id}", {"type": "send_notification", "content": {"title": "Team"}})
+        await layer.group_send("staff", {"type": "send_notification", "content": {"title": "Staff"}})
+        self.assertEqual(json.loads(await communicator.receive_from())["title"], "Team")
+        self.assertEqual(json.loads(await communicator.receive_from())["title"], "Staff")
+
+        # Austritt wird live an den Socket gemeldet
+        await layer.group_send(
+            f"user_{self.member.id}",
+            {"type": "groups.update", "content": {"discard": [f"team_{self.team.id}"]}},
+        )
+        await communicator.receive_nothing()
+        await layer.group_send(f"team_{self.team.id}", {"type": "send_notification", "content": {"title": "x"}})
+        self.assertTrue(await communicator.receive_nothing())
+
+        await communicator.disconnect()
+
+    @override_settings(NOTIFICATION_RECONNECT_DELAY=1000, NOTIFICATION_RECONNECT_JITTER=5000)
+    def test_reconnect_replays_missed_notifications(self):
+        def notice(title):
+            return {"type": "send_notification", "content": {"title": title}}
+
+        send_batch([(f"user_{self.member.id}", notice("Gesehen"))])
+        seen = ChannelNotification.objects.get().id
+        send_batch([(f"user_{self.member.id}", notice("Verpasst")), ("staff", notice("Staff")),
+                    ("team_0", notice("Fremdes Team"))])
+        async_to_sync(self._test_reconnect_replays_missed_notifications)(seen)
+
+    async def _test_reconnect_replays_missed_notifications(self, seen):
+        communicator = self.connect(self.member, f"/ws/notifications/?last_event_id={seen}")
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        hello = json.loads(await communicator.receive_from())
+        self.assertEqual(hello["last_event_id"], seen)
+        self.assertTrue(1000 <= hello["reconnect"] <= 6000)
+        replayed = [json.loads(await communicator.receive_from()) for _ in range(2)]
+        self.assertEqual([message["title"] for message in replayed], ["Verpasst", "Staff"])
+        self.assertTrue(seen < replayed[0]["id"] < replayed[1]["id"])
+        self.assertTrue(await communicator.receive_nothing())
+
+        await communicator.disconnect()
+
+    def test_team_notification_is_one_group_send(self):
+        layer = get_channel_layer()
+        sent = []
+        original = layer.group_send
+
+        async def group_send(group, message):
+            sent.append((group, message["type"]))
+            await original(group, message)
+
+        layer.group_send = group_send
+        try:
+            Ticket.objects.create(
+                title="Test", problem_source=self.problem_source, created_by=self.member, assigned_team=self.team
+            )
+            self.team.members.remove(self.member)
+        finally:
+            del layer.group_send
+
+        self.assertIn((f"team_{self.team.id}", "send_notification"), sent)
+        self.assertIn(("staff", "send_notification"), sent)
+        self.assertNotIn((f"user_{self.member.id}", "send_notification"), sent)
+        self.assertIn((f"user_{self.member.id}", "groups.update"), sent)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER)
+class TestTicketLiveUpdates(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create(username="staff", is_staff=True)
+        self.outsider = User.objects.create(username="outsider")
+        self.problem_source = ProblemSource.objects.create(name="Drucker", slug="drucker")
+        self.ticket = Ticket.objects.create(title="Test", problem_source=self.problem_source, created_by=self.staff)
+
+    def tearDown(self):
+        _set_current_user(None)
+
+    def connect(self, user):
+        application = URLRouter([path("ws/tickets/<int:id>/", TicketConsumer.as_asgi())])
+        communicator = WebsocketCommunicator(application, f"/ws/tickets/{self.ticket.id}/")
+        communicator.scope["user"] = user
+        return communicator
+
+    def test_viewers_get_field_diffs(self):
+        async_to_sync(self._test_viewers_get_field_diffs)()
+
+    async def _test_viewers_get_field_diffs(self):
+        connected, _ = await self.connect(self.outsider).connect()
+        self.assertFalse(connected)
+
+        communicator = self.connect(self.staff)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        await database_sync_to_async(self.rename)("Neuer Titel")
+        fields = json.loads(await communicator.receive_from())["fields"]
+        self.assertEqual((fields["title"], fields["category"], fields["status"]), ("Neuer Titel", "Drucker", "Offen"))
+
+        await communicator.disconnect()
+
+    def rename(self, title):
+        ticket = Ticket.objects.get(id=self.ticket.id)
+        ticket.title = title
+        ticket.save()
+
+
+class TestNotificationBuffer(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create(username="staff", is_staff=True)
+        self.problem_source = ProblemSource.objects.create(name="Drucker", slug="drucker")
+        self.ticket = Ticket.objects.create(title="Test", problem_source=self.problem_source, created_by=self.staff)
+        self.ticket = Ticket.objects.get(id=self.ticket.id)
+
+    def tearDown(self):
+        _set_current_user(None)
+
+    def batches(self):
+        batches = []
+        return batches, mock.patch.object(notification_buffer, "send_batch", batches.append)
+
+    def test_one_deduplicated_batch_after_commit(self):
+        batches, patch = self.batches()
+        with patch, buffered_notifications():
+            with transaction.atomic():
+                self.ticket.co_assignees.add(self.staff)
+                self.ticket.assigned_to = self.staff
+                self.ticket.save()
+                self.assertEqual(batches, [])
+
+        self.assertEqual(len(batches), 1)
+        messages = [(group, message["content"]["title"]) for group, message in batches[0]
+                    if message["type"] == "send_notification"]
+        self.assertEqual(messages, [(f"user_{self.staff.id}", "Ticket zugewiesen")])
+
+    def test_rollback_drops_notifications(self):
+        batches, patch = self.batches()
+        with patch, buffered_notifications():
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.ticket.co_assignees.add(self.staff)
+                raise RuntimeError
+
+        self.assertEqual(batches, [[]])
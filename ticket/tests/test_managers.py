@@ -0,0 +1,293 @@
+from datetime import date, datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django_currentuser.middleware import _set_current_user
+
+from authentication.models import Team
+from ticket import access
+from ticket.dashboard import get_kpi_snapshot, invalidate_kpi_snapshot
+from ticket.models import Analytics, ProblemSource, Ticket, TicketAccess, TicketEvent
+from ticket.permissions import PermissionResolver
+from ticket.problem_sources import common_problem_sources_for
+from ticket.reference_data import reference_data
+
+
+class TestTicketEventStats(TestCase):
+
+    def setUp(self):
+        self.creator = User.objects.create(username="creator")
+        self.staff = User.objects.create(username="staff", is_staff=True)
+        self.problem_source = ProblemSource.objects.create(name="Drucker", slug="drucker")
+        self.start = datetime(2024, 3, 4, 10, 0)
+
+    def tearDown(self):
+        # Der Middleware-Thread-Local überlebt sonst bis in den nächsten Test
+        _set_current_user(None)
+
+    def create_ticket(self):
+        return Ticket.objects.create(
+            title="Test", problem_source=self.problem_source, created_by=self.creator, created_date=self.start
+        )
+
+    def create_event(self, ticket, type, minutes, author=None, user_to_notify=None):
+        return TicketEvent.objects.create(
+            ticket=ticket,
+            type=type,
+            author=author or self.creator,
+            user_to_notify=user_to_notify,
+            timestamp=self.start + timedelta(minutes=minutes)
+        )
+
+    def test_ticket_stats_are_grouped_per_ticket(self):
+        first = self.create_ticket()
+        second = self.create_ticket()
+        self.create_event(first, TicketEvent.EventType.NEW, 0)
+        self.create_event(first, TicketEvent.EventType.COMMENT, 5)
+        self.create_event(first, TicketEvent.EventType.COMMENT, 30, author=self.staff)
+        self.create_event(first, TicketEvent.EventType.COMMENT, 40, user_to_notify=self.staff)
+        self.create_event(second, TicketEvent.EventType.NEW, 0)
+        self.create_event(second, TicketEvent.EventType.ASSIGNED, 2, author=self.staff)
+        self.create_event(second, TicketEvent.EventType.ACCESS_ALLOWED, 3, author=self.staff)
+
+        stats = {s['ticket']: s for s in TicketEvent.objects.ticket_stats()}
+
+        self.assertEqual(stats[first.id]['num_comments'], 2)
+        self.assertEqual(stats[first.id]['num_followers_added'], 0)
+        self.assertIsNone(stats[first.id]['first_assign_time'])
+        self.assertEqual(stats[first.id]['time_to_first_response'], timedelta(minutes=30))
+        self.assertEqual(stats[second.id]['num_comments'], 0)
+        self.assertEqual(stats[second.id]['num_followers_added'], 1)
+        self.assertEqual(stats[second.id]['first_assign_time'], self.start + timedelta(minutes=2))
+        self.assertIsNone(stats[second.id]['time_to_first_response'])
+
+    def test_ticket_stats_page_uses_ticket_id_as_cursor(self):
+        tickets = [self.create_ticket() for _ in range(3)]
+        for ticket in tickets:
+            self.create_event(ticket, TicketEvent.EventType.NEW, 0)
+
+        page = list(TicketEvent.objects.ticket_stats_page(after=tickets[0].id, limit=1))
+
+        self.assertEqual([s['ticket'] for s in page], [tickets[1].id])
+
+    def test_stats_view_falls_back_on_bad_parameters(self):
+        ticket = self.create_ticket()
+        self.create_event(ticket, TicketEvent.EventType.NEW, 0)
+        self.client.force_login(self.staff)
+
+        for query in ({'after': 'x', 'limit': 'y'}, {'limit': 0}, {'limit': -5}, {'limit': 10 ** 6}):
+            response = self.client.get("/statistics/tickets/", query)
+            self.assertEqual(response.status_code, 200, query)
+            self.assertEqual([row['ticket'] for row in response.json()['results']], [ticket.id], query)
+
+
+class TestTicketBusinessTime(TestCase):
+
+    def test_average_business_processing_time_per_user(self):
+        staff = User.objects.create(username="staff", is_staff=True)
+        problem_source = ProblemSource.objects.create(name="Drucker", slug="drucker")
+        ticket = Ticket.objects.create(
+            title="Test", problem_source=problem_source, created_date=datetime(2024, 3, 8, 16, 0), completed=True,
+            completed_date=datetime(2024, 3, 11, 10, 0)
+        )
+        Ticket.objects.filter(id=ticket.id).update(modified_by=staff)
+
+        self.assertEqual(Ticket.objects.average_business_processing_time_per_user(), {staff.id: timedelta(hours=2)})
+        self.assertEqual(Ticket.objects.average_business_processing_time(), timedelta(hours=2))
+
+
+class TestBacklogAnalytics(TestCase):
+
+    def test_update_backlog(self):
+        problem_source = ProblemSource.objects.create(name="Drucker", slug="drucker")
+        Ticket.objects.create(title="Test", problem_source=problem_source, priority=2)
+
+        Analytics.update_backlog(days=7, weeks=2)
+        backlog = Analytics.get_backlog()
+
+        self.assertEqual(backlog['Offene Tickets pro Tag']['data'][2][-1], 1)
+        self.assertEqual(len(backlog['Offene Tickets pro Tag']['labels']), 7)
+        self.assertEqual(backlog['Alter offener Tickets']['data'][2][0], 1)
+        self.assertEqual(backlog['Abschlussquote pro Woche']['data'][0][-1], 1)
+
+
+class TestKpiSnapshot(TestCase):
+
+    def test_kpi_counts(self):
+        problem_source = ProblemSource.objects.create(name="Drucker", slug="drucker")
+        day = datetime(2024, 3, 4)
+        Ticket.objects.create(title="1", problem_source=problem_source, created_date=day + timedelta(hours=9))
+        Ticket.objects.create(title="2", problem_source=problem_source, created_date=day, priority=2)
+        Ticket.objects.create(
+            title="3", problem_source=problem_source, created_date=day - timedelta(days=3), completed=True,
+            completed_date=day + timedelta(hours=10)
+        )
+
+        counts = Ticket.objects.kpi_counts(day, day + timedelta(days=1))
+
+        self.assertEqual(counts, {
+            'opened_today': 1,
+            'closed_today': 1,
+            'all_open': 2,
+            'all_closed': 1,
+            'all_open_high_priority': 1,
+        })
+
+    def test_snapshot_is_cached_until_a_ticket_changes(self):
+        problem_source = ProblemSource.objects.create(name="Drucker", slug="drucker")
+        today = date.today()
+        invalidate_kpi_snapshot()
+
+        self.assertEqual(get_kpi_snapshot(today)['counts']['all_open'], 0)
+        with self.assertNumQueries(0):
+            get_kpi_snapshot(today)
+
+        Ticket.objects.create(title="Test", problem_source=problem_source)
+        self.assertEqual(get_kpi_snapshot(today)['counts']['all_open'], 1)
+
+
+class TestTicketAccess(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username="user")
+        self.other = User.objects.create(username="other")
+        self.team = Team.objects.create(name="Support")
+        self.problem_source = ProblemSource.objects.create(name="Drucker", slug="drucker")
+
+    def roles(self, ticket, user):
+        return set(TicketAccess.objects.filter(ticket=ticket, user=user).values_list('role', flat=True))
+
+    def test_access_rows_follow_ticket_links(self):
+        ticket = Ticket.objects.create(title="Test", problem_source=self.problem_source, assigned_to=self.user)
+        ticket.co_assignees.add(self.other)
+        self.assertEqual(self.roles(ticket, self.user), {'assignee'})
+        self.assertEqual(self.roles(ticket, self.other), {'co_assignee'})
+
+        ticket.assigned_to = self.other
+        ticket.assigned_team = self.team
+        ticket.save()
+        self.team.members.add(self.user)
+        self.assertEqual(self.roles(ticket, self.user), {'team'})
+        self.assertEqual(self.roles(ticket, self.other), {'assignee', 'co_assignee'})
+
+        self.user.teams.remove(self.team)
+        ticket.co_assignees.clear()
+        self.assertEqual(self.roles(ticket, self.user), set())
+        self.assertEqual(self.roles(ticket, self.other), {'assignee'})
+
+    def test_accessible_by(self):
+        self.team.members.add(self.user)
+        mine = Ticket.objects.create(title="1", problem_source=self.problem_source, assigned_team=self.team)
+        Ticket.objects.create(title="2", problem_source=self.problem_source, assigned_to=self.other)
+
+        self.assertEqual(list(Ticket.objects.accessible_by(self.user, TicketAccess.WORKING_ROLES)), [mine])
+
+        access.rebuild()
+        self.assertEqual(list(Ticket.objects.all().visible_to(self.user)), [mine])
+
+
+class TestPermissionResolver(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username="user")
+        self.team = Team.objects.create(name="Support")
+        problem_source = ProblemSource.objects.create(name="Drucker", slug="drucker")
+        self.ticket = Ticket.objects.create(title="Test", problem_source=problem_source, assigned_team=self.team)
+        cache.clear()
+
+    def test_team_membership_is_cached_until_members_change(self):
+        ticket = Ticket.objects.prefetch_related('co_assignees').get()
+        self.assertFalse(PermissionResolver(self.user).has_full_access(ticket))
+
+        self.team.members.add(self.user)
+        resolver = PermissionResolver(self.user)
+        self.assertTrue(resolver.has_full_access(ticket))
+        with self.assertNumQueries(0):
+            PermissionResolver(self.user).has_full_access(ticket)
+
+    def test_filter_tickets(self):
+        self.assertEqual(list(PermissionResolver(self.user).filter_tickets(Ticket.objects.all())), [])
+        self.team.members.add(self.user)
+        self.assertEqual(list(PermissionResolver(self.user).filter_tickets(Ticket.objects.all())), [self.ticket])
+
+
+class TestProblemSourceCounts(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="user")
+        self.other = User.objects.create(username="other")
+        self.hardware = ProblemSource.objects.create(name="Hardware", slug="hardware")
+        self.printer = ProblemSource.objects.create(name="Drucker", slug="drucker", parent=self.hardware)
+        self.toner = ProblemSource.objects.create(name="Toner", slug="toner", parent=self.printer)
+        self.software = ProblemSource.objects.create(name="Software", slug="software")
+        for source, user in [(self.toner, self.user), (self.toner, self.user), (self.printer, self.user),
+                             (self.software, self.user), (self.toner, self.other)]:
+            Ticket.objects.create(title="Test", problem_source=source, created_by=user)
+
+    def test_counts_for_the_whole_tree_in_one_query(self):
+        with self.assertNumQueries(1):
+            counts = {source.slug: source.user_ticket_count
+                      for source in ProblemSource.objects.with_user_ticket_counts(self.user)}
+
+        self.assertEqual(counts, {'hardware': 3, 'drucker': 3, 'toner': 2, 'software': 1})
+
+    def test_has_children_without_query(self):
+        self.hardware.refresh_from_db()
+        with self.assertNumQueries(0):
+            self.assertTrue(self.hardware.has_children())
+            self.assertFalse(self.software.has_children())
+
+    def test_common_problem_sources_are_cached_until_a_new_ticket(self):
+        first = common_problem_sources_for(self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(common_problem_sources_for(self.user), first)
+        self.assertEqual(first[0]['problem_source__slug'], 'toner')
+
+        for _ in range(3):
+            Ticket.objects.create(title="Test", problem_source=self.software, created_by=self.user)
+
+        self.assertEqual(common_problem_sources_for(self.user)[0]['problem_source__slug'], 'software')
+
+
+class TestReferenceData(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.root = ProblemSource.objects.create(name="Hardware", slug="hardware")
+        self.leaf = ProblemSource.objects.create(name="Drucker", slug="drucker", parent=self.root)
+        self.staff = User.objects.create(username="staff", is_staff=True)
+
+    def test_lookups_are_served_from_memory(self):
+        reference_data().problem_source('drucker')
+        reference_data().staff
+
+        with self.assertNumQueries(0):
+            source = reference_data().problem_source('drucker')
+            self.assertEqual(source.create_category_breadcrumb(), "Hardware > Drucker")
+            root = reference_data().problem_source('hardware')
+            self.assertEqual(reference_data().problem_source_children(root), [source])
+            self.assertEqual(reference_data().staff, [self.staff])
+        with self.assertRaises(ProblemSource.DoesNotExist):
+            reference_data().problem_source('unbekannt')
+
+    def test_saves_bump_the_version(self):
+        data = reference_data()
+        Team.objects.create(name="Support")
+        self.assertIsNot(reference_data(), data)
+        self.assertEqual([team.name for team in reference_data().teams], ["Support"])
+
+        data = reference_data()
+        User.objects.create(username="customer")
+        self.assertIs(reference_data(), data)
+        self.staff.is_staff = False
+        self.staff.save()
+        self.assertEqual(reference_data().staff, [])
+
+    def test_demotion_bumps_the_version_with_cold_reference_data(self):
+        # Frischer Prozess: Mitarbeiterliste noch nicht geladen
+        version = reference_data().version
+        self.staff.is_staff = False
+        self.staff.save()
+        self.assertNotEqual(reference_data().version, version)
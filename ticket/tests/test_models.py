@@ -1,7 +1,104 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from ticket.models import Comment, ProblemSource, Ticket
 
 
 class TestModels(TestCase):
 
     def setUp(self):
         pass
+
+
+class TestTicketChangeTracking(TestCase):
+
+    def setUp(self):
+        problem_source = ProblemSource.objects.create(name="Drucker", slug="drucker")
+        Ticket.objects.create(title="Test", problem_source=problem_source, note="Notiz")
+        self.ticket = Ticket.objects.get()
+
+    def test_changed_fields(self):
+        self.assertEqual(self.ticket.changed_fields, set())
+
+        self.ticket.completed = True
+        self.assertEqual(self.ticket.changed_fields, {'completed'})
+        self.assertIsNone(Ticket(title="Neu").changed_fields)
+
+    def test_save_updates_changed_columns_without_select(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.ticket.close_ticket()
+
+        ticket_queries = [q['sql'] for q in queries if '"ticket_ticket"' in q['sql']]
+        self.assertEqual(len(ticket_queries), 1)
+        self.assertTrue(ticket_queries[0].startswith('UPDATE'))
+        self.assertNotIn('"note"', ticket_queries[0])
+        self.assertEqual(self.ticket.changed_fields, set())
+        self.assertTrue(Ticket.objects.get().completed)
+
+
+class TestCommentThreads(TestCase):
+
+    def setUp(self):
+        problem_source = ProblemSource.objects.create(name="Drucker", slug="drucker")
+        self.ticket = Ticket.objects.create(title="Test", problem_source=problem_source)
+        self.threads = []
+        for i in range(3):
+            root = Comment.objects.create(ticket=self.ticket, text=f"Thread {i}")
+            reply = Comment.objects.create(ticket=self.ticket, text=f"Antwort {i}", parent=root)
+            Comment.objects.create(ticket=self.ticket, text=f"Antwort auf Antwort {i}", parent=reply)
+            self.threads.append(root)
+
+    def test_forest_loads_whole_threads(self):
+        with self.assertNumQueries(1):
+            roots = Comment.objects.forest([root.tree_id for root in self.threads])
+        self.assertEqual([root.id for root in roots], [root.id for root in self.threads])
+
+        with self.assertNumQueries(0):
+            texts = [(reply.text, [nested.text for nested in reply.get_replies()])
+                     for root in roots for reply in root.get_replies()]
+        self.assertEqual(texts[0], ("Antwort 0", ["Antwort auf Antwort 0"]))
+
+
+class TestProblemSourceBreadcrumbs(TestCase):
+
+    def setUp(self):
+        self.hardware = ProblemSource.objects.create(name="Hardware", slug="hardware")
+        self.printer = ProblemSource.objects.create(name="Drucker", slug="drucker", parent=self.hardware)
+        self.toner = ProblemSource.objects.create(name="Toner", slug="toner", parent=self.printer)
+        self.software = ProblemSource.objects.create(name="Software", slug="software")
+
+    def breadcrumbs(self):
+        return dict(ProblemSource.objects.values_list('slug', 'breadcrumb'))
+
+    def test_new_nodes_get_their_breadcrumb(self):
+        self.assertEqual(self.toner.breadcrumb, "Hardware > Drucker > Toner")
+        self.assertEqual(self.breadcrumbs()['toner'], "Hardware > Drucker > Toner")
+
+    def test_rename_rewrites_the_subtree_in_one_update(self):
+        self.hardware.refresh_from_db()
+        self.hardware.name = "Geräte"
+        with CaptureQueriesContext(connection) as queries:
+            self.hardware.save()
+
+        # Das eigene save() plus ein einziges Bulk-UPDATE für den Teilbaum
+        bulk_updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE') and 'CASE' in q['sql']]
+        self.assertEqual(len(bulk_updates), 1)
+        self.assertEqual(self.breadcrumbs(), {
+            'hardware': "Geräte", 'drucker': "Geräte > Drucker", 'toner': "Geräte > Drucker > Toner",
+            'software': "Software",
+        })
+
+    def test_move_rewrites_the_subtree(self):
+        printer = ProblemSource.objects.get(slug='drucker')
+        printer.move_to(ProblemSource.objects.get(slug='software'))
+
+        self.assertEqual(self.breadcrumbs()['toner'], "Software > Drucker > Toner")
+
+    def test_other_changes_keep_the_breadcrumbs(self):
+        printer = ProblemSource.objects.get(slug='drucker')
+        printer.slug = "printer"
+        with CaptureQueriesContext(connection) as queries:
+            printer.save()
+
+        self.assertFalse([q for q in queries if 'breadcrumb' in q['sql'] and q['sql'].startswith('SELECT')])
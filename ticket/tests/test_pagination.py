@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django_currentuser.middleware import _set_current_user
+
+from ticket.managers.event import TIMELINE_ORDERING
+from ticket.models import ProblemSource, Ticket, TicketEvent
+from ticket.pagination import decode_cursor, encode_cursor, paginate_keyset
+from ticket.views import TicketListView
+
+
+class TestKeysetPagination(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username="creator")
+        problem_source = ProblemSource.objects.create(name="Drucker", slug="drucker")
+        self.ticket = Ticket.objects.create(title="Test", problem_source=problem_source)
+        start = datetime(2024, 3, 4, 10, 0)
+        # Several events share a timestamp, so id has to break the ties
+        self.events = [
+            TicketEvent.objects.create(
+                ticket=self.ticket, type=TicketEvent.EventType.COMMENT, author=self.user,
+                timestamp=start + timedelta(hours=i // 3)
+            ) for i in range(7)
+        ]
+
+    def test_cursor_round_trip(self):
+        values = [datetime(2024, 3, 4, 10, 0), 12]
+        self.assertEqual(decode_cursor(encode_cursor(values)), ['2024-03-04T10:00:00', 12])
+        self.assertIsNone(decode_cursor("not-a-cursor"))
+
+    def test_pages_cover_every_event_once(self):
+        seen = []
+        cursor = None
+        while True:
+            page = paginate_keyset(TicketEvent.objects.all(), TIMELINE_ORDERING, cursor, per_page=2)
+            seen.extend(page.items)
+            cursor = page.next_cursor
+            if not cursor:
+                break
+
+        expected = sorted(self.events, key=lambda e: (e.timestamp, e.id), reverse=True)
+        self.assertEqual([e.id for e in seen], [e.id for e in expected])
+
+    def test_sub_millisecond_timestamps_are_not_skipped(self):
+        # Cursor auf Millisekunden gekürzt: die Zeilen derselben Millisekunde fielen aus
+        TicketEvent.objects.all().delete()
+        start = datetime(2024, 3, 4, 10, 0, 0, 123000)
+        events = [
+            TicketEvent.objects.create(
+                ticket=self.ticket, type=TicketEvent.EventType.COMMENT, author=self.user,
+                timestamp=start + timedelta(microseconds=100 * i)
+            ) for i in range(5)
+        ]
+        seen = []
+        cursor = None
+        while True:
+            page = paginate_keyset(TicketEvent.objects.all(), TIMELINE_ORDERING, cursor, per_page=2)
+            seen.extend(e.id for e in page.items)
+            cursor = page.next_cursor
+            if not cursor:
+                break
+
+        self.assertEqual(seen, [e.id for e in reversed(events)])
+
+    def test_tampered_cursor_returns_first_page(self):
+        first = paginate_keyset(TicketEvent.objects.all(), TIMELINE_ORDERING, per_page=3)
+        for values in (["nope", "x"], [None, 1], ["2024-03-04T10:00:00", [1]], {"a": 1}, [1]):
+            page = paginate_keyset(TicketEvent.objects.all(), TIMELINE_ORDERING, encode_cursor(values), per_page=3)
+            self.assertEqual([e.id for e in page.items], [e.id for e in first.items])
+
+    def test_page_costs_one_query(self):
+        cursor = paginate_keyset(TicketEvent.objects.all(), TIMELINE_ORDERING, per_page=3).next_cursor
+        with self.assertNumQueries(1):
+            paginate_keyset(TicketEvent.objects.all(), TIMELINE_ORDERING, cursor, per_page=3)
+
+    def test_previous_cursor_returns_preceding_page(self):
+        first = paginate_keyset(TicketEvent.objects.all(), TIMELINE_ORDERING, per_page=3)
+        second = paginate_keyset(TicketEvent.objects.all(), TIMELINE_ORDERING, first.next_cursor, per_page=3)
+        back = paginate_keyset(
+            TicketEvent.objects.all(), TIMELINE_ORDERING, second.previous_cursor, per_page=3, backwards=True
+        )
+
+        self.assertIsNone(first.previous_cursor)
+        self.assertEqual([e.id for e in back.items], [e.id for e in first.items])
+        self.assertIsNone(back.previous_cursor)
+        self.assertEqual(back.next_cursor, first.next_cursor)
+
+
+class TestTicketListPagination(TestCase):
+
+    def setUp(self):
+        self.staff = User.objects.create(username="staff", is_staff=True)
+        problem_source = ProblemSource.objects.create(name="Drucker", slug="drucker")
+        # Half of the tickets are unassigned, so sorting by assignee hits NULLs
+        for i in range(7):
+            Ticket.objects.create(
+                title=str(i), problem_source=problem_source, assigned_to=self.staff if i % 2 else None
+            )
+        self.client.force_login(self.staff)
+        cache.clear()
+
+    def tearDown(self):
+        # Der Middleware-Thread-Local überlebt sonst bis in den nächsten Test
+        _set_current_user(None)
+
+    @mock.patch.object(TicketListView, 'page_size', 2)
+    def test_pages_cover_every_ticket_once(self):
+        for query in ({}, {'sort': 'assigned_to', 'dir': 'asc'}, {'sort': 'created_date', 'dir': 'desc'}):
+            seen = []
+            url = "/tickets/all/open/"
+            response = self.client.get(url, query)
+            while True:
+                seen.extend(t.id for t in response.context['tickets'])
+                if not response.context['next_page_link']:
+                    break
+                response = self.client.get(url + response.context['next_page_link'])
+
+            self.assertEqual(sorted(seen), sorted(Ticket.objects.values_list('id', flat=True)))
+            self.assertEqual(response.context['ticket_count'], 7)
+
+    def test_customer_visit_does_not_poison_the_shared_count(self):
+        customer = User.objects.create(username="customer")
+        self.client.force_login(customer)
+        self.assertEqual(self.client.get("/tickets/all/open/").context['ticket_count'], 0)
+
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get("/tickets/all/open/").context['ticket_count'], 7)
@@ -0,0 +1,291 @@
+import hashlib
+import shutil
+import tempfile
+from datetime import datetime
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django_currentuser.middleware import _set_current_user
+from django.test.utils import CaptureQueriesContext
+
+from authentication.models import Team
+from ticket.models import Attachment, Comment, ProblemSource, Ticket, TicketEvent
+from ticket.pagination import encode_cursor
+
+
+def use_temp_media_root(test_case):
+    """MEDIA_ROOT in einem eigenen Temp-Verzeichnis, das nach dem Test gelöscht wird."""
+    media_root = tempfile.mkdtemp()
+    test_case.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+    media_override = override_settings(MEDIA_ROOT=media_root)
+    media_override.enable()
+    test_case.addCleanup(media_override.disable)
+
+
+class TestTicketDetailPost(TestCase):
+
+    def setUp(self):
+        self.staff = User.objects.create(username="staff", first_name="Staff", is_staff=True)
+        self.team = Team.objects.create(name="Support")
+        problem_source = ProblemSource.objects.create(name="Drucker", slug="drucker")
+        self.ticket = Ticket.objects.create(
+            title="Test", problem_source=problem_source, assigned_to=self.staff, note="alt", created_by=self.staff
+        )
+        self.ticket.followers.add(self.staff)
+        self.client.force_login(self.staff)
+
+    def tearDown(self):
+        # Der Middleware-Thread-Local überlebt sonst bis in den nächsten Test
+        _set_current_user(None)
+
+    def post(self, data):
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                self.client.post(f"/ticket/{self.ticket.id}/detail/", data)
+        return queries, callbacks
+
+    def test_changes_are_written_in_one_update(self):
+        queries, callbacks = self.post({
+            'note': 'neu', 'priority': '2', 'assign_team': str(self.team.id), 'title': 'Neuer Titel',
+        })
+
+        ticket_updates = [q for q in queries if q['sql'].startswith('UPDATE "ticket_ticket"')]
+        self.assertEqual(len(ticket_updates), 1)
+        # Event-Batch, die WebSocket-Meldung an das neue Team und der Feld-Diff für offene Detailseiten
+        self.assertEqual(len(callbacks), 3)
+
+        self.ticket.refresh_from_db()
+        self.assertEqual((self.ticket.note, self.ticket.priority, self.ticket.title), ('neu', 2, 'Neuer Titel'))
+        self.assertEqual(self.ticket.assigned_team, self.team)
+
+        types = TicketEvent.objects.filter(ticket=self.ticket, user_to_notify=None).values_list('type', flat=True)
+        self.assertCountEqual(types, [TicketEvent.EventType.EDIT, TicketEvent.EventType.TEAM_ASSIGN])
+        self.assertEqual(TicketEvent.objects.filter(user_to_notify=self.staff, seen=True).count(), 2)
+
+    def test_unchanged_pause_and_bad_values_are_no_changes(self):
+        Ticket.objects.filter(id=self.ticket.id).update(paused_until=datetime(2030, 5, 6, 7, 30))
+
+        queries, callbacks = self.post({
+            'pause_until': '2030-05-06T07:30', 'priority': 'hoch', 'problem_source': 'x', 'assign_team': 'x',
+            'assign_to': 'x', 'add_co_assignee': '9999', 'remove_co_assignee': 'x',
+        })
+
+        self.assertEqual(callbacks, [])
+        self.assertFalse([q for q in queries if q['sql'].startswith('UPDATE "ticket_ticket"')])
+        self.post({'pause_until': '2030-05-07T08:00', 'priority': '3'})
+        self.ticket.refresh_from_db()
+        self.assertEqual((self.ticket.paused_until, self.ticket.priority), (datetime(2030, 5, 7, 8, 0), 0))
+
+    def test_comment_on_closed_ticket_reopens_it(self):
+        Ticket.objects.filter(id=self.ticket.id).update(completed=True)
+
+        self.post({'new_comment': 'Hallo'})
+
+        self.ticket.refresh_from_db()
+        self.assertFalse(self.ticket.completed)
+        types = TicketEvent.objects.filter(ticket=self.ticket, user_to_notify=None).values_list('type', flat=True)
+        self.assertCountEqual(types, [TicketEvent.EventType.COMMENT, TicketEvent.EventType.REOPEN])
+
+    @override_settings(ATTACHMENT_MAX_FILE_SIZE=1024)
+    def test_attachments_are_hashed_while_streaming(self):
+        use_temp_media_root(self)
+        content = b"x" * 1000
+        self.post({'files': SimpleUploadedFile("log.txt", content)})
+
+        attachment = Attachment.objects.get(ticket=self.ticket)
+        self.assertEqual(attachment.sha256, hashlib.sha256(content).hexdigest())
+        self.assertEqual(attachment.file.read(), content)
+
+    @override_settings(ATTACHMENT_MAX_FILE_SIZE=1024)
+    def test_oversized_attachment_rejects_the_post(self):
+        use_temp_media_root(self)
+        response = self.client.post(f"/ticket/{self.ticket.id}/detail/", {
+            'new_comment': 'Siehe Anhang', 'files': SimpleUploadedFile("dump.bin", b"x" * 2048),
+        })
+
+        self.assertContains(response, "dump.bin ist größer als 1,0")
+        self.assertFalse(Attachment.objects.exists())
+        self.assertFalse(Comment.objects.exists())
+
+
+
+class TestAttachmentDownload(TestCase):
+
+    def setUp(self):
+        use_temp_media_root(self)
+        self.staff = User.objects.create(username="staff", is_staff=True)
+        self.outsider = User.objects.create(username="outsider")
+        problem_source = ProblemSource.objects.create(name="Drucker", slug="drucker")
+        ticket = Ticket.objects.create(title="Test", problem_source=problem_source, created_by=self.staff)
+        self.attachment = Attachment.objects.create(
+            name="Bericht März.pdf", file=ContentFile(b"%PDF", name="bericht.pdf"), ticket=ticket
+        )
+        self.url = f"/attachment/{self.attachment.id}/"
+
+    def tearDown(self):
+        _set_current_user(None)
+
+    def test_without_access_is_not_found(self):
+        self.client.force_login(self.outsider)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    @override_settings(ATTACHMENT_ACCEL_REDIRECT="/protected-media/")
+    def test_transfer_is_handed_to_nginx(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(self.url + "?download=1")
+
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/" + self.attachment.file.name)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertEqual(response["Content-Disposition"], "attachment; filename*=utf-8''Bericht%20M%C3%A4rz.pdf")
+        self.assertIn("private", response["Cache-Control"])
+
+    def test_served_by_django_without_nginx(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(self.url)
+
+        self.assertEqual(b"".join(response.streaming_content), b"%PDF")
+        self.assertTrue(response["Content-Disposition"].startswith("inline"))
+        cached = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(cached.status_code, 304)
+
+
+class TestTicketDetailGet(TestCase):
+
+    def setUp(self):
+        self.staff = User.objects.create(username="staff", first_name="Staff", is_staff=True)
+        self.other = User.objects.create(username="other", first_name="Other", is_staff=True)
+        problem_source = ProblemSource.objects.create(name="Drucker", slug="drucker")
+        self.ticket = Ticket.objects.create(title="Test", problem_source=problem_source, created_by=self.staff)
+        self.client.force_login(self.staff)
+
+    def tearDown(self):
+        _set_current_user(None)
+
+    def test_get_does_not_write(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/ticket/{self.ticket.id}/detail/")
+
+        self.assertTrue(response.context['can_claim'])
+        writes = [q['sql'] for q in queries if q['sql'].split()[0] in ('INSERT', 'UPDATE', 'DELETE')]
+        # Nur die Session darf geschrieben werden
+        self.assertEqual([w for w in writes if 'django_session' not in w], [])
+
+    def test_only_first_claim_wins(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.client.post(f"/ticket/{self.ticket.id}/claim/").json()
+        self.client.force_login(self.other)
+        second = self.client.post(f"/ticket/{self.ticket.id}/claim/").json()
+
+        self.assertEqual((first['claimed'], second['claimed']), (True, False))
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.assigned_to, self.staff)
+        self.assertTrue(self.ticket.access.filter(user=self.staff, role='assignee').exists())
+        self.assertTrue(TicketEvent.objects.filter(ticket=self.ticket, type=TicketEvent.EventType.ASSIGNED).exists())
+
+    def test_customer_cannot_claim_foreign_ticket(self):
+        customer = User.objects.create(username="customer")
+        self.client.force_login(customer)
+
+        self.assertEqual(self.client.post(f"/ticket/{self.ticket.id}/claim/").status_code, 404)
+        self.ticket.refresh_from_db()
+        self.assertIsNone(self.ticket.assigned_to)
+        self.assertFalse(self.ticket.access.filter(user=customer).exists())
+
+    def test_mark_seen_beacon(self):
+        TicketEvent.objects.create(
+            ticket=self.ticket, type=TicketEvent.EventType.COMMENT, user_to_notify=self.staff
+        )
+
+        response = self.client.post("/ajax/seen/", {'ticket': [self.ticket.id, 'x']})
+
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(TicketEvent.objects.filter(user_to_notify=self.staff, seen=False).exists())
+
+
+class TestTicketDetailQueries(TestCase):
+
+    def setUp(self):
+        self.staff = User.objects.create(username="staff", first_name="Staff", is_staff=True)
+        self.other = User.objects.create(username="other", first_name="Other", is_staff=True)
+        Team.objects.create(name="Support")
+        problem_source = ProblemSource.objects.create(name="Drucker", slug="drucker")
+        ProblemSource.objects.create(name="Toner", slug="toner", parent=problem_source)
+        self.ticket = Ticket.objects.create(
+            title="Test", problem_source=problem_source, assigned_to=self.staff, created_by=self.staff
+        )
+        self.ticket.followers.add(self.staff, self.other)
+        self.ticket.co_assignees.add(self.other)
+        self.client.force_login(self.staff)
+
+    def tearDown(self):
+        _set_current_user(None)
+
+    def add_comments(self, count):
+        for i in range(count):
+            comment = Comment.objects.create(ticket=self.ticket, text=f"Kommentar {i}", author=self.other)
+            TicketEvent.objects.create(
+                ticket=self.ticket, type=TicketEvent.EventType.COMMENT, comment=comment, author=self.other
+            )
+            for j in range(2):
+                Comment.objects.create(ticket=self.ticket, text=f"Antwort {j}", parent=comment, author=self.staff)
+        _set_current_user(None)
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/ticket/{self.ticket.id}/detail/")
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_comments(self):
+        self.add_comments(1)
+        # Stammdaten (Mitarbeiter, Teams, Problemquellen) einmal in den Prozess-Cache laden
+        self.count_queries()
+        few = self.count_queries()
+        self.add_comments(5)
+        many = self.count_queries()
+
+        self.assertEqual(few, many)
+        # Session, Benutzer, Ticket + 2 Prefetches, Anhänge, Timeline, Kommentarbaum
+        # und 3 aus dem Benachrichtigungs-Context-Processor
+        self.assertLessEqual(many, 11)
+
+    def test_replies_come_from_the_comment_forest(self):
+        self.add_comments(2)
+
+        response = self.client.get(f"/ticket/{self.ticket.id}/detail/")
+
+        comments = [event.comment for group in response.context['timeline_events'] for event in group
+                    if event.comment_id]
+        self.assertEqual(len(comments), 2)
+        with self.assertNumQueries(0):
+            replies = [reply.author.first_name for comment in comments for reply in comment.get_replies()]
+        self.assertEqual(replies, ["Staff"] * 4)
+
+    def test_live_view_returns_only_newer_events(self):
+        self.add_comments(1)
+        after = self.client.get(f"/ticket/{self.ticket.id}/detail/").context['timeline_after']
+        root = Comment.objects.get(text="Kommentar 0")
+        reply = Comment.objects.create(ticket=self.ticket, text="Live-Antwort", parent=root, author=self.other)
+        TicketEvent.objects.create(ticket=self.ticket, type=TicketEvent.EventType.REPLY, comment=reply, author=self.other)
+        self.add_comments(1)
+
+        data = self.client.get(f"/ticket/{self.ticket.id}/live/", {'after': after, 'statistics': 1}).json()
+
+        self.assertEqual(data['timeline'].count('Kommentar 0'), 1)
+        self.assertIn('Live-Antwort', data['threads'][str(root.id)])
+        self.assertIn('Zugewiesen an', data['statistics'])
+        self.assertFalse(data['more'])
+
+        data = self.client.get(f"/ticket/{self.ticket.id}/live/", {'after': data['after']}).json()
+        self.assertEqual((data['timeline'], data['threads']), ('', {}))
+
+    def test_tampered_cursors_are_ignored(self):
+        self.add_comments(1)
+        cursor = encode_cursor(["nope", "x"])
+
+        self.assertEqual(self.client.get(f"/ticket/{self.ticket.id}/timeline/", {'before': cursor}).status_code, 200)
+        self.assertEqual(self.client.get(f"/ticket/{self.ticket.id}/live/", {'after': cursor}).status_code, 200)
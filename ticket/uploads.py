@@ -0,0 +1,76 @@
+import hashlib
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopUpload
+from django.template.defaultfilters import filesizeformat
+
+
+def upload_errors(request):
+    """Messages of the files the upload handler refused for ``request``."""
+    request.FILES  # Upload parsen, falls noch niemand auf POST/FILES zugegriffen hat
+    return getattr(request, "upload_errors", [])
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """
+    Streams every uploaded file chunk by chunk into a temporary file on disk
+    and computes its SHA-256 on the way (``uploaded_file.sha256``), so a
+    worker never holds an upload in memory.  Limits are checked before any
+    data is written: a request whose ``Content-Length`` exceeds
+    ``ATTACHMENT_MAX_REQUEST_SIZE`` keeps its form fields but drops all files,
+    a file growing past ``ATTACHMENT_MAX_FILE_SIZE`` is discarded as soon as
+    the limit is crossed.  Refused files are reported in
+    ``request.upload_errors``.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_file_size = settings.ATTACHMENT_MAX_FILE_SIZE
+        self.max_request_size = settings.ATTACHMENT_MAX_REQUEST_SIZE
+        self.request_too_big = False
+        self.request_bytes = 0
+        self.errors = []
+        if request is not None:
+            request.upload_errors = self.errors
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.request_too_big = content_length > self.max_request_size
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        if self.request_too_big:
+            self.reject(f"Die Anhänge überschreiten zusammen {filesizeformat(self.max_request_size)}.")
+        if self.content_length and self.content_length > self.max_file_size:
+            self.reject(f"{self.file_name} ist größer als {filesizeformat(self.max_file_size)}.")
+        self.file = TemporaryUploadedFile(self.file_name, self.content_type, 0, self.charset, self.content_type_extra)
+        self.hash = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.request_bytes += len(raw_data)
+        if self.request_bytes > self.max_request_size:
+            # Content-Length war falsch: Rest der Anfrage verwerfen
+            self.errors.append(f"Die Anhänge überschreiten zusammen {filesizeformat(self.max_request_size)}.")
+            raise StopUpload()
+        if start + len(raw_data) > self.max_file_size:
+            self.reject(f"{self.file_name} ist größer als {filesizeformat(self.max_file_size)}.")
+        self.hash.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        # Abgeben: der Parser schließt bei einem späteren Abbruch ``self.file``
+        uploaded = self.file
+        del self.file
+        uploaded.seek(0)
+        uploaded.size = file_size
+        uploaded.sha256 = self.hash.hexdigest()
+        return uploaded
+
+    def upload_interrupted(self):
+        if hasattr(self, "file"):
+            self.file.close()
+
+    def reject(self, message):
+        if message not in self.errors:
+            self.errors.append(message)
+        raise SkipFile()
@@ -4,7 +4,8 @@ from django.urls import path, include
 
 from ticket import views
 from ticket.views import IndexView
-from ticket.views.ajax_views import SearchUsersView, AddUserView, PauseTicketReminders, Statistics, AutoAssignView
+from ticket.views.ajax_views import SearchUsersView, AddUserView, PauseTicketReminders, Statistics, AutoAssignView, \
+    TicketStatsView, TimelineView, TicketLiveView, ClaimTicketView, MarkSeenView
 from ticket.views.search_view import SearchTicketsView
 
 login_url = "/login/"
@@ -21,8 +22,11 @@ urlpatterns = [
     path('ajax/search-users/', login_required(SearchUsersView.as_view(), login_url=login_url), name='search-users'),
     path('ajax/add-user/', login_required(AddUserView.as_view(), login_url=login_url), name='add-user'),
     path('ajax/pause-reminders/', login_required(PauseTicketReminders.as_view(), login_url=login_url), name='pause-reminders'),
+    path('ajax/timeline/', login_required(TimelineView.as_view(), login_url=login_url), name='timeline'),
+    path('ajax/seen/', login_required(MarkSeenView.as_view(), login_url=login_url), name='mark_seen'),
     path('statistics/', login_required(Statistics.as_view(), 'redirect', '/login/'), name='statistics'),
     path('statistics/autoassign/', login_required(AutoAssignView.as_view(), 'redirect', '/login/'), name='time_to_auto_assign'),
+    path('statistics/tickets/', login_required(TicketStatsView.as_view(), 'redirect', '/login/'), name='ticket_stats'),
 
     # Problem source selection
     path('problem_sources/', login_required(views.ProblemSourceListView.as_view(), login_url=login_url),
@@ -39,6 +43,16 @@ urlpatterns = [
          name='ticket_detail'),
     path('ticket/<int:id>/edit/', login_required(views.TicketDetailView.as_view(), login_url=login_url),
          name='edit_ticket'),
+    path('ticket/<int:id>/timeline/', login_required(TimelineView.as_view(), login_url=login_url),
+         name='ticket_timeline'),
+    path('ticket/<int:id>/live/', login_required(TicketLiveView.as_view(), login_url=login_url),
+         name='ticket_live'),
+    path('ticket/<int:id>/claim/', login_required(ClaimTicketView.as_view(), login_url=login_url),
+         name='claim_ticket'),
+
+    # Attachments (Zugriffsprüfung, Auslieferung durch nginx)
+    path('attachment/<int:id>/', login_required(views.AttachmentDownloadView.as_view(), login_url=login_url),
+         name='attachment'),
 
     # Ticket Lists
     path('tickets/<str:type>/', login_required(views.TicketListView.as_view(), login_url=login_url),
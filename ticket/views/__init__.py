@@ -1,3 +1,4 @@
+from .attachment_view import *
 from .create_ticket_view import *
 from .index import *
 from .problem_source_list_view import *
@@ -1,11 +1,17 @@
 from django.contrib.auth.models import User
 from django.core import serializers
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.template.loader import render_to_string
 from django.utils.dateparse import parse_datetime
 from django.views import View
 
+from ticket.managers.event import TIMELINE_ORDERING
 from ticket.models import Ticket, TicketEvent
-from ticket.services import TicketEventService
+from ticket.pagination import paginate_keyset
+from ticket.permissions import permissions_for
+from ticket.services import TicketEventService, claim_ticket
+from ticket.views.index import IndexView
 
 
 class SearchUsersView(View):
@@ -52,11 +58,15 @@ class PauseTicketReminders(View):
 class Statistics(View):
     def get(self, request):
         stats_per_user = Ticket.objects.statistics_per_user()
+        business_time_per_user = Ticket.objects.average_business_processing_time_per_user()
         data = {}
         for stats in stats_per_user:
             data[stats["modified_by__first_name"]] = {
                 'summe_ticket_geschlossen': stats['total_tickets_closed'],
                 'durchschnittliche_bearbeitungszeit': str(stats['average_processing_time']),
+                'durchschnittliche_bearbeitungszeit_geschaeftszeiten': str(
+                    business_time_per_user.get(stats['modified_by'])
+                ),
                 'max_bearbeitungszeit': str(stats['max_processing_time']),
                 'min_bearbeitungszeit': str(stats['min_processing_time'])
 
@@ -68,12 +78,153 @@ class AutoAssignView(View):
     def get(self, request):
         average_time_to_auto_assign = TicketEvent.objects.average_time_to_auto_assign()
         average_time_during_business_hours = TicketEvent.objects.average_time_to_auto_assign_during_business_hours()
+        average_business_time = TicketEvent.objects.average_business_time_to_auto_assign()
         #time_to_auto_assign = [x for x in TicketEvent.objects.time_to_auto_assign().values()]
         data = {
             'average_time_to_auto_assign': average_time_to_auto_assign['time_to_auto_assign__avg'].__str__(),
-            'average_time_to_auto_assign_mon_fri_9_16': average_time_during_business_hours['time_to_auto_assign__avg'].__str__()
+            'average_time_to_auto_assign_created_during_business_hours':
+                average_time_during_business_hours['time_to_auto_assign__avg'].__str__(),
+            'average_business_time_to_auto_assign': average_business_time.__str__(),
             # 'time_to_auto_assign': {
             #     "query": TicketEvent.objects.time_to_auto_assign().query.__str__(),
             #     "result": time_to_auto_assign
         }
         return JsonResponse(data, json_dumps_params={'indent': 4})
+
+
+def int_param(request, name, default):
+    """Integer query parameter, ``default`` when missing or not a number."""
+    try:
+        return int(request.GET.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class TicketStatsView(View):
+    page_size = 500
+
+    def get(self, request):
+        after = max(int_param(request, 'after', 0), 0)
+        # 1..page_size: bei 0 oder negativ gäbe es keine Seite bzw. einen Slice-Fehler
+        limit = min(max(int_param(request, 'limit', self.page_size), 1), self.page_size)
+        page = TicketEvent.objects.ticket_stats_page(after=after, limit=limit)
+
+        results = []
+        for stats in page.iterator():
+            results.append({
+                'ticket': stats['ticket'],
+                'erstellt': str(stats['creation_time']),
+                'erste_zuweisung': str(stats['first_assign_time']),
+                'kommentare': stats['num_comments'],
+                'hinzugefuegte_benutzer': stats['num_followers_added'],
+                'zeit_bis_erste_antwort': str(stats['time_to_first_response']),
+            })
+
+        data = {
+            'results': results,
+            'next': results[-1]['ticket'] if len(results) == limit else None,
+        }
+        return JsonResponse(data, json_dumps_params={'indent': 4})
+
+
+class TimelineView(View):
+    """
+    "Ältere laden" für die Timelines: liefert die nächste Keyset-Seite als
+    gerendertes Fragment (nach Tagen gruppiert) plus den nächsten Cursor.
+    """
+    def get(self, request, id=None):
+        user = request.user
+        before = request.GET.get('before')
+
+        if id:
+            ticket = get_object_or_404(Ticket.objects.prefetch_related('co_assignees'), id=id)
+            if not permissions_for(request).has_full_access(ticket):
+                raise Http404
+            timeline_events, next_cursor = TicketEventService(ticket=ticket, current_user=user) \
+                .get_unique_events(before=before)
+        else:
+            page = paginate_keyset(
+                TicketEvent.objects.timeline_for(user), TIMELINE_ORDERING, before, IndexView.timeline_page_size
+            )
+            timeline_events = TicketEventService(current_user=user) \
+                .group_timeline_events_by_date(page.items, add_text=True)
+            next_cursor = page.next_cursor
+
+        html = render_to_string(
+            'ticket/includes/timeline/timeline_events.html',
+            {'timeline_events': timeline_events, 'user': user},
+            request=request
+        )
+        return JsonResponse({'html': html, 'next': next_cursor})
+
+
+class TicketLiveView(View):
+    """
+    Fragmente für die Live-Updates der Detailseite (siehe TicketConsumer):
+    die Ereignisse nach ``after``, die Antwort-Threads neuer Antworten und auf
+    Wunsch die Status-Kacheln – pro Betrachter gerendert, statt die ganze
+    Seite neu zu laden.
+    """
+    def get(self, request, id):
+        ticket = get_object_or_404(
+            Ticket.objects.select_related('assigned_to').prefetch_related('co_assignees'), id=id
+        )
+        if not permissions_for(request).has_full_access(ticket):
+            raise Http404
+        user = request.user
+        after = request.GET.get('after')
+
+        service = TicketEventService(ticket=ticket, current_user=user)
+        events, roots, more = service.get_new_events(after)
+        roots = {root.tree_id: root for root in roots}
+
+        # Antworten erscheinen nicht als eigenes Ereignis, sondern im Thread ihres Kommentars
+        threads = {}
+        for event in events:
+            if event.is_reply() and event.comment_id and event.comment.tree_id in roots:
+                root = roots[event.comment.tree_id]
+                threads[root.id] = render_to_string(
+                    'ticket/includes/comment/replies.html',
+                    {'replies': root.get_replies(), 'event': event, 'user': user},
+                    request=request
+                )
+
+        data = {
+            'timeline': render_to_string(
+                'ticket/includes/timeline/timeline_events.html',
+                {'timeline_events': service.group_timeline_events_by_date(events, add_text=True), 'user': user},
+                request=request
+            ) if events else '',
+            'threads': threads,
+            'after': service.timeline_cursor(events[0]) if events else after,
+            'more': more,
+        }
+        if request.GET.get('statistics'):
+            data['statistics'] = render_to_string(
+                'ticket/includes/ticket/ticket_statistics.html', {'ticket': ticket, 'user': user}, request=request
+            )
+        return JsonResponse(data)
+
+
+class ClaimTicketView(View):
+    """
+    Auto-Zuweisung an den ersten Öffner (vom Detail-Template per POST
+    ausgelöst); atomar, bei parallelen Aufrufen gewinnt genau einer.
+    """
+    def post(self, request, id):
+        ticket = get_object_or_404(Ticket.objects.prefetch_related('co_assignees'), id=id)
+        if not permissions_for(request).can_claim(ticket):
+            raise Http404
+        return JsonResponse({'claimed': claim_ticket(ticket, request.user)})
+
+
+class MarkSeenView(View):
+    """
+    Beacon-Endpunkt: markiert die Benachrichtigungen der übergebenen Tickets
+    gesammelt als gesehen (ein UPDATE pro Aufruf).
+    """
+    def post(self, request):
+        ticket_ids = {int(t) for t in request.POST.getlist('ticket') if t.isdigit()}
+        if ticket_ids:
+            TicketEvent.objects.mark_seen(request.user, ticket_ids)
+        return HttpResponse(status=204)
@@ -0,0 +1,64 @@
+import mimetypes
+import os
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.views import View
+
+from ticket.models import Attachment
+from ticket.permissions import permissions_for
+
+# Nur diese Typen werden im Browser angezeigt; alles andere (HTML, SVG, ...) wird heruntergeladen
+INLINE_CONTENT_TYPES = {"image/png", "image/jpeg", "image/gif", "image/webp", "application/pdf", "text/plain"}
+
+
+def content_disposition(filename, as_attachment):
+    disposition = "attachment" if as_attachment else "inline"
+    try:
+        filename.encode("ascii")
+    except UnicodeEncodeError:
+        return f"{disposition}; filename*=utf-8''{quote(filename)}"
+    return '{}; filename="{}"'.format(disposition, filename.replace("\\", "\\\\").replace('"', r"\""))
+
+
+class AttachmentDownloadView(View):
+    """
+    Liefert einen Anhang nach derselben Zugriffsprüfung wie die Detailseite.
+    Mit ``ATTACHMENT_ACCEL_REDIRECT`` überträgt nginx die Datei aus seiner
+    internen Location (X-Accel-Redirect, inkl. Range/ETag), der Worker ist
+    nach der Prüfung sofort wieder frei; ohne (Entwicklung) streamt Django
+    selbst.
+    """
+    def get(self, request, id):
+        attachment = get_object_or_404(
+            Attachment.objects.select_related('ticket').prefetch_related('ticket__co_assignees'), id=id
+        )
+        if not permissions_for(request).has_full_access(attachment.ticket):
+            raise Http404
+
+        filename = attachment.name or os.path.basename(attachment.file.name)
+        content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        as_attachment = "download" in request.GET or content_type not in INLINE_CONTENT_TYPES
+
+        if settings.ATTACHMENT_ACCEL_REDIRECT:
+            response = HttpResponse(content_type=content_type)
+            response["X-Accel-Redirect"] = settings.ATTACHMENT_ACCEL_REDIRECT + quote(attachment.file.name)
+        else:
+            try:
+                # Ganze Sekunden, wie im Last-Modified-Header
+                last_modified = int(attachment.file.storage.get_modified_time(attachment.file.name).timestamp())
+            except OSError:
+                raise Http404
+            response = get_conditional_response(request, last_modified=last_modified)
+            if response is None:
+                response = FileResponse(attachment.file.open("rb"), content_type=content_type)
+                response["Last-Modified"] = http_date(last_modified)
+
+        response["Content-Disposition"] = content_disposition(filename, as_attachment)
+        # Nur der Browser des Berechtigten darf cachen, keine geteilten Proxys
+        patch_cache_control(response, private=True, max_age=settings.ATTACHMENT_CACHE_MAX_AGE)
+        return response
@@ -1,11 +1,12 @@
-from django.contrib.auth.models import User
 from django.shortcuts import render, redirect
 from django.views import View
 
 from ticket.forms import CreateTicketForm
-from ticket.models import ProblemSource, Ticket, Attachment
+from ticket.models import Ticket, Attachment
+from ticket.reference_data import reference_data
 from ticket.services import TicketEventService
 from ticket.tasks import manual_update_analytics
+from ticket.uploads import upload_errors
 import logging
 
 logger = logging.getLogger(__name__)
@@ -34,13 +35,16 @@ class CreateTicketView(View):
 
     def post(self, request, *args, **kwargs):
         form = CreateTicketForm(request.POST, request.FILES)
+        # Vom Upload-Handler verworfene Anhänge (zu groß): Formular erneut anzeigen
+        for error in upload_errors(request):
+            form.add_error('files', error)
         if form.is_valid():
             new_ticket = Ticket.objects.create(
                 title=form.data['title'],
                 problem_source=self.get_problem_source(),
                 note=form.data['note']
             )
-            new_ticket.followers.add(*User.objects.filter(is_staff=True))
+            new_ticket.followers.add(*reference_data().staff)
             new_ticket.followers.add(request.user)
             new_ticket.save()
             TicketEventService(current_user=request.user, ticket=new_ticket).create_new_ticket_events()
@@ -81,7 +85,7 @@ class CreateTicketView(View):
         return self.kwargs.get('slug')
 
     def get_problem_source(self):
-        return ProblemSource.objects.get(slug=self.get_slug())
+        return reference_data().problem_source(self.get_slug())
 
     def handle_attachments(self, attachments, ticket):
         for f in attachments or []:
@@ -89,6 +93,7 @@ class CreateTicketView(View):
                 name=getattr(f, "name", str(f)),
                 file=f,
                 ticket=ticket,
+                sha256=getattr(f, "sha256", ""),
             )
 
     def create_category(self):
@@ -1,91 +1,83 @@
-import ast
-from datetime import date, timedelta
+from datetime import date
 
-from django.contrib.auth.models import User
 from django.shortcuts import redirect
-from django.utils import timezone
+from django.urls import reverse
 from django.views.generic import ListView
 
 from authentication.models import MicrosoftProfile
+from ticket.dashboard import get_kpi_snapshot
 from ticket.forms import SearchUsersForm
-from ticket.models import TicketEvent, Ticket, ProblemSource, Analytics
+from ticket.managers.event import TIMELINE_ORDERING
+from ticket.models import TicketEvent, Ticket
+from ticket.pagination import paginate_keyset
+from ticket.reference_data import reference_data
 from ticket.services import TicketEventService
 
 
 class IndexView(ListView):
     model = TicketEvent
     context_object_name = 'timeline_events'
-    paginate_by = 5  # Number of days to show activity for
+    paginate_by = None  # Keyset-Pagination über ?before=<cursor>, siehe get_queryset
+    timeline_page_size = 50
     template_name = 'home.html'
 
     def get_queryset(self):
         user = self.request.user
-        if user.is_staff:
-            start_time = timezone.now()
-            end_time = start_time - timedelta(days=10)
-            user_events = TicketEvent.objects \
-                .filter(user_to_notify__isnull=True, timestamp__lt=start_time, timestamp__gt=end_time) \
-                .select_related("author", "ticket__problem_source", "target_user", "comment")
-        else:
-            user_events = TicketEvent.objects \
-                .filter(user_to_notify=self.request.user) \
-                .select_related("author", "ticket__problem_source", "target_user", "comment")
-        return TicketEventService(current_user=user).group_timeline_events_by_date(user_events, add_text=True)
-
-    def get_paginate_by(self, queryset):
-        return 1 if self.request.user.is_staff else 5
+        self.timeline_page = paginate_keyset(
+            TicketEvent.objects.timeline_for(user), TIMELINE_ORDERING, self.request.GET.get('before'), self.timeline_page_size
+        )
+        return TicketEventService(current_user=user).group_timeline_events_by_date(
+            self.timeline_page.items, add_text=True
+        )
 
     def get_context_data(self, **kwargs):
         context = super(IndexView, self).get_context_data(**kwargs)
-        tickets = Ticket.objects.select_related('problem_source', 'created_by').all()
         user = self.request.user
+        context['timeline_next'] = self.timeline_page.next_cursor
+        context['timeline_url'] = reverse('timeline')
 
         if user.is_staff:
             open_inactive_tickets = Ticket.objects.open_and_inactive_assigned_to(user)
             context['tickets'] = open_inactive_tickets
 
-            # Falls du das komplette QuerySet brauchst, behalte es separat
-            analytics_qs = Analytics.objects.all()
-
-            # Benötigte Analytics-Objekte immer vorhanden machen
-            pie_chart, _ = Analytics.objects.get_or_create(name='Tickets pro Problemquelle')
-            bar_chart, _ = Analytics.objects.get_or_create(name='Tickets pro Tag')
-
             # Timeline-Datum defensiv ermitteln
             timeline_events = context.get("timeline_events", [])
             page_date = timeline_events[0][0].date if timeline_events else date.today()
-            next_page_date = page_date + timedelta(days=1)
-
-            # Bar-Chart-Daten sicher parsen (leerer Fallback)
-            try:
-                bar_data = ast.literal_eval(bar_chart.data) if bar_chart.data else [[], []]
-            except Exception:
-                bar_data = [[], []]
-
-            context['pie_labels'] = pie_chart.labels or []
-            context['pie_data'] = pie_chart.data or []
-            context['bar_labels'] = bar_chart.labels or []
-            context['bar_open_data'] = bar_data[0] if len(bar_data) > 0 else []
-            context['bar_closed_data'] = bar_data[1] if len(bar_data) > 1 else []
-
-            context['tickets_opened_today'] = tickets.filter(
-                created_date__gt=page_date,
-                created_date__lt=next_page_date
-            ).count()
-
-            context['tickets_closed_today'] = tickets.filter(
-                completed_date__gt=page_date,
-                completed_date__lt=next_page_date,
-                completed=True
-            ).count()
-
-            context['all_open_ticket_count'] = tickets.filter(completed=False).count()
-            context['all_closed_ticket_count'] = tickets.filter(completed=True).count()
-            context['all_open_ticket_with_high_prio_count'] = tickets.filter(priority=2, completed=False).count()
+
+            # Zähler & Diagramme für alle Mitarbeiter gemeinsam (gecacht, siehe ticket/dashboard.py)
+            snapshot = get_kpi_snapshot(page_date)
+            counts = snapshot['counts']
+
+            context['pie_labels'] = snapshot['pie_labels']
+            context['pie_data'] = snapshot['pie_data']
+            context['bar_labels'] = snapshot['bar_labels']
+            context['bar_open_data'] = snapshot['bar_open_data']
+            context['bar_closed_data'] = snapshot['bar_closed_data']
+
+            # Backlog-Verlauf, Alter offener Tickets und Wochen-Kohorten (leerer Fallback)
+            backlog = snapshot['backlog']
+            open_per_day = backlog.get('Offene Tickets pro Tag', {'labels': [], 'data': [[], [], []]})
+            aging = backlog.get('Alter offener Tickets', {'labels': [], 'data': [[], [], []]})
+            cohorts = backlog.get('Abschlussquote pro Woche', {'labels': [], 'data': [[], []]})
+            context['backlog_labels'] = open_per_day['labels']
+            context['backlog_data'] = open_per_day['data']
+            context['aging_labels'] = aging['labels']
+            context['aging_data'] = aging['data']
+            context['cohorts'] = [
+                {'week': week, 'size': size, 'rates': [rates[i] for rates in cohorts['data'][1]]}
+                for i, (week, size) in enumerate(zip(cohorts['labels'], cohorts['data'][0]))
+            ]
+
+            context['tickets_opened_today'] = counts['opened_today']
+            context['tickets_closed_today'] = counts['closed_today']
+            context['all_open_ticket_count'] = counts['all_open']
+            context['all_closed_ticket_count'] = counts['all_closed']
+            context['all_open_ticket_with_high_prio_count'] = counts['all_open_high_priority']
             context['search_user_form'] = SearchUsersForm()
         else:
-            context['open_ticket_count'] = tickets.filter(created_by=user, completed=False).count()
-            context['closed_ticket_count'] = tickets.filter(created_by=user, completed=True).count()
+            counts = Ticket.objects.filter(created_by=user).open_closed_counts()
+            context['open_ticket_count'] = counts['open']
+            context['closed_ticket_count'] = counts['closed']
 
         return context
 
@@ -111,13 +103,10 @@ class IndexView(ListView):
 
     def post(self, request):
         feature_request = request.POST.get('feature_request')
-        problem_source = ProblemSource.objects.get(slug='feature-request')
+        problem_source = reference_data().problem_source('feature-request')
         new_ticket = Ticket.objects.create(note=feature_request, problem_source=problem_source)
-        new_ticket.followers.add(*User.objects.filter(is_staff=True))
+        new_ticket.followers.add(*reference_data().staff)
         new_ticket.followers.add(request.user)
         new_ticket.save()
         TicketEventService(current_user=request.user, ticket=new_ticket).create_new_ticket_events()
         return redirect('home')
-
-    def set_pagination(self):
-        return 1 if self.request.user.is_staff else 5
@@ -1,6 +1,8 @@
 from django.views.generic import ListView
 
-from ticket.models import ProblemSource, Ticket
+from ticket.models import ProblemSource
+from ticket.reference_data import reference_data
+from ticket.problem_sources import common_problem_sources_for
 
 
 class ProblemSourceListView(ListView):
@@ -9,19 +11,17 @@ class ProblemSourceListView(ListView):
     context_object_name = 'problem_sources'
 
     def get_queryset(self, *args, **kwargs):
+        data = reference_data()
         slug = self.kwargs.get('slug')
         if slug:
-            parent = ProblemSource.objects.get(slug=slug)
-            results = ProblemSource.objects.filter(parent=parent)
+            results = data.problem_source_children(data.problem_source(slug))
         else:
-            results = ProblemSource.objects.filter(parent__isnull=True).exclude(slug="feature-request")
+            results = [source for source in data.problem_source_children() if source.slug != "feature-request"]
         return sorted(results, key=lambda t: t.name, reverse=False)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         user = self.request.user
-        common_problem_sources = Ticket.objects.get_common_problem_sources_for(user)
-
-        context["common_problem_sources"] = common_problem_sources[:4]
+        context["common_problem_sources"] = common_problem_sources_for(user)
 
         return context
@@ -1,6 +1,7 @@
 from django.views.generic import ListView
 
-from ticket.models import Ticket
+from ticket.models import Ticket, TicketAccess
+from ticket.permissions import permissions_for
 
 
 class SearchTicketsView(ListView):
@@ -10,12 +11,9 @@ class SearchTicketsView(ListView):
 
     def get_queryset(self, *args, **kwargs):
         query = self.request.GET.get('query')
-        user = self.request.user
-
-        if user.is_staff:
-            return Ticket.objects.search_tickets(query=query)
-        else:
-            return Ticket.objects.search_tickets(query=query, created_or_followed_by=user)
+        # Mitarbeiter finden alles, sonst nur eigene und gefolgte Tickets
+        permissions = permissions_for(self.request)
+        return permissions.filter_tickets(Ticket.objects.search_tickets(query=query), TicketAccess.SEARCH_ROLES)
 
 
 
@@ -1,16 +1,20 @@
 import random
 
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import prefetch_related_objects
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.views import View
 
-from ticket.forms import SearchUsersForm, CreateTicketForm, PauseTicketForm
-from ticket.models import Attachment, Ticket, Comment, ProblemSource
-from ticket.services import TicketEventService
+from ticket.forms import SearchUsersForm, CreateTicketForm, PauseTicketForm, TicketActionsForm
+from ticket.models import Attachment, Ticket, Comment
+from ticket.permissions import permissions_for
+from ticket.reference_data import reference_data
+from ticket.services import TicketChangeSet, TicketEventService
 from ticket.tasks import manual_update_analytics
 from ticket.thanks import thanks_comments
-
-from authentication.models import Team
+from ticket.uploads import upload_errors
 
 
 class TicketDetailView(View):
@@ -18,37 +22,19 @@ class TicketDetailView(View):
     # ----- Berechtigungen -----
     def user_has_full_access(self, user, ticket) -> bool:
         """Darf Details sehen (aber nicht zwingend verwalten)."""
-        if not user.is_authenticated:
-            return False
-        if user.is_staff:
-            return True
-        if user == ticket.created_by:
-            return True
-        if ticket.assigned_to_id == user.id:
-            return True
-        if ticket.co_assignees.filter(pk=user.pk).exists():
-            return True
-        if ticket.assigned_team_id and ticket.assigned_team.members.filter(pk=user.pk).exists():
-            return True
-        return False
+        return permissions_for(self.request).has_full_access(ticket)
 
     def user_can_manage(self, user, ticket) -> bool:
         """Darf mutierende Aktionen ausführen (nur Hauptbearbeiter)."""
-        return user.is_authenticated and ticket.assigned_to_id == user.id
+        return permissions_for(self.request).can_manage(ticket)
 
     # ----- GET -----
     def get(self, request, *args, **kwargs):
         ticket = self.get_ticket()
         user = request.user
 
-        # === AUTO-ZUWEISUNG an ersten Öffner, wenn noch niemand zugewiesen ist ===
-        if not ticket.assigned_to_id and user.is_authenticated:
-            ticket.assigned_to = user
-            ticket.save()
-            # Event direkt nach der Zuweisung
-            TicketEventService(ticket=ticket, current_user=user).create_assign_events(is_automatic=True)
-
-        # Ab hier normal weiter
+        # Reiner Lesezugriff: Auto-Zuweisung (ClaimTicketView) und "gesehen" (MarkSeenView)
+        # stößt die Seite per POST an.
         has_access = self.user_has_full_access(user, ticket)
         can_manage = self.user_can_manage(user, ticket)
 
@@ -65,59 +51,59 @@ class TicketDetailView(View):
             )
 
         # Vollzugriff: Detail-Ansicht
-        followers = ticket.followers.all()
-        attachments = Attachment.objects.filter(ticket=ticket)
-        notifications = TicketEventService(ticket=ticket, current_user=user)
-        new_problem_source = request.GET.get('problem_source')
-        thanks = request.GET.get('thanks')
+        context = self.get_detail_context(ticket, can_manage)
 
-        if thanks:
-            comment = Comment.objects.create(
-                ticket=ticket,
-                text=random.choice(thanks_comments),
-            )
-            notifications.create_comment_events(comment=comment, reopen=False)
+        # Edit-Modus
+        if 'edit' in request.get_full_path().split('/'):
+            context['edit'] = True
+            # Edit-Form nur sinnvoll, wenn managen erlaubt ist – das checkt später das Teiltemplate
+            context['ticket_form'] = CreateTicketForm(initial={'note': ticket.note})
+
+        return render(
+            request=request,
+            template_name='ticket/ticket_detail.html',
+            context=context
+        )
+
+    def get_detail_context(self, ticket, can_manage):
+        """
+        Loads everything the detail page renders with a fixed number of
+        queries: one per related set, the comments as one cached MPTT forest;
+        staff, teams and problem sources come from the reference data.
+        The templates only iterate these lists and never query on their own.
+        """
+        prefetch_related_objects([ticket], "followers")
+        notifications = TicketEventService(ticket=ticket, current_user=self.request.user)
 
         context = {
-            "attachments": attachments,
+            "attachments": list(Attachment.objects.filter(ticket=ticket)),
             "search_user_form": SearchUsersForm(),
             "ticket": ticket,
-            "followers": followers,
+            "followers": ticket.followers.all(),
             "co_assignees": ticket.co_assignees.all(),
             "has_access": True,
             "can_manage": can_manage,
+            # Erster Öffner übernimmt das Ticket (siehe ClaimTicketView)
+            "can_claim": not ticket.assigned_to_id and permissions_for(self.request).can_claim(ticket),
         }
 
-        # Edit-Modus
-        if 'edit' in request.get_full_path().split('/'):
-            context['edit'] = True
-            # Edit-Form nur sinnvoll, wenn managen erlaubt ist – das checkt später das Teiltemplate
-            context['ticket_form'] = CreateTicketForm(initial={'note': ticket.note})
-
         # Verwaltungs-Elemente NUR für Hauptbearbeiter bereitstellen
         if can_manage:
-            context['employees'] = User.objects.filter(is_staff=True)
-            context['problem_sources'] = ProblemSource.objects.all()
+            data = reference_data()
+            employees = data.staff
+            assigned = {user.id for user in ticket.co_assignees.all()} | {ticket.assigned_to_id}
+            context['employees'] = employees
+            context['employees_not_assigned'] = [e for e in employees if e.id not in assigned]
+            context['problem_sources'] = data.problem_source_tree()
             context['pause_ticket_form'] = PauseTicketForm()
-            context['all_teams'] = Team.objects.all().order_by('name')
-
-            if new_problem_source:
-                ticket.problem_source_id = new_problem_source
-                ticket.save()
-
-        notifications.mark_events_as_seen()
-        context["timeline_events"] = notifications.get_unique_events()
+            context['all_teams'] = data.teams
 
-        if can_manage:
-            context['employees_not_assigned'] = User.objects.filter(is_staff=True).exclude(
-                pk__in=ticket.co_assignees.values('pk')
-            ).exclude(pk=ticket.assigned_to_id)
-
-        return render(
-            request=request,
-            template_name='ticket/ticket_detail.html',
-            context=context
-        )
+        context["timeline_events"], context["timeline_next"] = notifications.get_unique_events()
+        context["timeline_url"] = reverse("ticket_timeline", args=[ticket.id])
+        # Neuestes Ereignis: ab hier holen die Live-Updates nach (TicketLiveView)
+        if context["timeline_events"]:
+            context["timeline_after"] = notifications.timeline_cursor(context["timeline_events"][0][0])
+        return context
 
     # ----- POST -----
     def post(self, request, *args, **kwargs):
@@ -140,17 +126,42 @@ class TicketDetailView(View):
                 }
             )
 
+        # Anhänge verworfen (zu groß): nichts übernehmen, damit Kommentar und Dateien zusammen bleiben
+        if upload_errors(request):
+            context = self.get_detail_context(ticket, can_manage)
+            context['upload_errors'] = upload_errors(request)
+            return render(
+                request=request,
+                template_name='ticket/ticket_detail.html',
+                context=context
+            )
+
+        with transaction.atomic():
+            changes = TicketChangeSet(ticket=ticket, current_user=user)
+            self.apply_changes(request, ticket, changes, can_manage)
+            changes.commit()
+
+        if can_manage:
+            manual_update_analytics()
+
+        return redirect("ticket_detail", id=ticket.id)
+
+    def apply_changes(self, request, ticket, changes, can_manage):
+        """
+        Collects everything the form changes in ``changes``; the ticket row is
+        written once and the events are created in one batch by ``commit``.
+        """
         post = request.POST
-        notifications = TicketEventService(ticket=ticket, current_user=user)
 
         # --- Aktionen für alle mit Zugriff (Kommentare/Antworten/Anhänge) ---
         new_comment = post.get('new_comment')
         new_comment_reply = post.get('new_reply')
         new_attachments = request.FILES.getlist('files')
+        thanks = post.get('thanks')
 
         if new_comment:
             comment = Comment.objects.create(ticket=ticket, text=new_comment)
-            notifications.create_comment_events(comment=comment)
+            changes.create_comment_events(comment=comment)
 
         if new_comment_reply:
             comment_id = post.get('comment_id')
@@ -159,121 +170,113 @@ class TicketDetailView(View):
                 text=new_comment_reply,
                 parent=Comment.objects.get(id=comment_id)
             )
-            notifications.create_reply_events(reply=reply)
+            changes.create_reply_events(reply=reply)
 
         if new_attachments:
             for attachment in new_attachments:
-                Attachment.objects.create(name=attachment, file=attachment, ticket=ticket)
-            notifications.create_attachment_events()
-
-        # --- Verwaltungsaktionen NUR für Hauptbearbeiter ---
-        if can_manage:
-            internal_note = post.get('internal_note')
-            new_note = post.get('note')
-            title = post.get('title')
-            close = post.get('close')
-            open_ = post.get('open')
-            assign_to = post.get('assign_to')
-            assign_team = post.get('assign_team')
-            priority = post.get('priority')
-            pause_until = post.get('pause_until')
-            unpause = post.get('unpause')
-            add_co = post.get('add_co_assignee')
-            remove_co = post.get('remove_co_assignee')
-
-            # Notiz / Titel
-            if new_note is not None and ticket.note != new_note:
-                ticket.note = new_note
-                ticket.save()
-                notifications.create_edit_events()
-
-            if title and title != ticket.title:
-                ticket.title = title
-                ticket.save()
-
-            # Schließen / Öffnen
-            if close and not ticket.completed:
-                close_comment = Comment.objects.create(ticket=ticket, text=internal_note) if internal_note else None
-                ticket.completed = True
-                ticket.save()
-                notifications.create_close_events(comment=close_comment)
-
-            if open_ and ticket.completed:
-                ticket.completed = False
-                ticket.save()
-                notifications.create_open_events()
-
-            # Nutzer zuweisen
-            if assign_to:
-                user_to_assign = User.objects.get(id=assign_to)
-                followers = ticket.followers.all()
-                followers_to_remove = [f for f in followers if f.is_staff]
-                ticket.followers.remove(*followers_to_remove)
-                ticket.followers.add(user_to_assign)
-                ticket.co_assignees.add(user_to_assign)
-
-                if ticket.assigned_to_id != user_to_assign.id:
-                    comment = Comment.objects.create(ticket=ticket, text=internal_note) if internal_note else None
-                    ticket.assigned_to = user_to_assign
-                    ticket.save()
-                    notifications.create_assign_events(comment=comment)
-
-            # Team zuweisen / entfernen
-            if assign_team is not None:
-                if not assign_team or assign_team in ('null', 'None'):
-                    if ticket.assigned_team_id is not None:
-                        ticket.assigned_team = None
-                        ticket.save()
-                        if hasattr(notifications, "create_team_unassign_event"):
-                            notifications.create_team_unassign_event()
-                        else:
-                            notifications.create_team_unassigned_event()
-                else:
-                    try:
-                        team = Team.objects.get(pk=assign_team)
-                    except Team.DoesNotExist:
-                        team = None
-
-                    if team and ticket.assigned_team_id != team.id:
-                        ticket.assigned_team = team
-                        ticket.save()
-                        notifications.create_team_assigned_event(team)
-
-            # Co-Assignees
-            if add_co:
-                try:
-                    u = User.objects.get(pk=add_co)
-                    ticket.co_assignees.add(u)
-                    ticket.save()
-                    notifications.create_co_assignee_added_event(u)
-                except User.DoesNotExist:
-                    pass
-
-            if remove_co:
-                try:
-                    u = User.objects.get(pk=remove_co)
-                    ticket.co_assignees.remove(u)
-                    ticket.save()
-                    notifications.create_co_assignee_removed_event(u)
-                except User.DoesNotExist:
-                    pass
-
-            # Prio / Pausieren
-            if priority is not None:
-                ticket.priority = priority
-                ticket.save()
-
-            if pause_until:
-                ticket.paused_until = pause_until
-                ticket.save()
-
-            if unpause:
-                ticket.paused_until = None
-                ticket.save()
+                Attachment.objects.create(
+                    name=attachment, file=attachment, ticket=ticket, sha256=getattr(attachment, "sha256", "")
+                )
+            changes.create_attachment_events()
 
-            manual_update_analytics()
+        if thanks:
+            comment = Comment.objects.create(ticket=ticket, text=random.choice(thanks_comments))
+            changes.create_comment_events(comment=comment, reopen=False)
 
-        return redirect("ticket_detail", id=ticket.id)
+        # --- Verwaltungsaktionen NUR für Hauptbearbeiter ---
+        if not can_manage:
+            return
+
+        internal_note = post.get('internal_note')
+        new_note = post.get('note')
+        title = post.get('title')
+        close = post.get('close')
+        open_ = post.get('open')
+        unpause = post.get('unpause')
+
+        # Typisierte Werte; ungültige Eingaben fehlen in cleaned_data und werden ignoriert
+        actions = TicketActionsForm(post)
+        actions.is_valid()
+        priority = actions.cleaned_data.get('priority')
+        pause_until = actions.cleaned_data.get('pause_until')
+        new_problem_source = actions.cleaned_data.get('problem_source')
+        assign_to = actions.cleaned_data.get('assign_to')
+        add_co = actions.cleaned_data.get('add_co_assignee')
+        remove_co = actions.cleaned_data.get('remove_co_assignee')
+        # Nur ein gesendetes, gültiges Feld ändert das Team; leer heißt "kein Team"
+        change_team = 'assign_team' in post and 'assign_team' in actions.cleaned_data
+        assign_team = actions.cleaned_data.get('assign_team')
+
+        # Problemquelle
+        if new_problem_source in reference_data().problem_sources_by_id:
+            changes.set('problem_source_id', new_problem_source)
+
+        # Notiz / Titel
+        if new_note is not None and changes.set('note', new_note):
+            changes.create_edit_events()
+
+        if title:
+            changes.set('title', title)
+
+        # Schließen / Öffnen
+        if close and not ticket.completed:
+            close_comment = Comment.objects.create(ticket=ticket, text=internal_note) if internal_note else None
+            changes.set('completed', True)
+            changes.create_close_events(comment=close_comment)
+
+        if open_ and ticket.completed:
+            changes.set('completed', False)
+            changes.create_open_events()
+
+        # Nutzer zuweisen
+        user_to_assign = User.objects.filter(pk=assign_to).first() if assign_to else None
+        if user_to_assign:
+            followers = ticket.followers.all()
+            followers_to_remove = [f for f in followers if f.is_staff]
+            ticket.followers.remove(*followers_to_remove)
+            ticket.followers.add(user_to_assign)
+            ticket.co_assignees.add(user_to_assign)
+            changes.touch()
+
+            if ticket.assigned_to_id != user_to_assign.id:
+                comment = Comment.objects.create(ticket=ticket, text=internal_note) if internal_note else None
+                changes.set('assigned_to', user_to_assign)
+                changes.create_assign_events(comment=comment)
+
+        # Team zuweisen / entfernen
+        if change_team:
+            if assign_team is None:
+                if changes.set('assigned_team', None):
+                    changes.create_team_unassigned_event()
+            else:
+                team = reference_data().teams_by_id.get(assign_team)
+                if team and changes.set('assigned_team', team):
+                    changes.create_team_assigned_event(team)
+
+        # Co-Assignees
+        if add_co:
+            u = User.objects.filter(pk=add_co).first()
+            if u:
+                ticket.co_assignees.add(u)
+                changes.touch()
+                changes.create_co_assignee_added_event(u)
+
+        if remove_co:
+            u = User.objects.filter(pk=remove_co).first()
+            if u:
+                ticket.co_assignees.remove(u)
+                changes.touch()
+                changes.create_co_assignee_removed_event(u)
+
+        # Prio / Pausieren
+        if priority is not None:
+            changes.set('priority', priority)
+
+        if pause_until:
+            changes.set('paused_until', pause_until)
+
+        if unpause:
+            changes.set('paused_until', None)
 
     # ----- Helpers -----
     def count_open_tickets_with_same_problem_source(self):
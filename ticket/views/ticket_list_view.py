@@ -1,16 +1,21 @@
 from urllib.parse import urlencode
 
-from django.db.models import Q
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
 from django.views.generic import ListView
 
-from ticket.models import Ticket
+from ticket.models import Ticket, TicketAccess
+from ticket.pagination import paginate_keyset
 
 
 class TicketListView(ListView):
     model = Ticket
     template_name = 'ticket/ticket_list.html'
     context_object_name = "tickets"
-    paginate_by = 25
+    paginate_by = None  # Keyset-Pagination über ?after=/?before=<cursor>, siehe get_queryset
+    page_size = 25
 
     default_ordering = ('completed', '-priority', '-created_date')
     sortable_fields = {
@@ -24,6 +29,11 @@ class TicketListView(ListView):
         'completed': ('completed',),
         'priority': ('priority',),
     }
+    # Spalten über nullable Relationen: für Cursor-Vergleiche auf '' abbilden
+    nullable_fields = {
+        'problem_source__breadcrumb', 'created_by__first_name', 'created_by__last_name',
+        'modified_by__first_name', 'modified_by__last_name', 'assigned_to__first_name', 'assigned_to__last_name',
+    }
 
     def get_base_queryset(self):
         status = self.kwargs.get('status')
@@ -38,11 +48,7 @@ class TicketListView(ListView):
             else:
                 tickets = Ticket.objects.created_by(user)
         elif ticket_type == "assigned_to_me":
-            base = Ticket.objects.filter(
-                Q(assigned_to=user) |
-                Q(co_assignees=user) |
-                Q(assigned_team__members=user)
-            ).distinct().select_related(
+            base = Ticket.objects.accessible_by(user, TicketAccess.WORKING_ROLES).select_related(
                 'created_by', 'assigned_to', 'modified_by', 'problem_source', 'assigned_team'
             ).prefetch_related('co_assignees')
 
@@ -77,10 +83,53 @@ class TicketListView(ListView):
         ordering = tuple(f'{prefix}{field}' for field in self.sortable_fields[sort])
         return sort, direction, ordering
 
+    @staticmethod
+    def sort_key(field):
+        return 'sort_' + field.replace('__', '_')
+
+    def get_keyset_ordering(self, tickets, ordering):
+        """
+        Ordering usable as a cursor: nullable columns are replaced by coalesced
+        annotations and ``id`` is appended as tiebreaker.
+        """
+        annotations = {}
+        keyset_ordering = []
+        for field in ordering:
+            name = field.lstrip('-')
+            if name in self.nullable_fields:
+                annotations[self.sort_key(name)] = Coalesce(F(name), Value(''))
+                field = field.replace(name, self.sort_key(name))
+            keyset_ordering.append(field)
+
+        descending = ordering[-1].startswith('-')
+        keyset_ordering.append('-id' if descending else 'id')
+        return tickets.annotate(**annotations), tuple(keyset_ordering)
+
+    def get_ticket_count(self, tickets):
+        """
+        Total for the list header, cached per list and user instead of counting
+        on every page.  Sorting does not change the total, so it is not part
+        of the key; the "all" lists share one entry between staff members.
+        """
+        if tickets.query.is_empty():
+            # Kein Zugriff (none()): nichts zählen und vor allem nicht im geteilten Schlüssel ablegen
+            return 0
+        user = self.request.user
+        user_key = 'all' if self.kwargs.get('type') == 'all' and user.is_staff else user.id
+        key = f"ticket_list_count:{self.kwargs.get('type')}:{self.kwargs.get('status')}:{user_key}"
+        return cache.get_or_set(key, tickets.order_by().count, settings.TICKET_LIST_COUNT_TTL)
+
     def get_queryset(self):
         tickets = self.get_base_queryset()
         _, _, ordering = self.get_sorting()
-        return tickets.order_by(*ordering)
+        self.ticket_count = self.get_ticket_count(tickets)
+
+        tickets, keyset_ordering = self.get_keyset_ordering(tickets, ordering)
+        before = self.request.GET.get('before')
+        self.page = paginate_keyset(
+            tickets, keyset_ordering, before or self.request.GET.get('after'), self.page_size, backwards=bool(before)
+        )
+        return self.page.items
 
     def build_query_string(self, **kwargs):
         params = self.request.GET.copy()
@@ -91,8 +140,9 @@ class TicketListView(ListView):
             else:
                 params[key] = value
 
-        if 'page' not in kwargs:
-            params.pop('page', None)
+        for key in ('after', 'before'):
+            if key not in kwargs:
+                params.pop(key, None)
 
         encoded = urlencode(params, doseq=True)
         return f'?{encoded}' if encoded else ''
@@ -135,5 +185,9 @@ class TicketListView(ListView):
             field_name: self.get_sort_icon(field_name)
             for field_name in self.sortable_fields
         }
-        context['pagination_query'] = self.build_query_string()
+        context['ticket_count'] = self.ticket_count
+        context['next_page_link'] = self.page.next_cursor and self.build_query_string(after=self.page.next_cursor)
+        context['previous_page_link'] = self.page.previous_cursor and self.build_query_string(
+            before=self.page.previous_cursor
+        )
         return context